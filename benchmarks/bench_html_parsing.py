@@ -0,0 +1,58 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_parser import parse_wp_product, BACKENDS, LexborHTMLParser, lxml
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+def available_modes():
+    """(backend, targeted) combinations installed here, reference mode first."""
+    modes = [("html.parser", False), ("html.parser", True)]
+    if lxml is not None:
+        modes.append(("lxml", True))
+    if LexborHTMLParser is not None:
+        modes.append(("selectolax", True))
+    return modes
+
+def bench_page(html, backend, targeted, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_wp_product(html, "fixture", backend=backend, targeted=targeted)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-page parse time of parse_wp_product() over saved HTML fixtures.")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--backend", choices=BACKENDS, help="only benchmark this backend")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    pages = {os.path.basename(p): open(p, 'rb').read() for p in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))}
+    reference = {name: parse_wp_product(html, "fixture", backend="html.parser", targeted=False) for name, html in pages.items()}
+
+    results = []
+    for backend, targeted in available_modes():
+        if args.backend and backend != args.backend:
+            continue
+        for name, html in pages.items():
+            seconds = bench_page(html, backend, targeted, args.repeat)
+            same = parse_wp_product(html, "fixture", backend=backend, targeted=targeted) == reference[name]
+            results.append({"backend": backend, "targeted": targeted, "page": name,
+                            "bytes": len(html), "ms": round(seconds * 1000, 3), "matches_reference": same})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        mode = f"{r['backend']}{' (targeted)' if r['targeted'] else ''}"
+        flag = "" if r["matches_reference"] else "  OUTPUT DIFFERS"
+        print(f"{mode:<26} {r['page']:<36} {r['ms']:>8.2f} ms/page{flag}")
+
+if __name__ == "__main__":
+    main()
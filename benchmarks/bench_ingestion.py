@@ -0,0 +1,189 @@
+import io
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+import subprocess
+import contextlib
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# The ingestion scripts create their API clients at import time; nothing is called offline
+for key, value in {"FIRMY_SUPABASE_URL": "http://127.0.0.1:9", "FIRMY_SUPABASE_KEY": "offline.offline.offline",
+                   "OPEN_AI_API": "sk-offline"}.items():
+    os.environ.setdefault(key, value)
+
+from fragrantica_loader import FragranticaRecord
+from fragrantica_matcher import FragranticaMatcher, normalize_name
+from scent_notes import extract_scent_notes
+from check_scent_notes import SAMPLES
+from integrate_perfumes_api import build_record, clean_html
+from integrate_perfumes import scrape_wp_product
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+STAGES = ("normalize_name", "clean_html", "scent_notes", "scrape_wp_product", "match_index", "match", "build_record")
+# Parsing a page costs milliseconds; larger catalogs reuse the per-page cost of this many
+MAX_SCRAPE_PAGES = 300
+SYLLABLES = ["ka", "ro", "mi", "su", "te", "la", "no", "vi", "da", "ze", "po", "ha"]
+
+def load_fixtures():
+    with open(os.path.join(FIXTURES_DIR, "wc", "products_page.json"), encoding='utf-8') as f:
+        products = json.load(f)
+    with open(os.path.join(FIXTURES_DIR, "wc", "variations.json"), encoding='utf-8') as f:
+        variations = {int(k): v for k, v in json.load(f).items()}
+    with open(os.path.join(FIXTURES_DIR, "fragrantica", "sample.json"), encoding='utf-8') as f:
+        fragrantica = json.load(f)
+    pages = {os.path.basename(p): open(p, 'rb').read()
+             for p in sorted(glob.glob(os.path.join(FIXTURES_DIR, "html", "*.html")))}
+    return products, variations, fragrantica, pages
+
+def synthetic_word(k):
+    """Distinct pronounceable flanker word for copy k (k=0 -> no word)."""
+    word = ""
+    while k:
+        k, r = divmod(k, len(SYLLABLES))
+        word += SYLLABLES[r]
+    return word.capitalize()
+
+def scale_catalog(products, variations, size):
+    """`size` products cycled from the fixture page, each copy with its own id and flanker name."""
+    catalog = []
+    for i in range(size):
+        p = products[i % len(products)]
+        word = synthetic_word(i // len(products))
+        brand, _, rest = p['name'].partition(" ")
+        copy = dict(p, id=p['id'] + 100000 * (i // len(products)))
+        if word:
+            copy['name'] = f"{brand} {word} {rest}"
+        catalog.append((copy, variations.get(p['id'], [])))
+    return catalog
+
+def scale_fragrantica(items, size):
+    """`size` Fragrantica records whose flanker names line up with scale_catalog()."""
+    records = []
+    for i in range(size):
+        item = items[i % len(items)]
+        word = synthetic_word(i // len(items))
+        records.append(FragranticaRecord.from_item(dict(item, name=f"{word} {item['name']}".strip())))
+    return records
+
+class FixtureSession:
+    """Serves saved product pages to scrape_wp_product() instead of the network."""
+
+    class Response:
+        status_code = 200
+        headers = {}
+
+        def __init__(self, content):
+            self.content = content
+
+        def raise_for_status(self):
+            pass
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        return self.Response(self.pages[url])
+
+def timed(func, repeat):
+    """Mean seconds per call of func() over `repeat` calls."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def bench_size(size, fixtures, stages, repeat):
+    products, variations, fragrantica, pages = fixtures
+    catalog = scale_catalog(products, variations, size)
+    names = [p['name'] for p, _ in catalog]
+    descriptions = [p['description'] for p, _ in catalog]
+    texts = [clean_html(d) for d in descriptions] + [text for text, _ in SAMPLES]
+    texts = (texts * (size // len(texts) + 1))[:size]
+    records = scale_fragrantica(fragrantica, size)
+    urls = list(pages)
+    scrape_urls = [urls[i % len(urls)] for i in range(min(size, MAX_SCRAPE_PAGES))]
+    session = FixtureSession(pages)
+
+    def build_all():
+        # A fresh matcher, so the lookups aren't served from the previous call's cache
+        matcher = FragranticaMatcher(records)
+        for p, v in catalog:
+            build_record(p, v, matcher)
+
+    def match_all():
+        matcher = FragranticaMatcher(records)
+        start = time.perf_counter()
+        for name in names:
+            matcher.match(name)
+        match_all.seconds += time.perf_counter() - start
+        match_all.rate = matcher.match_rate()
+    match_all.seconds = 0.0
+
+    work = {
+        "normalize_name": (len(names), lambda: [normalize_name(n) for n in names]),
+        "clean_html": (len(descriptions), lambda: [clean_html(d) for d in descriptions]),
+        "scent_notes": (len(texts), lambda: [extract_scent_notes(t) for t in texts]),
+        "scrape_wp_product": (len(scrape_urls), lambda: [scrape_wp_product(u, session) for u in scrape_urls]),
+        "match_index": (len(records), lambda: FragranticaMatcher(records)),
+        "match": (len(names), match_all),
+        "build_record": (len(catalog), build_all),
+    }
+    results = []
+    for stage in stages:
+        items, func = work[stage]
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = timed(func, repeat)
+        extra = {}
+        if stage == "match":
+            # Only the lookups; building the index is match_index
+            seconds = match_all.seconds / repeat
+            extra["match_rate"] = round(match_all.rate, 3)
+        results.append(dict({"stage": stage, "size": size, "items": items, "ms": round(seconds * 1000, 2),
+                             "us_per_item": round(seconds / items * 1e6, 2) if items else 0.0,
+                             "items_per_s": round(items / seconds, 1) if seconds else 0.0}, **extra))
+    return results
+
+def environment():
+    """Enough context to compare results across versions and machines."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.machine(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage cost of the catalog ingestion hot paths over recorded fixtures.")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes (e.g. 1000,10000,50000)")
+    parser.add_argument("--stage", choices=STAGES, action="append", help="stage to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    stages = args.stage or STAGES
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        results.extend(bench_size(size, fixtures, stages, args.repeat))
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for r in results:
+        rate = f"  match rate {r['match_rate']:.0%}" if "match_rate" in r else ""
+        print(f"{r['stage']:<18} {r['size']:>7} {r['items']:>7} items {r['ms']:>10.1f} ms"
+              f" {r['us_per_item']:>9.1f} us/item {r['items_per_s']:>11.1f} items/s{rate}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_servers import StubConfig, StubServer
+
+SCENARIOS = ("integrate", "orders", "bestsellers")
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+def result(scenario, latencies, items, seconds, **extra):
+    return dict({"scenario": scenario, "ops": len(latencies),
+                 "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                 "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                 "items": items, "items_per_s": round(items / seconds, 1) if seconds else 0.0}, **extra)
+
+@contextlib.contextmanager
+def quiet(verbose):
+    """Swallow the scripts' progress prints unless --verbose."""
+    if verbose:
+        yield
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+def write_fragrantica_dump(server, path):
+    """Fragrantica records for about half of the stub catalog, so the matcher has work to do."""
+    items = [{"name": p["name"].rsplit(" ", 2)[0].split(" ", 1)[-1], "brand": p["name"].split(" ")[0],
+              "notes": {"notes": {"top": ["Bergamot"], "middle": ["Rose"], "base": ["Amber"]}},
+              "accords": [{"sweet": 100.0}, {"woody": 72.5}], "launch_year": 2020,
+              "stats": {"longevity": 4.1, "sillage": 3.6}}
+             for p in server.data.products[::2]]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(items, f)
+
+def run_integrate(server, workdir, repeat, verbose, build_workers=0, chunks=False):
+    """Full catalog syncs; one op = one integrate() run, items = products."""
+    import integrate_perfumes_api as api
+    api.FRAGRANTICA_DATA_PATH = os.path.join(workdir, "fragrantica.json")
+    api.FRAGRANTICA_CACHE_PATH = os.path.join(workdir, "fragrantica_cache.pickle")
+    api.SYNC_STATE_PATH = os.path.join(workdir, "sync_state.json")
+    api.CHECKPOINT_PATH = os.path.join(workdir, "integrate_checkpoint.json")
+    api.SEARCH_INDEX_PATH = os.path.join(workdir, "search_index.npz")
+    api.writer.dead_letter_path = os.path.join(workdir, "dead_letter.jsonl")
+    api.chunk_writer.dead_letter_path = api.writer.dead_letter_path
+    # Every run embeds the whole catalog again
+    api.embedder.cache = None
+    write_fragrantica_dump(server, api.FRAGRANTICA_DATA_PATH)
+
+    latencies = []
+    for _ in range(repeat):
+        if os.path.exists(api.SYNC_STATE_PATH):
+            os.remove(api.SYNC_STATE_PATH)
+        start = time.perf_counter()
+        with quiet(verbose):
+            api.integrate(build_workers=build_workers, chunks=chunks)
+        latencies.append(time.perf_counter() - start)
+    rows = len(server.data.table.get("perfume_knowledge_base", {}))
+    extra = {"chunks_in_supabase": len(server.data.table.get(api.CHUNKS_TABLE, {}))} if chunks else {}
+    return result("integrate", latencies, len(server.data.products) * repeat, sum(latencies),
+                  rows_in_supabase=rows, dead_letters=api.writer.stats["dead_letters"], **extra)
+
+async def drive_orders(emails, concurrency, check):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(email):
+        async with semaphore:
+            start = time.perf_counter()
+            await check(email)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(email) for email in emails))
+    return latencies
+
+def run_orders(server, lookups, concurrency, seed):
+    """Chatbot order-status lookups; popular customers repeat, so the service cache is exercised."""
+    import check_order_status as cos
+    cos._service = cos.OrderStatusService("stub", base_url=f"{server.url}/api/v1")
+    rnd = random.Random(seed)
+    customers = server.data.emails + ["nieznany@example.pl"]
+    weights = [1 / (rank + 1) for rank in range(len(customers))]
+    emails = rnd.choices(customers, weights, k=lookups)
+
+    start = time.perf_counter()
+    latencies = asyncio.run(drive_orders(emails, concurrency, cos.check_order_status_async))
+    seconds = time.perf_counter() - start
+    return result("orders", latencies, lookups, seconds, service=cos._service.summary())
+
+def seed_knowledge_base(server):
+    """Rows for the bestseller job to rank when the integrate scenario didn't run."""
+    rows = server.data.table.setdefault("perfume_knowledge_base", {})
+    for p in server.data.products:
+        rows.setdefault(p["id"], {"wp_id": p["id"], "name": p["name"], "bestseller_rank": None, "bestseller_score": None})
+
+def run_bestsellers(server, workdir, repeat, use_ledger, verbose):
+    """Bestseller job runs; items = orders in the stub shop. With the ledger the first run backfills."""
+    from update_bestsellers_in_db import update_bestsellers_in_db
+    seed_knowledge_base(server)
+    ledger_path = os.path.join(workdir, "sales_ledger.sqlite")
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with quiet(verbose):
+            update_bestsellers_in_db(use_ledger=use_ledger, ledger_path=ledger_path)
+        latencies.append(time.perf_counter() - start)
+    ranked = sum(1 for r in server.data.table["perfume_knowledge_base"].values() if r.get("bestseller_rank"))
+    return result("bestsellers" + ("" if use_ledger else " (no ledger)"), latencies,
+                  len(server.data.orders) * repeat, sum(latencies), ranked=ranked)
+
+def endpoint_stats(server):
+    return [{"endpoint": name, "requests": s["requests"], "errors": s["errors"],
+             "p50_ms": round(percentile(s["latencies"], 50) * 1000, 1),
+             "p99_ms": round(percentile(s["latencies"], 99) * 1000, 1)}
+            for name, s in sorted(server.stats.items())]
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the sync, order-status and bestseller jobs against local stub servers.")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append",
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of the integrate and bestseller jobs")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--variations", type=int, default=3, help="variations per variable product")
+    parser.add_argument("--orders", type=int, default=3000)
+    parser.add_argument("--lookups", type=int, default=500, help="order-status lookups")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent order-status lookups")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="mean stub response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub responses that are 503s")
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--build-workers", type=int, default=0, help="record-building processes for the sync")
+    parser.add_argument("--chunks", action="store_true", help="also embed and store typed chunks in the sync")
+    parser.add_argument("--no-ledger", action="store_true", help="run the bestseller job without the sales ledger")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show the scripts' own output")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    config = StubConfig(products=args.products, variations=args.variations, orders=args.orders,
+                        latency_ms=args.latency_ms, error_rate=args.error_rate,
+                        embedding_dim=args.embedding_dim, seed=args.seed)
+    server = StubServer(config).start()
+    # Must be set before the scripts are imported: they read credentials at import time
+    os.environ.update(server.env())
+
+    scenarios = args.scenario or SCENARIOS
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        if "integrate" in scenarios:
+            results.append(run_integrate(server, workdir, args.repeat, args.verbose, args.build_workers, args.chunks))
+        if "orders" in scenarios:
+            results.append(run_orders(server, args.lookups, args.concurrency, args.seed))
+        if "bestsellers" in scenarios:
+            results.append(run_bestsellers(server, workdir, args.repeat, not args.no_ledger, args.verbose))
+    server.shutdown()
+    endpoints = endpoint_stats(server)
+
+    if args.json:
+        print(json.dumps({"config": vars(config), "scenarios": results, "endpoints": endpoints}, indent=2))
+        return
+    for r in results:
+        extra = ", ".join(f"{k}={v}" for k, v in r.items()
+                          if k not in ("scenario", "ops", "p50_ms", "p99_ms", "items", "items_per_s"))
+        print(f"{r['scenario']:<26} {r['ops']:>5} ops  p50 {r['p50_ms']:>9.1f} ms  p99 {r['p99_ms']:>9.1f} ms"
+              f"  {r['items_per_s']:>9.1f} items/s  {extra}")
+    print()
+    for e in endpoints:
+        print(f"{e['endpoint']:<26} {e['requests']:>5} req  {e['errors']:>4} err"
+              f"  p50 {e['p50_ms']:>7.1f} ms  p99 {e['p99_ms']:>7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+BRANDS = ["Lattafa", "Afnan", "Armaf", "Rasasi", "Fragrance World", "Maison Alhambra", "Ard Al Zaafaran"]
+WORDS = ["Khamrah", "Yara", "Asad", "Turathi", "Liquid", "Brun", "Oud", "Amber", "Club", "Nuit", "Rose",
+         "Musk", "Velvet", "Royal", "Intense", "Blue", "Noir", "Qahwa", "Sultan", "Bourbon", "Electric"]
+NOTES = ["bergamotką", "cytryną", "szafranem", "kardamonem", "różą", "jaśminem", "wanilią", "ambrą",
+         "paczulą", "drzewem sandałowym", "piżmem", "oudem", "fasolą tonka", "pralinami", "daktylami"]
+STATUSES = [("completed", 0.6), ("processing", 0.25), ("cancelled", 0.1), ("refunded", 0.05)]
+GRATIS_ID = 15916
+
+class StubConfig:
+    """Size and behaviour of the stand-in services."""
+
+    def __init__(self, products=500, variable_share=0.33, variations=3, orders=3000, order_days=90,
+                 customers=300, latency_ms=20.0, error_rate=0.0, embedding_dim=1536, seed=1):
+        self.products = products
+        self.variable_share = variable_share
+        self.variations = variations
+        self.orders = orders
+        self.order_days = order_days
+        self.customers = customers
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.embedding_dim = embedding_dim
+        self.seed = seed
+
+def gmt(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%S')
+
+class StubData:
+    """Deterministic catalog, variations and orders generated from the config."""
+
+    def __init__(self, config):
+        rnd = random.Random(config.seed)
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.products = []
+        self.variations = {}
+        for i in range(1, config.products + 1):
+            p_id = 1000 + i
+            brand = rnd.choice(BRANDS)
+            name = f"{brand} {' '.join(rnd.sample(WORDS, rnd.choice((1, 2))))} {rnd.choice(('EDP', 'EDT', 'Extrait'))} 100ml"
+            variable = rnd.random() < config.variable_share
+            top, heart, base = (", ".join(rnd.sample(NOTES, 3)) for _ in range(3))
+            description = (f"<p>{name} to kompozycja dla osób ceniących trwałość.</p>"
+                           f"<p>Otwarcie kompozycji uderza {top}. W sercu rozwijają się {heart}. "
+                           f"Bazę tworzy mieszanką {base}.</p>")
+            variation_ids = [p_id * 100 + k for k in range(config.variations)] if variable else []
+            self.products.append({
+                "id": p_id, "name": name, "type": "variable" if variable else "simple",
+                "price": "" if variable else f"{rnd.randint(59, 399)}.00",
+                "stock_status": "instock" if rnd.random() < 0.85 else "outofstock",
+                "attributes": [{"name": "Płeć", "options": [rnd.choice(("Unisex", "Męskie", "Damskie"))]},
+                               {"name": "Koncentracja", "options": ["Eau de Parfum"]}],
+                "description": description, "short_description": "",
+                "images": [{"src": f"https://perfun.pl/img/{p_id}.jpg"}],
+                "permalink": f"https://perfun.pl/produkt/{p_id}/",
+                "variations": variation_ids,
+                "date_modified_gmt": gmt(now - timedelta(days=rnd.randint(1, 300))),
+            })
+            if variable:
+                self.variations[p_id] = [{
+                    "id": v_id, "price": f"{rnd.randint(59, 399)}.00",
+                    "stock_status": "instock" if rnd.random() < 0.8 else "outofstock",
+                    "attributes": [{"name": "Pojemność", "option": f"{(k + 1) * 30}ml"}],
+                } for k, v_id in enumerate(variation_ids)]
+
+        # Popularity follows a long tail, like real sales
+        ids = [p["id"] for p in self.products]
+        weights = [1 / (rank + 1) for rank in range(len(ids))]
+        emails = [f"klient{k}@example.pl" for k in range(config.customers)]
+        statuses, status_weights = zip(*STATUSES)
+        self.orders = []
+        for k in range(config.orders):
+            created = now - timedelta(seconds=rnd.randint(0, config.order_days * 86400))
+            items = [{"product_id": p_id, "quantity": rnd.randint(1, 2), "name": f"Produkt {p_id}"}
+                     for p_id in set(rnd.choices(ids, weights, k=rnd.randint(1, 3)))]
+            if rnd.random() < 0.3:
+                items.append({"product_id": GRATIS_ID, "quantity": 1, "name": "Gratis - próbka"})
+            self.orders.append({
+                "id": 50000 + k, "status": rnd.choices(statuses, status_weights)[0],
+                "date_created_gmt": gmt(created), "date_modified_gmt": gmt(created + timedelta(hours=rnd.randint(0, 48))),
+                "billing": {"email": rnd.choice(emails)}, "line_items": items,
+                "total": f"{rnd.randint(60, 900)}.00",
+            })
+        self.orders.sort(key=lambda o: o["id"])
+        self.emails = emails
+        self.table = {}  # Supabase stand-in: {table: {conflict key: row}}
+
+def select_fields(obj, fields):
+    """Apply a WordPress-style _fields list (supports 'line_items.product_id')."""
+    if not fields:
+        return obj
+    top = {}
+    for field in fields.split(","):
+        head, _, rest = field.partition(".")
+        top.setdefault(head, []).append(rest)
+    out = {}
+    for head, rests in top.items():
+        if head not in obj:
+            continue
+        value = obj[head]
+        if all(rests) and isinstance(value, list):
+            value = [{k: v for k, v in item.items() if k in rests} for item in value]
+        out[head] = value
+    return out
+
+def paginate(items, q):
+    per_page = int(q.get("per_page", 10))
+    page = int(q.get("page", 1))
+    total_pages = max(1, (len(items) + per_page - 1) // per_page)
+    return items[(page - 1) * per_page:page * per_page], total_pages, len(items)
+
+def pseudo_embedding(text, dim):
+    rnd = random.Random(hashlib.sha256(text.encode()).digest())
+    return [round(rnd.uniform(-1, 1), 5) for _ in range(dim)]
+
+COMPARISONS = {"eq": lambda a, b: a == b, "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+               "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b}
+RESERVED_PARAMS = {"select", "or", "order", "offset", "limit", "on_conflict", "columns"}
+
+def split_conditions(expr):
+    """'a.eq.1,and(b.gt.2,c.lt.3)' -> ['a.eq.1', 'and(b.gt.2,c.lt.3)'] (commas inside () or quotes don't split)."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch in "()":
+            depth += 1 if ch == "(" else -1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    return parts + [current] if current else parts
+
+def row_matches(row, column, op, value):
+    if op == "not":
+        op, _, value = value.partition(".")
+        return not row_matches(row, column, op, value)
+    if op == "is":
+        return row.get(column) is None if value == "null" else str(row.get(column)).lower() == value
+    if op == "in":
+        return str(row.get(column)) in [v.strip('"') for v in value.strip("()").split(",")]
+    if op not in COMPARISONS or row.get(column) is None:
+        return op not in COMPARISONS
+    current, value = row[column], value.strip('"')
+    if isinstance(current, (int, float)) and not isinstance(current, bool):
+        return COMPARISONS[op](current, float(value))
+    return COMPARISONS[op](str(current), value)
+
+def row_matches_condition(row, condition):
+    for group, combine in (("and(", all), ("or(", any)):
+        if condition.startswith(group):
+            return combine(row_matches_condition(row, c) for c in split_conditions(condition[len(group):-1]))
+    column, op, value = condition.split(".", 2)
+    return row_matches(row, column, op, value)
+
+def row_matches_or(row, expr):
+    """PostgREST or=(...), including nested and(...) groups."""
+    return any(row_matches_condition(row, c) for c in split_conditions(expr[1:-1]))
+
+def row_matches_filters(row, q):
+    """PostgREST col=op.value filters (eq/gt/gte/lt/lte/in/is/not); numbers compare as numbers,
+    everything else as text like the scripts' timestamps."""
+    for column, expr in q.items():
+        if column in RESERVED_PARAMS:
+            continue
+        op, _, value = expr.partition(".")
+        if not row_matches(row, column, op, value):
+            return False
+    return True
+
+class StubServer:
+    """WooCommerce, Sellasist, OpenAI embeddings and Supabase REST stand-ins on one local port.
+
+    Every request waits latency_ms (±50%) and fails with a 503 at error_rate.
+    Per-endpoint request counts, errors and service times are kept in `stats`.
+    """
+
+    def __init__(self, config=None, port=0):
+        self.config = config or StubConfig()
+        self.data = StubData(self.config)
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._rnd = random.Random(self.config.seed + 1)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def env(self):
+        """Environment variables that point the scripts at this server."""
+        return {
+            "PERFUN_SITE_URL": self.url, "PERFUN_CONSUMER_KEY": "ck_stub", "PERFUN_CONSUMER_SECRET": "cs_stub",
+            "FIRMY_SUPABASE_URL": self.url, "FIRMY_SUPABASE_KEY": "stub.stub.stub",
+            "OPEN_AI_API": "sk-stub", "OPENAI_BASE_URL": f"{self.url}/v1",
+            "SELLASIST_API_KEY": "stub",
+        }
+
+    def _record(self, endpoint, seconds, error):
+        with self._lock:
+            s = self.stats.setdefault(endpoint, {"requests": 0, "errors": 0, "latencies": []})
+            s["requests"] += 1
+            s["errors"] += error
+            s["latencies"].append(seconds)
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._rnd.uniform(0.5, 1.5)
+            fail = self._rnd.random() < self.config.error_rate
+        time.sleep(self.config.latency_ms / 1000 * jitter)
+        return fail
+
+    def route(self, method, path, q, body):
+        """Returns (endpoint name, status, payload, extra headers)."""
+        data = self.data
+        if path == "/wp-json/wc/v3/products":
+            items = [p for p in data.products
+                     if not q.get("modified_after") or p["date_modified_gmt"] > q["modified_after"]]
+            page, pages, total = paginate(items, q)
+            return "wc.products", 200, page, {"X-WP-TotalPages": pages, "X-WP-Total": total}
+        m = re.match(r"^/wp-json/wc/v3/products/(\d+)/variations$", path)
+        if m:
+            page, pages, total = paginate(data.variations.get(int(m.group(1)), []), q)
+            page = [select_fields(v, q.get("_fields")) for v in page]
+            return "wc.variations", 200, page, {"X-WP-TotalPages": pages, "X-WP-Total": total}
+        if path == "/wp-json/wc/v3/orders":
+            statuses = q.get("status", "any")
+            items = [o for o in data.orders
+                     if (statuses == "any" or o["status"] in statuses.split(","))
+                     and (not q.get("after") or o["date_created_gmt"] > q["after"])
+                     and (not q.get("modified_after") or o["date_modified_gmt"] > q["modified_after"])]
+            key = "date_created_gmt" if q.get("orderby", "date") == "date" else "id"
+            items.sort(key=lambda o: o[key], reverse=q.get("order", "desc") == "desc")
+            page, pages, total = paginate(items, q)
+            page = [select_fields(o, q.get("_fields")) for o in page]
+            return "wc.orders", 200, page, {"X-WP-TotalPages": pages, "X-WP-Total": total}
+
+        if path == "/api/v1/orders":
+            email = q.get("email", "").lower()
+            found = sorted((o for o in data.orders if o["billing"]["email"] == email),
+                           key=lambda o: o["date_created_gmt"], reverse=True)[:int(q.get("limit", 10))]
+            if not found:
+                return "sellasist.search", 404, {"error": "Not found"}, {}
+            return "sellasist.search", 200, [{
+                "id": o["id"], "date": o["date_created_gmt"].replace("T", " "), "total": o["total"],
+                "status": {"name": o["status"]}, "payment": {"currency": "PLN"}} for o in found], {}
+        m = re.match(r"^/api/v1/orders/(\d+)$", path)
+        if m:
+            order_id = int(m.group(1))
+            shipments = [{"tracking_number": f"6{order_id:011d}", "courier_name": "InPost"}] if order_id % 2 else []
+            return "sellasist.order", 200, {"id": order_id, "shipments": shipments}, {}
+
+        if path == "/v1/embeddings" and method == "POST":
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            tokens = sum(len(t) // 3 + 1 for t in texts)
+            return "openai.embeddings", 200, {
+                "object": "list", "model": body.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": pseudo_embedding(t, self.config.embedding_dim)}
+                         for i, t in enumerate(texts)],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}, {}
+
+        m = re.match(r"^/rest/v1/rpc/(\w+)$", path)
+        if m and m.group(1) == "set_bestsellers":
+            rows = data.table.setdefault("perfume_knowledge_base", {})
+            changed = 0
+            for wp_id in body.get("clear_ids", []):
+                if wp_id in rows:
+                    rows[wp_id].update(bestseller_rank=None, bestseller_score=None)
+                    changed += 1
+            for r in body.get("ranks", []):
+                if r["wp_id"] in rows:
+                    rows[r["wp_id"]].update(bestseller_rank=r["rank"], bestseller_score=r["score"])
+                    changed += 1
+            return "supabase.rpc", 200, changed, {}
+        m = re.match(r"^/rest/v1/(\w+)$", path)
+        if m:
+            rows = data.table.setdefault(m.group(1), {})
+            if method == "POST":
+                key = q.get("on_conflict", "id").split(",")
+                # Like the table's default/update trigger on last_updated
+                stamp = datetime.now(timezone.utc).isoformat()
+                for row in body if isinstance(body, list) else [body]:
+                    row_key = row[key[0]] if len(key) == 1 else tuple(row[k] for k in key)
+                    rows.setdefault(row_key, {}).update(row, last_updated=stamp)
+                return "supabase.upsert", 201, [], {}
+            if method == "DELETE":
+                for key, row in list(rows.items()):
+                    if row_matches_filters(row, q):
+                        del rows[key]
+                return "supabase.delete", 200, [], {}
+            selected = [r for r in rows.values() if not q.get("or") or row_matches_or(r, q["or"])]
+            selected = [r for r in selected if row_matches_filters(r, q)]
+            for column, direction in reversed([o.rsplit(".", 1) for o in q["order"].split(",")] if q.get("order") else []):
+                selected.sort(key=lambda r: (r.get(column) is not None, r.get(column)), reverse=direction == "desc")
+            offset = int(q.get("offset", 0))
+            selected = selected[offset:offset + int(q["limit"])] if "limit" in q else selected[offset:]
+            columns = [c.strip() for c in q.get("select", "*").split(",")]
+            if columns != ["*"]:
+                selected = [{c: r.get(c) for c in columns} for r in selected]
+            return "supabase.select", 200, selected, {}
+        return "unknown", 404, {"message": f"No stub for {method} {path}"}, {}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                start = time.perf_counter()
+                u = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(u.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                fail = server._delay()
+                endpoint, status, payload, headers = server.route(method, u.path, q, body)
+                if fail:
+                    status, payload, headers = 503, {"message": "stub: injected failure", "code": None}, {}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, str(v))
+                self.end_headers()
+                self.wfile.write(data)
+                server._record(endpoint, time.perf_counter() - start, status >= 500)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_PATCH(self):
+                self._serve("POST")
+
+            def do_DELETE(self):
+                self._serve("DELETE")
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local WooCommerce/Sellasist/OpenAI/Supabase stand-ins.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=3000)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(products=args.products, orders=args.orders, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    server = StubServer(config, port=args.port)
+    print(f"Stubs listening on {server.url}. Point the scripts at them with:")
+    for k, v in server.env().items():
+        print(f"export {k}={v}")
+    sys.stdout.flush()
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+-- Bestseller ranking stored in its own columns instead of a "[BESTSELLER]"
+-- suffix on the (embedded) description. Run once in the Supabase SQL editor.
+
+alter table perfume_knowledge_base
+    add column if not exists bestseller_rank integer,
+    add column if not exists bestseller_score integer;
+
+create index if not exists perfume_knowledge_base_bestseller_rank
+    on perfume_knowledge_base (bestseller_rank) where bestseller_rank is not null;
+
+-- Drop the old text tags
+update perfume_knowledge_base
+set description = replace(description, E'\n\n[BESTSELLER]', '')
+where description like '%[BESTSELLER]%';
+
+-- Apply a ranking diff in one statement: clear_ids lose their rank, ranks is
+-- a JSON array of {"wp_id", "rank", "score"}. Returns the number of rows changed.
+create or replace function set_bestsellers(ranks jsonb, clear_ids bigint[])
+returns integer
+language sql
+as $$
+    with cleared as (
+        update perfume_knowledge_base
+        set bestseller_rank = null, bestseller_score = null
+        where wp_id = any(clear_ids)
+        returning 1
+    ), ranked as (
+        update perfume_knowledge_base p
+        set bestseller_rank = (r->>'rank')::integer, bestseller_score = (r->>'score')::integer
+        from jsonb_array_elements(ranks) r
+        where p.wp_id = (r->>'wp_id')::bigint
+        returning 1
+    )
+    select ((select count(*) from cleared) + (select count(*) from ranked))::integer;
+$$;
@@ -0,0 +1,118 @@
+import time
+import asyncio
+from urllib.parse import urlparse
+
+# Sentinel pushed through the queues to stop the workers of a stage
+_DONE = object()
+
+class HostLimiter:
+    """Per-host concurrency limits for blocking calls run in worker threads."""
+
+    def __init__(self, limits=None, default=4):
+        self.limits = dict(limits or {})
+        self.default = default
+        self._semaphores = {}
+
+    def _semaphore(self, host):
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.limits.get(host, self.default))
+        return self._semaphores[host]
+
+    async def run(self, url, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a thread while holding a slot for the url's host."""
+        host = urlparse(url).netloc or url
+        async with self._semaphore(host):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+class Stage:
+    """One pipeline step: `workers` tasks apply the async `fn` to items from a bounded queue.
+
+    `fn` returns the item for the next stage, or None to drop it. With
+    batch_size > 1 the stage receives lists of up to batch_size items; with
+    `linger` set, a batch is handed over once no new item arrived for that
+    many seconds instead of waiting until it is full. With fan_out the list
+    returned by `fn` is passed on item by item.
+    """
+
+    def __init__(self, name, fn, workers=1, maxsize=100, batch_size=1, linger=None, fan_out=False):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.linger = linger
+        self.fan_out = fan_out
+
+async def _call(stage, item, outbox, metrics=None):
+    start = time.perf_counter()
+    try:
+        result = await stage.fn(item)
+    except Exception as e:
+        print(f"Error in stage '{stage.name}': {e}")
+        if metrics:
+            metrics.count(f"{stage.name}_errors")
+        return
+    finally:
+        if metrics:
+            metrics.observe(stage.name, time.perf_counter() - start)
+    if result is None or outbox is None:
+        if result is None and outbox is not None and metrics:
+            metrics.count(f"{stage.name}_dropped")
+        return
+    for out in (result if stage.fan_out else [result]):
+        await outbox.put(out)
+
+async def _next_batch(stage, inbox):
+    """Collect up to batch_size items. Returns (batch, done)."""
+    batch = []
+    while len(batch) < stage.batch_size:
+        try:
+            if batch and stage.linger is not None:
+                item = await asyncio.wait_for(inbox.get(), stage.linger)
+            else:
+                item = await inbox.get()
+        except asyncio.TimeoutError:
+            break
+        if item is _DONE:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+async def _work(stage, inbox, outbox, metrics=None):
+    while True:
+        if stage.batch_size <= 1:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            await _call(stage, item, outbox, metrics)
+            continue
+        batch, done = await _next_batch(stage, inbox)
+        if batch:
+            await _call(stage, batch, outbox, metrics)
+        if done:
+            return
+
+async def run_pipeline(source, stages, metrics=None):
+    """Feed items from the async iterable `source` through `stages` until drained.
+
+    With a run_metrics.RunMetrics, the time spent in each stage's fn is
+    recorded under the stage name, along with `<stage>_errors` and
+    `<stage>_dropped` counts.
+    """
+    queues = [asyncio.Queue(maxsize=stage.maxsize) for stage in stages]
+    workers = []
+    for i, stage in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(queues) else None
+        workers.append([asyncio.create_task(_work(stage, queues[i], outbox, metrics)) for _ in range(stage.workers)])
+
+    try:
+        async for item in source:
+            await queues[0].put(item)
+        # Shut stages down in order so each one drains before the next stops
+        for i, stage in enumerate(stages):
+            for _ in range(stage.workers):
+                await queues[i].put(_DONE)
+            await asyncio.gather(*workers[i])
+    finally:
+        for task in (t for stage_tasks in workers for t in stage_tasks):
+            task.cancel()
@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from supabase import create_client
+from dotenv import load_dotenv
+from vector_index import parse_embedding
+from sync_state import write_npz_atomic
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog_snapshot.npz")
+TABLE = 'perfume_knowledge_base'
+KEY = 'wp_id'
+PAGE_SIZE = 500
+# Changes committed this long after their transaction started are still picked up
+OVERLAP_SECONDS = 300
+FORMAT_VERSION = 1
+
+def fetch_changed(supabase, since=None, page_size=PAGE_SIZE, overlap=OVERLAP_SECONDS):
+    """Rows changed since the watermark (all rows without one), oldest change first, one per wp_id.
+
+    last_updated is the start time of the writing transaction, so a row can
+    commit after a refresh has already moved past its timestamp; the last
+    `overlap` seconds before the watermark are read again. Pages are keyed
+    on (last_updated, wp_id) instead of offsets, so rows that change while
+    the pages are read move to the end instead of shifting others out.
+    """
+    rows = {}
+    after = None
+    while True:
+        query = supabase.table(TABLE).select("*")
+        if after:
+            stamp, key = after
+            query = query.or_(f'last_updated.gt."{stamp}",and(last_updated.eq."{stamp}",{KEY}.gt.{key})')
+        elif since:
+            query = query.gte('last_updated', (parse_timestamp(since) - timedelta(seconds=overlap)).isoformat())
+        else:
+            query = query.not_.is_('last_updated', 'null')
+        res = query.order('last_updated').order(KEY).limit(page_size).execute()
+        for row in res.data:
+            # A row re-read in the overlap or after a change mid-refresh: keep its newest version
+            rows.pop(row[KEY], None)
+            rows[row[KEY]] = row
+        if len(res.data) < page_size:
+            break
+        after = (res.data[-1]['last_updated'], res.data[-1][KEY])
+    if not since:
+        rows.update((row[KEY], row) for row in fetch_unstamped(supabase, page_size))
+    return list(rows.values())
+
+def fetch_unstamped(supabase, page_size=PAGE_SIZE):
+    """Rows from before last_updated was kept (null), paged by wp_id."""
+    rows = []
+    while True:
+        query = supabase.table(TABLE).select("*").is_('last_updated', 'null')
+        if rows:
+            query = query.gt(KEY, rows[-1][KEY])
+        res = query.order(KEY).limit(page_size).execute()
+        rows.extend(res.data)
+        if len(res.data) < page_size:
+            return rows
+
+def fetch_ids(supabase, page_size=5000):
+    """Every wp_id currently in the table; a cheap way to notice deleted products."""
+    ids = []
+    start = 0
+    while True:
+        res = supabase.table(TABLE).select(KEY).order(KEY).range(start, start + page_size - 1).execute()
+        ids.extend(r[KEY] for r in res.data)
+        if len(res.data) < page_size:
+            return ids
+        start += page_size
+
+def parse_timestamp(value):
+    """PostgREST timestamps trim trailing zeros of the fraction, so compare them parsed, not as text."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def latest_timestamp(values):
+    values = [v for v in values if v]
+    return max(values, key=parse_timestamp) if values else None
+
+def column_kind(values):
+    """Storage kind of a column from its non-null values."""
+    types = {type(v) for v in values if v is not None}
+    if not types or types == {str}:
+        return "str"
+    if types == {bool}:
+        return "bool"
+    if types == {int}:
+        return "int"
+    if types <= {int, float}:
+        return "float"
+    return "json"
+
+DTYPES = {"bool": np.bool_, "int": np.int64, "float": np.float64}
+
+class StringTable:
+    """Deduplicated UTF-8 strings stored as one byte buffer plus offsets."""
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def add(self, value):
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def arrays(self):
+        encoded = [v.encode('utf-8') for v in self.values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def decode_strings(data, offsets):
+    buf = data.tobytes()
+    return [buf[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+class CatalogSnapshot:
+    """Columnar local copy of perfume_knowledge_base.
+
+    Embeddings are one float32 matrix, numeric columns are typed arrays and
+    text columns are indices into a shared, deduplicated string table, all in
+    a single .npz (no pickles). Columns are decoded on first access, so
+    counting rows or listing the schema doesn't touch descriptions or vectors.
+    `watermark` is the newest last_updated seen; refresh() only pulls rows
+    changed since then (plus a short overlap, see fetch_changed()).
+    """
+
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.meta = meta
+        self._strings = None
+        self._decoded = {}
+
+    @classmethod
+    def from_rows(cls, rows, embeddings=None, watermark=None):
+        """Encode rows; embeddings (matrix, mask) can be passed to skip parsing them from the rows."""
+        if embeddings is None:
+            parsed = [parse_embedding(r.get("embedding")) for r in rows]
+            dim = max((len(e) for e in parsed if e), default=0)
+            mask = np.array([bool(e) for e in parsed], dtype=bool)
+            matrix = np.zeros((len(rows), dim), dtype=np.float32)
+            for i, e in enumerate(parsed):
+                if e:
+                    matrix[i] = e
+        else:
+            matrix, mask = embeddings
+
+        names = []
+        for row in rows:
+            names.extend(k for k in row if k != "embedding" and k not in names)
+        strings = StringTable()
+        arrays = {"embedding": matrix, "null:embedding": ~mask}
+        kinds = {}
+        for name in names:
+            values = [row.get(name) for row in rows]
+            kind = kinds[name] = column_kind(values)
+            nulls = np.array([v is None for v in values], dtype=bool)
+            if kind in ("str", "json"):
+                encode = (lambda v: v) if kind == "str" else (lambda v: json.dumps(v, ensure_ascii=False))
+                arrays[f"col:{name}"] = np.array([-1 if v is None else strings.add(encode(v)) for v in values],
+                                                 dtype=np.int32)
+                continue
+            arrays[f"col:{name}"] = np.array([0 if v is None else v for v in values], dtype=DTYPES[kind])
+            if nulls.any():
+                arrays[f"null:{name}"] = nulls
+        arrays["strings:data"], arrays["strings:offsets"] = strings.arrays()
+        meta = {"version": FORMAT_VERSION, "table": TABLE, "rows": len(rows), "columns": kinds,
+                "watermark": watermark if watermark is not None else latest_timestamp(r.get('last_updated') for r in rows),
+                "refreshed": time.strftime('%Y-%m-%dT%H:%M:%S')}
+        return cls(arrays, meta)
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def columns(self):
+        """Column names in table order; the embedding is stored separately."""
+        return list(self.meta["columns"]) + ["embedding"]
+
+    @property
+    def watermark(self):
+        return self.meta["watermark"]
+
+    def _string_values(self):
+        if self._strings is None:
+            self._strings = decode_strings(self.arrays["strings:data"], self.arrays["strings:offsets"])
+        return self._strings
+
+    def column(self, name):
+        """Python values of one column, None where the database had NULL."""
+        if name in self._decoded:
+            return self._decoded[name]
+        kind = self.meta["columns"][name]
+        raw = self.arrays[f"col:{name}"]
+        if kind in ("str", "json"):
+            strings = self._string_values()
+            values = [None if i < 0 else strings[i] for i in raw.tolist()]
+            if kind == "json":
+                values = [None if v is None else json.loads(v) for v in values]
+        else:
+            values = raw.tolist()
+            nulls = self.arrays.get(f"null:{name}")
+            if nulls is not None:
+                values = [None if null else v for v, null in zip(values, nulls.tolist())]
+        self._decoded[name] = values
+        return values
+
+    def ids(self):
+        return self.arrays[f"col:{KEY}"]
+
+    def embeddings(self):
+        """(float32 matrix, has-embedding mask); rows without one are zeros."""
+        return self.arrays["embedding"], ~self.arrays["null:embedding"]
+
+    def rows(self, columns=None, positions=None):
+        """Rows as dicts (without the embedding unless asked for); columns the
+        snapshot doesn't have come back as None, like row.get() on a dict."""
+        columns = list(columns or self.meta["columns"])
+        positions = range(len(self)) if positions is None else positions
+        values = {c: self.column(c) if c in self.meta["columns"] else [None] * len(self)
+                  for c in columns if c != "embedding"}
+        if "embedding" in columns:
+            matrix, mask = self.embeddings()
+        rows = []
+        for i in positions:
+            row = {c: v[i] for c, v in values.items()}
+            if "embedding" in columns:
+                row["embedding"] = matrix[i].tolist() if mask[i] else None
+            rows.append(row)
+        return rows
+
+    def latest(self, n=1):
+        """The n most recently updated rows."""
+        stamps = self.column('last_updated') if 'last_updated' in self.meta["columns"] else [None] * len(self)
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+        order = sorted(range(len(self)), key=lambda i: parse_timestamp(stamps[i]) if stamps[i] else oldest,
+                       reverse=True)
+        return self.rows(positions=order[:n])
+
+    def merge(self, changed, live_ids=None):
+        """A new snapshot with changed rows replacing (or added to) ours, and,
+        given live_ids, rows deleted from the table dropped. Sorted by wp_id."""
+        new = CatalogSnapshot.from_rows(changed)
+        ids = self.ids() if len(self) else np.zeros(0, dtype=np.int64)
+        keep = ~np.isin(ids, new.ids()) if len(new) else np.ones(len(ids), dtype=bool)
+        if live_ids is not None:
+            keep &= np.isin(ids, np.asarray(live_ids, dtype=np.int64))
+        kept = np.flatnonzero(keep)
+
+        old_matrix, old_mask = self.embeddings() if len(self) else (np.zeros((0, 0), np.float32), np.zeros(0, bool))
+        new_matrix, new_mask = new.embeddings()
+        dim = max(old_matrix.shape[1], new_matrix.shape[1])
+        matrix = np.zeros((len(kept) + len(new), dim), dtype=np.float32)
+        if len(kept) and old_matrix.shape[1]:
+            matrix[:len(kept), :old_matrix.shape[1]] = old_matrix[kept]
+        if len(new) and new_matrix.shape[1]:
+            matrix[len(kept):, :new_matrix.shape[1]] = new_matrix
+        mask = np.concatenate([old_mask[kept], new_mask])
+
+        rows = self.rows(positions=kept.tolist()) + new.rows()
+        order = sorted(range(len(rows)), key=lambda i: rows[i][KEY])
+        watermark = latest_timestamp([self.watermark, new.watermark])
+        return CatalogSnapshot.from_rows([rows[i] for i in order], embeddings=(matrix[order], mask[order]),
+                                         watermark=watermark)
+
+    def save(self, path=SNAPSHOT_PATH):
+        """Write atomically, so an inspection script never loads half a snapshot."""
+        arrays = dict(self.arrays)
+        arrays["meta"] = np.frombuffer(json.dumps(self.meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+        write_npz_atomic(arrays, path)
+
+    @classmethod
+    def load(cls, path=SNAPSHOT_PATH):
+        """Open a saved snapshot; arrays are read from the file when first used."""
+        data = np.load(path, allow_pickle=False)
+        meta = json.loads(data["meta"].tobytes().decode('utf-8'))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {meta.get('version')} in {path}")
+        return cls(LazyArrays(data), meta)
+
+class LazyArrays:
+    """Read-through cache over an NpzFile, so each array is read and inflated once."""
+
+    def __init__(self, npz):
+        self.npz = npz
+        self.cache = {}
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            self.cache[name] = self.npz[name]
+        return self.cache[name]
+
+    def get(self, name, default=None):
+        return self[name] if name in self.npz.files else default
+
+    def keys(self):
+        return [f for f in self.npz.files if f != "meta"]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+def refresh(supabase, path=SNAPSHOT_PATH, full=False):
+    """Bring the snapshot up to date: only rows changed since its watermark are
+    downloaded, and deleted products are dropped. Returns (snapshot, changed rows)."""
+    current = None
+    if not full and os.path.exists(path):
+        try:
+            current = CatalogSnapshot.load(path)
+        except Exception as e:
+            print(f"Rebuilding unreadable snapshot {path}: {e}")
+    if current is None:
+        rows = fetch_changed(supabase)
+        snapshot = CatalogSnapshot.from_rows(sorted(rows, key=lambda r: r[KEY]))
+    else:
+        rows = fetch_changed(supabase, current.watermark)
+        snapshot = current.merge(rows, live_ids=fetch_ids(supabase))
+    snapshot.save(path)
+    return snapshot, len(rows)
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """The saved snapshot, or None (with a hint) if there isn't one yet."""
+    if not os.path.exists(path):
+        print(f"No catalog snapshot at {path}. Run: python catalog_snapshot.py refresh")
+        return None
+    return CatalogSnapshot.load(path)
+
+def refresh_from_env(path=SNAPSHOT_PATH, full=False):
+    load_dotenv('/Users/wojciechnowak/.env')
+    supabase = create_client(os.environ.get("FIRMY_SUPABASE_URL"), os.environ.get("FIRMY_SUPABASE_KEY"))
+    start = time.perf_counter()
+    snapshot, changed = refresh(supabase, path, full)
+    print(f"Snapshot {path}: {len(snapshot)} products, {changed} fetched, "
+          f"watermark {snapshot.watermark} ({time.perf_counter() - start:.1f}s)")
+    return snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Local columnar snapshot of perfume_knowledge_base.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("refresh", help="download rows changed since the last refresh")
+    update.add_argument("--full", action="store_true", help="download the whole table again")
+    update.add_argument("--path", default=SNAPSHOT_PATH)
+    info = sub.add_parser("info", help="describe the local snapshot")
+    info.add_argument("--path", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        refresh_from_env(args.path, args.full)
+        return
+
+    snapshot = load_snapshot(args.path)
+    if snapshot is None:
+        return
+    matrix, mask = snapshot.embeddings()
+    print(f"{len(snapshot)} products, {int(mask.sum())} with embeddings ({matrix.shape[1]} dims)")
+    print(f"Watermark {snapshot.watermark}, refreshed {snapshot.meta['refreshed']}, "
+          f"{os.path.getsize(args.path) / 1e6:.1f} MB on disk")
+    for name, kind in snapshot.meta["columns"].items():
+        print(f"  {name:<24} {kind}")
+
+if __name__ == "__main__":
+    main()
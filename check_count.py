@@ -1,16 +1,11 @@
-import os
-from supabase import create_client
-from dotenv import load_dotenv
-
-load_dotenv('/Users/wojciechnowak/.env')
-
-url = os.environ.get("FIRMY_SUPABASE_URL")
-key = os.environ.get("FIRMY_SUPABASE_KEY")
-
-supabase = create_client(url, key)
+import sys
+from catalog_snapshot import load_snapshot, refresh_from_env
 
+# Reads the local snapshot; --refresh pulls the changes from Supabase first
 try:
-    response = supabase.table('perfume_knowledge_base').select("id", count='exact').execute()
-    print(f"Total products in 'perfume_knowledge_base': {response.count}")
+    snapshot = refresh_from_env() if "--refresh" in sys.argv else load_snapshot()
+    if snapshot is not None:
+        print(f"Total products in 'perfume_knowledge_base': {len(snapshot)}")
+        print(f"(snapshot refreshed {snapshot.meta['refreshed']}, newest change {snapshot.watermark})")
 except Exception as e:
     print(f"Error: {e}")
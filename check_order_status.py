@@ -1,82 +1,183 @@
 import os
-import requests
+import time
+import asyncio
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
+from http_client import RetrySession
 
 # Load for local testing
 load_dotenv('/Users/wojciechnowak/.env')
 
-def check_order_status(email):
-    # Support both spellings just in case
-    api_key = os.environ.get("SELLLASIST_API_KEY") or os.environ.get("SELLASIST_API_KEY")
-    site_url = "https://perfun.sellasist.pl/api/v1"
-    
-    if not api_key:
-        return "Błąd: Brak klucza API Sellasist w konfiguracji (SELLASIST_API_KEY)."
-        
-    headers = {
-        "apikey": api_key,
-        "Accept": "application/json"
-    }
-    
-    # 1. Search for order by email
-    endpoint = f"{site_url}/orders"
-    params = {
-        "email": email,
-        "limit": 1,
-        "sort": "date",
-        "order": "desc"
-    }
-    
-    try:
-        response = requests.get(endpoint, headers=headers, params=params)
-        
+SELLASIST_HOST = "perfun.sellasist.pl"
+SELLASIST_URL = f"https://{SELLASIST_HOST}/api/v1"
+SELLASIST_RATE_LIMIT = 5  # requests per second
+ORDER_CACHE_TTL = 60  # seconds; order statuses don't change faster than customers ask
+MAX_CACHE_ENTRIES = 5000
+NO_API_KEY_MESSAGE = "Błąd: Brak klucza API Sellasist w konfiguracji (SELLASIST_API_KEY)."
+
+# Shared by all lookups: keeps connections alive and backs off when Sellasist throttles
+session = RetrySession({SELLASIST_HOST: SELLASIST_RATE_LIMIT}, pool_size=8, max_retries=2, timeout=15)
+
+class OrderStatusService:
+    """Async Sellasist order lookups for the chatbot.
+
+    The blocking calls run in worker threads over one pooled session. Results
+    are cached for `ttl` seconds by email (latest orders) and by order id
+    (details with shipments), and concurrent lookups of the same key share a
+    single upstream request. Failed requests are not cached; beyond
+    MAX_CACHE_ENTRIES the least recently used entries are dropped.
+
+    In-flight requests are futures of the loop the service runs on, so one
+    instance must only be used from one event loop (see service_loop()).
+    """
+
+    def __init__(self, api_key, base_url=SELLASIST_URL, session=session, ttl=ORDER_CACHE_TTL):
+        self.base_url = base_url
+        self.session = session
+        self.ttl = ttl
+        self.headers = {"apikey": api_key, "Accept": "application/json"}
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self.stats = {"lookups": 0, "cache_hits": 0, "coalesced": 0, "upstream": 0}
+
+    def _get(self, path, params=None):
+        return self.session.get(f"{self.base_url}{path}", headers=self.headers, params=params)
+
+    def _search(self, email, limit):
+        response = self._get("/orders", {"email": email, "limit": limit, "sort": "date", "order": "desc"})
         # Sellasist returns 404 if no records match the filter
         if response.status_code == 404:
-            return f"Nie znaleziono zamówień przypisanych do adresu: {email}"
-            
+            return []
         response.raise_for_status()
-        data = response.json()
-        
-        if not data or len(data) == 0:
-            return f"Nie znaleziono zamówień przypisanych do adresu: {email}"
-            
-        order = data[0]
-        order_id = order.get('id')
-        status_name = order.get('status', {}).get('name', 'Brak danych')
-        date = order.get('date', 'Brak danych')
-        total = order.get('total', '0.00')
-        currency = order.get('payment', {}).get('currency', 'PLN')
-        
-        # 2. Get details for tracking info if possible
-        tracking_info = ""
+        return response.json() or []
+
+    def _details(self, order_id):
+        response = self._get(f"/orders/{order_id}")
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch(self, key, fetch, *args):
         try:
-            detail_response = requests.get(f"{endpoint}/{order_id}", headers=headers)
-            if detail_response.status_code == 200:
-                detail_data = detail_response.json()
-                shipments = detail_data.get('shipments', [])
-                if shipments:
-                    trackings = []
-                    for s in shipments:
-                        num = s.get('tracking_number')
-                        courier = s.get('courier_name') or s.get('service') or "Kurier"
-                        if num:
-                            trackings.append(f"{courier}: {num}")
-                    if trackings:
-                        tracking_info = "\n\nWysłano przesyłkę:\n- " + "\n- ".join(trackings)
+            self.stats["upstream"] += 1
+            value = await asyncio.to_thread(fetch, *args)
+        finally:
+            self._inflight.pop(key, None)
+        self._cache[key] = (time.monotonic() + self.ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > MAX_CACHE_ENTRIES:
+            self._cache.popitem(last=False)
+        return value
+
+    async def _cached(self, key, fetch, *args):
+        self.stats["lookups"] += 1
+        entry = self._cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.stats["cache_hits"] += 1
+            self._cache.move_to_end(key)
+            return entry[1]
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(key, fetch, *args))
+        else:
+            self.stats["coalesced"] += 1
+        # A caller that gives up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def latest_orders(self, email, limit=1):
+        """Newest orders of a customer (empty list if there are none)."""
+        return await self._cached(("orders", email.strip().lower(), limit), self._search, email, limit)
+
+    async def order_details(self, order_id):
+        """Full order including shipments; {} if it can't be fetched (tracking is optional)."""
+        try:
+            return await self._cached(("order", order_id), self._details, order_id)
         except Exception:
-            pass # Tracking is optional, don't break if fail
-            
-        result = (
-            f"💰 Znaleziono Twoje ostatnie zamówienie nr #{order_id}:\n"
-            f"📅 Data: {date}\n"
-            f"📦 Status: **{status_name}**\n"
-            f"💵 Kwota: {total} {currency}"
-            f"{tracking_info}"
-        )
-        return result
-        
-    except Exception as e:
-        return f"Błąd podczas sprawdzania statusu: {str(e)}"
+            return {}
+
+    async def lookup(self, email, limit=1):
+        """[(order, details)] for the customer's newest orders, details fetched in parallel."""
+        orders = await self.latest_orders(email, limit)
+        details = await asyncio.gather(*(self.order_details(order.get('id')) for order in orders))
+        return list(zip(orders, details))
+
+    async def status_message(self, email):
+        """The chatbot's answer for the customer's latest order."""
+        try:
+            found = await self.lookup(email)
+        except Exception as e:
+            return f"Błąd podczas sprawdzania statusu: {str(e)}"
+        if not found:
+            return f"Nie znaleziono zamówień przypisanych do adresu: {email}"
+        return format_status(*found[0])
+
+    def summary(self):
+        s = self.stats
+        return (f"Order lookups: {s['lookups']}, {s['cache_hits']} cached, "
+                f"{s['coalesced']} coalesced, {s['upstream']} upstream requests")
+
+def format_status(order, details):
+    order_id = order.get('id')
+    status_name = order.get('status', {}).get('name', 'Brak danych')
+    date = order.get('date', 'Brak danych')
+    total = order.get('total', '0.00')
+    currency = order.get('payment', {}).get('currency', 'PLN')
+
+    tracking_info = ""
+    trackings = []
+    for s in details.get('shipments', []):
+        num = s.get('tracking_number')
+        courier = s.get('courier_name') or s.get('service') or "Kurier"
+        if num:
+            trackings.append(f"{courier}: {num}")
+    if trackings:
+        tracking_info = "\n\nWysłano przesyłkę:\n- " + "\n- ".join(trackings)
+
+    return (
+        f"💰 Znaleziono Twoje ostatnie zamówienie nr #{order_id}:\n"
+        f"📅 Data: {date}\n"
+        f"📦 Status: **{status_name}**\n"
+        f"💵 Kwota: {total} {currency}"
+        f"{tracking_info}"
+    )
+
+_service = None
+_loop = None
+_lock = threading.Lock()
+
+def get_service():
+    """Process-wide service (shared cache); None without a Sellasist API key."""
+    global _service
+    # Support both spellings just in case
+    api_key = os.environ.get("SELLLASIST_API_KEY") or os.environ.get("SELLASIST_API_KEY")
+    with _lock:
+        if _service is None and api_key:
+            _service = OrderStatusService(api_key)
+    return _service
+
+def service_loop():
+    """Background event loop that runs every lookup of the process-wide service,
+    whichever thread or loop the caller is on."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="order-status", daemon=True).start()
+    return _loop
+
+async def check_order_status_async(email):
+    service = get_service()
+    if service is None:
+        return NO_API_KEY_MESSAGE
+    future = asyncio.run_coroutine_threadsafe(service.status_message(email), service_loop())
+    return await asyncio.wrap_future(future)
+
+def check_order_status(email):
+    """Blocking wrapper for scripts and threads; async callers should await check_order_status_async()."""
+    service = get_service()
+    if service is None:
+        return NO_API_KEY_MESSAGE
+    return asyncio.run_coroutine_threadsafe(service.status_message(email), service_loop()).result()
 
 if __name__ == "__main__":
     import sys
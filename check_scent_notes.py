@@ -0,0 +1,69 @@
+import sys
+from scent_notes import extract_scent_notes
+
+# Descriptions as they appear in the shop's description tab, with the notes we expect
+SAMPLES = [
+    ("Otwarcie kompozycji uderza cynamonem, gałką muszkatołową i bergamotką. "
+     "W sercu rozwijają się daktyle, praliny i tuberoza. "
+     "Bazę tworzy mieszanką wanilii, fasoli tonka, benzoesu i drzewa amyris.",
+     {"top": ["cynamonem", "gałką muszkatołową", "bergamotką"],
+      "heart": ["daktyle", "praliny", "tuberoza"],
+      "base": ["wanilii", "fasoli tonka", "benzoesu", "drzewa amyris"]}),
+    ("Otwarcie kompozycji uderza soczystym grejpfrutem, bergamotką i różowym pieprzem. "
+     "W sercu rozwijają się kardamon, lawenda oraz szafran, które nadają zapachowi ciepła. "
+     "Bazę tworzy mieszanką ambroksanu, drzewa cedrowego i wetiwerii.",
+     {"top": ["soczystym grejpfrutem", "bergamotką", "różowym pieprzem"],
+      "heart": ["kardamon", "lawenda", "szafran"],
+      "base": ["ambroksanu", "drzewa cedrowego", "wetiwerii"]}),
+    ("Na otwarciu zapachu pojawiają się cynamon, kardamon i kwiat pomarańczy. "
+     "W sercu znajdziemy burbon wanilię i pralinę. "
+     "Bazę stanowią ambroksan, gwajak i drzewo sandałowe.",
+     {"top": ["cynamon", "kardamon", "kwiat pomarańczy"],
+      "heart": ["burbon wanilię", "pralinę"],
+      "base": ["ambroksan", "gwajak", "drzewo sandałowe"]}),
+    ("Nuty głowy: bergamotka, cytryna. Nuty serca: róża, jaśmin. Nuty bazy: piżmo, paczula.",
+     {"top": ["bergamotka", "cytryna"], "heart": ["róża", "jaśmin"], "base": ["piżmo", "paczula"]}),
+    # A keyword without a lead-in must not borrow the next sentence
+    ("Zapach zamknięto w sercu pustyni. W sercu kompozycji kryje się oud i szafran.",
+     {"top": [], "heart": ["oud", "szafran"], "base": []}),
+    ("Otwarcie zapachu to cynamon, kardamon i kwiat pomarańczy. "
+     "W sercu znajdziemy burbon wanilię i pralinę. "
+     "Bazę stanowią ambroksan, gwajak i drzewo sandałowe. "
+     "Trwałość i projekcja stoją na bardzo wysokim poziomie.",
+     {"top": ["cynamon", "kardamon", "kwiat pomarańczy"],
+      "heart": ["burbon wanilię", "pralinę"],
+      "base": ["ambroksan", "gwajak", "drzewo sandałowe"]}),
+    ("Otwarcie perfum Khamrah uderza cynamonem i gałką muszkatołową.",
+     {"top": ["cynamonem", "gałką muszkatołową"], "heart": [], "base": []}),
+    ("Otwarcie tego wyjątkowego zapachu uderza świeżą cytryną i bergamotką.",
+     {"top": ["świeżą cytryną", "bergamotką"], "heart": [], "base": []}),
+    ("W samym sercu rozwijają się róża i jaśmin.", {"top": [], "heart": ["róża", "jaśmin"], "base": []}),
+    ("W sercu kompozycji: róża i oud.", {"top": [], "heart": ["róża", "oud"], "base": []}),
+    ("Otwarcie uderza cytryną. Serce natomiast tworzą irys i fiołek.",
+     {"top": ["cytryną"], "heart": ["irys", "fiołek"], "base": []}),
+    ("Bazę zapachu stanowi ambra", {"top": [], "heart": [], "base": ["ambra"]}),
+    # Ordinary prose around the keywords
+    ("Elegancki zapach na wieczór. Idealny prezent dla mężczyzny.",
+     {"top": [], "heart": [], "base": []}),
+    ("Otwarcie butelki to czysta przyjemność, a zapach czuć przez cały dzień.",
+     {"top": [], "heart": [], "base": []}),
+    ("Serce tej kolekcji to elegancja. Baza klientów stanowi dla nas priorytet.",
+     {"top": [], "heart": [], "base": []}),
+    ("Dobra baza tworzy fundament każdej kolekcji.", {"top": [], "heart": [], "base": []}),
+    ("Prezent, który podbije jej serce, uderza elegancją i klasą.", {"top": [], "heart": [], "base": []}),
+    ("", {"top": [], "heart": [], "base": []}),
+]
+
+def main():
+    failures = 0
+    for text, expected in SAMPLES:
+        notes = extract_scent_notes(text)
+        if notes != expected:
+            failures += 1
+            print(f"MISMATCH: {text[:60]!r}\n  expected {expected}\n  got      {notes}")
+
+    print(f"{len(SAMPLES) - failures}/{len(SAMPLES)} scent note samples OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
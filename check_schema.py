@@ -1,20 +1,14 @@
-import os
-from supabase import create_client
-from dotenv import load_dotenv
-
-load_dotenv('/Users/wojciechnowak/.env')
-
-url = os.environ.get("FIRMY_SUPABASE_URL")
-key = os.environ.get("FIRMY_SUPABASE_KEY")
-
-supabase = create_client(url, key)
+import sys
+from catalog_snapshot import load_snapshot, refresh_from_env
 
+# Reads the local snapshot; --refresh pulls the changes from Supabase first
 try:
-    response = supabase.table('perfume_knowledge_base').select("*").limit(1).execute()
-    print("Table 'perfume_knowledge_base' columns:")
-    if response.data:
-        print(response.data[0].keys())
-    else:
-        print("Table is empty.")
+    snapshot = refresh_from_env() if "--refresh" in sys.argv else load_snapshot()
+    if snapshot is not None:
+        print("Table 'perfume_knowledge_base' columns:")
+        if len(snapshot):
+            print(snapshot.columns)
+        else:
+            print("Table is empty.")
 except Exception as e:
     print(f"Error: {e}")
@@ -0,0 +1,46 @@
+import sys
+import tempfile
+from vector_index import VectorIndex, ChunkIndex
+
+ROWS = [
+    {"wp_id": 1, "name": "Khamrah", "brand": "Lattafa", "price": 159, "stock": 1, "embedding": [1.0, 0.0, 0.0]},
+    {"wp_id": 2, "name": "Yara", "brand": "Lattafa", "price": 99, "stock": 0, "embedding": [0.0, 1.0, 0.0]},
+    {"wp_id": 3, "name": "Brak opisu", "brand": "Armaf", "price": 49, "stock": 1, "embedding": None},
+]
+
+def ids(results):
+    return [meta["wp_id"] for _, meta in results]
+
+def load_saved(index):
+    directory = tempfile.mkdtemp()
+    index.save(directory)
+    return VectorIndex.load(directory)
+
+# (what is checked, function returning the result, expected result)
+CASES = [
+    ("empty index, one query", lambda: VectorIndex.from_rows([]).search([1.0, 0.0, 0.0]), []),
+    ("empty index, batch", lambda: VectorIndex.from_rows([]).search_many([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]), [[], []]),
+    ("rows without embeddings only", lambda: VectorIndex.from_rows(ROWS[2:]).search([1.0, 0.0, 0.0]), []),
+    ("empty index after save/load", lambda: load_saved(VectorIndex.from_rows([])).search([1.0, 0.0, 0.0]), []),
+    ("empty chunk index", lambda: ChunkIndex.from_rows([], []).search([1.0, 0.0, 0.0]), []),
+    ("nearest first", lambda: ids(VectorIndex.from_rows(ROWS).search([0.9, 0.1, 0.0])), [1, 2]),
+    ("filters", lambda: ids(VectorIndex.from_rows(ROWS).search([0.9, 0.1, 0.0], in_stock=False)), [2]),
+    ("nothing passes the filters", lambda: VectorIndex.from_rows(ROWS).search([1.0, 0.0, 0.0], brand="Armaf"), []),
+]
+
+def main():
+    failures = 0
+    for name, run, expected in CASES:
+        try:
+            result = run()
+        except Exception as e:
+            result = f"{type(e).__name__}: {e}"
+        if result != expected:
+            failures += 1
+            print(f"MISMATCH: {name}\n  expected {expected}\n  got      {result}")
+
+    print(f"{len(CASES) - failures}/{len(CASES)} vector index checks OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+def cache_key(model, text):
+    """Content address of an embedding: hash of (model name, text)."""
+    return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """On-disk embedding cache (SQLite) with size-bounded LRU eviction.
+
+    Vectors are stored as float32 blobs, which is the precision OpenAI
+    embeddings have anyway. Safe to share between threads.
+    """
+
+    def __init__(self, path, max_entries=50000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, model, texts):
+        """Return {text: embedding} for the texts found in the cache."""
+        keys = {cache_key(model, t): t for t in texts}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = array('f', blob).tolist()
+                if rows:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys.values())) - len(found)
+        return found
+
+    def get(self, model, text):
+        return self.get_many(model, [text]).get(text)
+
+    def put_many(self, model, pairs):
+        """Store (text, embedding) pairs and evict least recently used entries."""
+        now = time.time()
+        rows = [(cache_key(model, text), array('f', vector).tobytes(), now) for text, vector in pairs]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def put(self, model, text, vector):
+        self.put_many(model, [(text, vector)])
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return f"Embedding cache: {self.hits} hits, {self.misses} misses ({self.hit_rate():.0%} hit rate)"
+
+    def close(self):
+        self._conn.close()
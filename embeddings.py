@@ -0,0 +1,157 @@
+import time
+import threading
+from http_client import CircuitOpenError, backoff_delay, retry_after
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# OpenAI allows up to 2048 inputs / ~300k tokens per request; stay well below
+MAX_BATCH_ITEMS = 96
+MAX_BATCH_TOKENS = 60000
+
+# Errors that won't go away by retrying the same input
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+def estimate_tokens(text):
+    """Cheap token estimate (~3 characters per token for Polish text)."""
+    return len(text) // 3 + 1
+
+def pack_batches(items, max_items=MAX_BATCH_ITEMS, max_tokens=MAX_BATCH_TOKENS):
+    """Split (key, text) pairs into batches within the item and token budgets."""
+    batch, batch_tokens = [], 0
+    for key, text in items:
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((key, text))
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+class BatchEmbedder:
+    """Packs many texts into each embeddings.create call.
+
+    Failed sub-batches are retried with exponential backoff; a batch that keeps
+    failing is split in half so one bad input only loses its own embedding.
+    With an EmbeddingCache, texts seen before are served from disk and never
+    sent to OpenAI. With an http_client.Upstream, requests share its rate limit
+    and circuit breaker, and a 429's Retry-After is honoured. Safe to share
+    between threads.
+    """
+
+    def __init__(self, client, model=EMBEDDING_MODEL, max_items=MAX_BATCH_ITEMS,
+                 max_tokens=MAX_BATCH_TOKENS, max_retries=4, backoff=1.0, cache=None, upstream=None):
+        self.client = client
+        self.cache = cache
+        self.upstream = upstream
+        self.model = model
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "texts": 0, "tokens": 0, "retries": 0, "failed": 0, "seconds": 0.0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self.stats[k] += v
+
+    def throughput(self):
+        """Embedded texts per second of time spent in embedding requests."""
+        seconds = self.stats["seconds"]
+        return self.stats["texts"] / seconds if seconds else 0.0
+
+    def summary(self):
+        s = self.stats
+        text = (f"Embeddings: {s['texts']} texts in {s['requests']} requests, "
+                f"{s['tokens']} tokens, {s['retries']} retries, {s['failed']} failed, "
+                f"{self.throughput():.1f} texts/s")
+        if self.cache:
+            text += "\n" + self.cache.summary()
+        if self.upstream:
+            text += "\n" + self.upstream.summary()
+        return text
+
+    def _request(self, texts):
+        trial = self.upstream.acquire() if self.upstream else False
+        start = time.monotonic()
+        try:
+            response = self.client.embeddings.create(input=texts, model=self.model)
+        except Exception as e:
+            if self.upstream:
+                if getattr(e, "status_code", None) == 429:
+                    self.upstream.throttled(retry_after(getattr(getattr(e, "response", None), "headers", None)))
+                else:
+                    self.upstream.failure()
+            raise
+        else:
+            if self.upstream:
+                self.upstream.success()
+        finally:
+            self._count(requests=1, seconds=time.monotonic() - start)
+            if self.upstream:
+                self.upstream.release(trial)
+        usage = getattr(response, "usage", None)
+        tokens = getattr(usage, "total_tokens", None) or sum(estimate_tokens(t) for t in texts)
+        self._count(texts=len(texts), tokens=tokens)
+        # Results carry the input index; don't rely on response order
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    def _embed_batch(self, batch, results):
+        texts = [text for _, text in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self._request(texts)
+                for (key, _), vector in zip(batch, vectors):
+                    results[key] = vector
+                return
+            except CircuitOpenError as e:
+                # OpenAI keeps failing: don't hammer it by splitting the batch
+                for key, _ in batch:
+                    results[key] = None
+                print(f"Skipping {len(batch)} embeddings: {e}")
+                self._count(failed=len(batch))
+                return
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if status in NON_RETRYABLE_STATUS or attempt == self.max_retries:
+                    error = e
+                    break
+                self._count(retries=1)
+                delay = retry_after(getattr(getattr(e, "response", None), "headers", None))
+                time.sleep(delay if delay is not None else backoff_delay(attempt, self.backoff))
+
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            self._embed_batch(batch[:middle], results)
+            self._embed_batch(batch[middle:], results)
+        else:
+            print(f"Error generating embedding for {batch[0][0]}: {error}")
+            self._count(failed=1)
+            results[batch[0][0]] = None
+
+    def embed_many(self, items):
+        """Embed (key, text) pairs. Returns {key: embedding or None}."""
+        results = {}
+        items = list(items)
+        if self.cache:
+            cached = self.cache.get_many(self.model, [text for _, text in items])
+            misses = []
+            for key, text in items:
+                if text in cached:
+                    results[key] = cached[text]
+                else:
+                    misses.append((key, text))
+            items = misses
+
+        for batch in pack_batches(items, self.max_items, self.max_tokens):
+            self._embed_batch(batch, results)
+
+        if self.cache:
+            self.cache.put_many(self.model, [(text, results[key]) for key, text in items if results.get(key)])
+        return results
+
+    def embed(self, text):
+        """Embed a single text (None on failure)."""
+        return self.embed_many([(0, text)])[0]
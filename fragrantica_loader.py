@@ -0,0 +1,112 @@
+import gc
+import os
+import json
+import pickle
+
+# Only these fields of the Fragrantica dump are used by the integration scripts
+FIELDS = ("name", "brand", "notes", "accords", "launch_year", "stats")
+CACHE_VERSION = 1
+
+class FragranticaRecord:
+    """Compact Fragrantica item; supports the dict-style access the scripts use."""
+    __slots__ = FIELDS
+
+    def __init__(self, name=None, brand=None, notes=None, accords=None, launch_year=None, stats=None):
+        self.name = name
+        self.brand = brand
+        self.notes = notes
+        self.accords = accords
+        self.launch_year = launch_year
+        self.stats = stats
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(*(item.get(field) for field in FIELDS))
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in FIELDS else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def as_tuple(self):
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    def __repr__(self):
+        return f"FragranticaRecord(name={self.name!r}, brand={self.brand!r})"
+
+def iter_fragrantica(path, chunk_size=1 << 20):
+    """Stream records from a JSON array file without loading the whole document."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf, pos, eof = "", 0, False
+
+        def fill():
+            # Drop consumed text and append the next chunk
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and (buf[pos].isspace() or buf[pos] in chars):
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        skip("")
+        if pos >= len(buf) or buf[pos] != '[':
+            raise ValueError(f"{path}: expected a JSON array of items")
+        pos += 1
+
+        while True:
+            skip(",")
+            if pos >= len(buf):
+                raise ValueError(f"{path}: unexpected end of file")
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The item continues past the buffer
+                fill()
+                continue
+            pos = end
+            if isinstance(item, dict):
+                yield FragranticaRecord.from_item(item)
+
+def load_fragrantica(path, cache_path=None):
+    """Load Fragrantica records, using a preprocessed pickle cache when it is current.
+
+    The cache is keyed by the dump's size and mtime and rebuilt when they change.
+    """
+    stat = os.stat(path)
+    signature = (CACHE_VERSION, stat.st_size, stat.st_mtime_ns)
+    if cache_path and os.path.exists(cache_path):
+        # The cyclic GC would repeatedly scan the many small containers being created
+        gc.disable()
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_signature, rows = pickle.load(f)
+            if cached_signature == signature:
+                return [FragranticaRecord(*row) for row in rows]
+        except Exception as e:
+            print(f"Ignoring unreadable Fragrantica cache: {e}")
+        finally:
+            gc.enable()
+
+    records = list(iter_fragrantica(path))
+    if cache_path:
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((signature, [r.as_tuple() for r in records]), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return records
@@ -0,0 +1,197 @@
+import re
+import math
+import heapq
+import unicodedata
+from collections import defaultdict
+
+# Tokens that say nothing about which perfume it is
+STOPWORDS = {"de", "la", "le", "the", "by", "for", "and", "pour", "ml", "tester", "zestaw"}
+BRAND_STOPWORDS = {"perfumes", "perfume", "parfums", "parfum", "fragrances", "paris", "london", "dubai"}
+SIZE_RE = re.compile(r'^\d+ml$')
+
+def normalize_name(name):
+    """Normalize perfume name for matching."""
+    if not name:
+        return ""
+    name = name.lower()
+    # Remove common words that might differ
+    name = re.sub(r'\b(perfume|eau de parfum|edp|edt|eau de toilette|extrait|cologne)\b', '', name)
+    # Remove special characters
+    name = re.sub(r'[^a-z0-9 ]', '', name)
+    # Remove extra spaces
+    name = ' '.join(name.split())
+    return name
+
+def fold_accents(text):
+    """'Élixir Łódź' -> 'Elixir Lodz' so accented letters survive normalize_name()."""
+    text = text.replace('ł', 'l').replace('Ł', 'L')
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+def tokenize(text):
+    tokens = normalize_name(fold_accents(text or "")).split()
+    result = []
+    for i, t in enumerate(tokens):
+        # Drop bottle sizes ("100ml", "100 ml") but keep numbers that are part of the name ("212", "No 5")
+        if SIZE_RE.match(t) or (t.isdigit() and i + 1 < len(tokens) and tokens[i + 1] == "ml"):
+            continue
+        if t not in STOPWORDS:
+            result.append(t)
+    return result
+
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class FragranticaMatcher:
+    """Fuzzy brand + name matcher over the Fragrantica dump.
+
+    An inverted token index gives the candidates, tokens without an exact hit
+    are resolved through a trigram index over the vocabulary (typos, missing
+    letters), and candidates are scored by IDF-weighted token overlap:
+
+        0.5 * share of the Fragrantica name found in the product name
+      + 0.3 * share of the product name (minus brand) explained by the candidate
+      + 0.2 * share of the brand found in the product name
+
+    Tokens unknown to the dump get the highest IDF, so an unmatched flanker
+    word ("Yara Moi" vs "Yara") costs a lot of confidence.
+    """
+
+    def __init__(self, items, min_score=0.65, max_candidates=200):
+        self.items = items
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self.exact = {}
+        self.name_tokens = []
+        self.name_weights = []
+        self.brand_tokens = []
+        self.postings = defaultdict(list)
+        self.brand_postings = defaultdict(list)
+        self.trigram_index = defaultdict(set)
+        self._cache = {}
+        self.stats = {"lookups": 0, "exact": 0, "fuzzy": 0, "missed": 0, "cached": 0, "score_sum": 0.0}
+
+        for i, item in enumerate(items):
+            self.exact.setdefault(normalize_name(item.get('name')), i)
+            name_tokens = set(tokenize(item.get('name')))
+            brand_tokens = set(tokenize(item.get('brand'))) - BRAND_STOPWORDS
+            self.name_tokens.append(name_tokens)
+            self.brand_tokens.append(brand_tokens)
+            for token in name_tokens:
+                self.postings[token].append(i)
+            for token in brand_tokens:
+                self.brand_postings[token].append(i)
+
+        n = max(len(items), 1)
+        self.idf = {t: math.log(1 + n / len(ids)) for t, ids in self.postings.items()}
+        self.max_idf = math.log(1 + n)
+        self.brand_vocab = {t for tokens in self.brand_tokens for t in tokens}
+        # Summed once here instead of for every candidate of every lookup
+        self.name_weights = [sum(self._weight(t) for t in tokens) for tokens in self.name_tokens]
+        self.trigram_counts = {}
+        for token in set(self.postings) | self.brand_vocab:
+            grams = trigrams(token)
+            self.trigram_counts[token] = len(grams)
+            for gram in grams:
+                self.trigram_index[gram].add(token)
+
+    def _similar_token(self, token):
+        """Closest vocabulary token by trigram Dice similarity, or (None, 0)."""
+        grams = trigrams(token)
+        counts = defaultdict(int)
+        for gram in grams:
+            for candidate in self.trigram_index.get(gram, ()):
+                counts[candidate] += 1
+        best, best_sim = None, 0.0
+        for candidate, shared in counts.items():
+            sim = 2 * shared / (len(grams) + self.trigram_counts[candidate])
+            if sim > best_sim:
+                best, best_sim = candidate, sim
+        return (best, best_sim) if best_sim >= 0.6 else (None, 0.0)
+
+    def _weight(self, token):
+        return self.idf.get(token, self.max_idf)
+
+    def _score(self, i, query, weights, query_weight):
+        """query: {token: similarity} for the product name; weights: IDF of each
+        query token; query_weight: their sum."""
+        name_tokens = self.name_tokens[i]
+        brand_tokens = self.brand_tokens[i]
+        if not name_tokens:
+            return 0.0
+        name_hit = sum(weights[t] * query[t] for t in name_tokens if t in query)
+        name_cov = name_hit / self.name_weights[i]
+        rest_weight = query_weight - sum(weights[t] for t in brand_tokens if t in query)
+        query_cov = name_hit / rest_weight if rest_weight > 1e-9 else 1.0
+        brand_cov = (sum(query.get(t, 0) for t in brand_tokens) / len(brand_tokens)) if brand_tokens else 0.5
+        return 0.5 * name_cov + 0.3 * min(query_cov, 1.0) + 0.2 * brand_cov
+
+    def _lookup(self, name):
+        exact = self.exact.get(normalize_name(name))
+        if exact is not None:
+            return exact, 1.0, True
+
+        query = {}
+        for token in tokenize(name):
+            if token in self.postings or token in self.brand_vocab:
+                query[token] = 1.0
+                continue
+            similar, sim = self._similar_token(token)
+            if similar:
+                query[similar] = max(query.get(similar, 0.0), sim)
+            else:
+                query[token] = 1.0
+
+        # Only the max_candidates items sharing the most (IDF-weighted) tokens are scored in full
+        weights = {t: self._weight(t) for t in query}
+        query_weight = sum(weights.values())
+        overlap = defaultdict(float)
+        for token in query:
+            weight = weights[token] * query[token]
+            for i in self.postings.get(token, ()):
+                overlap[i] += weight
+        # The brand breaks ties between items sharing the same name words
+        for token in query:
+            ids = self.brand_postings.get(token, ())
+            if ids and len(overlap) > self.max_candidates:
+                weight = math.log(1 + len(self.items) / len(ids)) * query[token]
+                for i in ids:
+                    if i in overlap:
+                        overlap[i] += weight
+        candidates = overlap
+        if len(overlap) > self.max_candidates:
+            candidates = heapq.nlargest(self.max_candidates, overlap, key=overlap.__getitem__)
+
+        best, best_score = None, 0.0
+        for i in candidates:
+            score = self._score(i, query, weights, query_weight)
+            if score > best_score:
+                best, best_score = i, score
+        return best, best_score, False
+
+    def match(self, name):
+        """Best Fragrantica item for a product name: (item, confidence) or (None, 0.0)."""
+        if name in self._cache:
+            self.stats["cached"] += 1
+        else:
+            self._cache[name] = self._lookup(name)
+        i, score, exact = self._cache[name]
+
+        self.stats["lookups"] += 1
+        if i is None or score < self.min_score:
+            self.stats["missed"] += 1
+            return None, 0.0
+        self.stats["exact" if exact else "fuzzy"] += 1
+        self.stats["score_sum"] += score
+        return self.items[i], score
+
+    def match_rate(self):
+        lookups = self.stats["lookups"]
+        return (lookups - self.stats["missed"]) / lookups if lookups else 0.0
+
+    def summary(self):
+        s = self.stats
+        matched = s["exact"] + s["fuzzy"]
+        mean = s["score_sum"] / matched if matched else 0.0
+        return (f"Fragrantica matches: {matched}/{s['lookups']} ({self.match_rate():.0%}), "
+                f"{s['exact']} exact, {s['fuzzy']} fuzzy, mean confidence {mean:.2f}")
@@ -0,0 +1,259 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth another attempt
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Methods that are safe to send twice; others are only retried when the server refused them (429/503)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an upstream that keeps failing."""
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Exponential backoff with jitter: base * 2^attempt, scaled by 0.5-1.5, at most cap."""
+    return min(cap, base * 2 ** attempt * (0.5 + random.random()))
+
+def retry_after(headers):
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts of up to `burst`.
+
+    throttle() halves the rate (and optionally pauses all callers) when the
+    upstream answers 429; every success wins back 5% of the configured rate.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+                self._last = now
+                if now >= self._paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def throttle(self, pause=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if pause:
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class CircuitBreaker:
+    """Stops calls to an upstream after `threshold` consecutive failures.
+
+    While open, calls fail fast with CircuitOpenError; after `reset_timeout`
+    seconds one trial call is let through and its outcome closes or reopens it.
+    A trial that ends without a verdict (throttled, unexpected error) reopens
+    it too, so the breaker never waits on a trial that is already over.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before(self, name=""):
+        """Returns True if this call is the half-open trial."""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._trial = True
+                return True
+        raise CircuitOpenError(f"Circuit open for {name or 'upstream'} after {self.failures} consecutive failures")
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+    def abandon(self):
+        """The trial call is over without success() or failure(): reopen and wait again."""
+        with self._lock:
+            if self._trial:
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+class Upstream:
+    """Rate limit + circuit breaker for one upstream service (rate=None: no rate limit)."""
+
+    def __init__(self, name, rate=None, burst=None, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def acquire(self):
+        """Wait for a slot. Returns True if the call is the breaker's half-open trial;
+        pass that to release() once the call is over."""
+        try:
+            trial = self.breaker.before(self.name)
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        if self.bucket:
+            self.bucket.acquire()
+        self._count("requests")
+        return trial
+
+    def release(self, trial):
+        if trial:
+            self.breaker.abandon()
+
+    def success(self):
+        self.breaker.success()
+        if self.bucket:
+            self.bucket.recover()
+
+    def failure(self):
+        self._count("failures")
+        self.breaker.failure()
+
+    def throttled(self, pause=None):
+        """The upstream asked us to slow down (429); not a failure of the upstream."""
+        self._count("throttled")
+        if self.bucket:
+            self.bucket.throttle(pause)
+
+    def retry(self, delay):
+        self._count("retries")
+        time.sleep(delay)
+
+    def summary(self):
+        s = self.stats
+        text = (f"{self.name}: {s['requests']} requests, {s['retries']} retries, "
+                f"{s['throttled']} throttled, {s['failures']} failures")
+        if s["rejected"]:
+            text += f", {s['rejected']} rejected by open circuit"
+        return text
+
+class RetrySession(requests.Session):
+    """requests.Session with a pooled connection adapter, per-host rate limits,
+    retries with backoff (honouring Retry-After) and a circuit breaker per host.
+
+    rates: {host: requests per second}; hosts not listed use default_rate
+    (None: unlimited). Every request gets `timeout` unless one is passed.
+    Once the retries are used up the last response is returned as usual, so
+    callers keep using raise_for_status().
+    """
+
+    def __init__(self, rates=None, default_rate=None, pool_size=20, max_retries=4,
+                 backoff=0.5, max_backoff=30.0, timeout=30, failure_threshold=5, reset_timeout=30.0):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.upstreams = {}
+        self._upstreams_lock = threading.Lock()
+
+    def upstream(self, url):
+        host = urlparse(url).netloc or url
+        with self._upstreams_lock:
+            if host not in self.upstreams:
+                self.upstreams[host] = Upstream(host, self.rates.get(host, self.default_rate),
+                                                failure_threshold=self.failure_threshold,
+                                                reset_timeout=self.reset_timeout)
+            return self.upstreams[host]
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        upstream = self.upstream(url)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        for attempt in range(self.max_retries + 1):
+            trial = upstream.acquire()
+            try:
+                try:
+                    response = super().request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    upstream.failure()
+                    if not idempotent or attempt == self.max_retries:
+                        raise
+                    delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+                else:
+                    status = response.status_code
+                    if status not in RETRY_STATUS:
+                        upstream.success()
+                        return response
+                    delay = retry_after(response.headers)
+                    if status == 429:
+                        upstream.throttled(delay)
+                    else:
+                        upstream.failure()
+                    if attempt == self.max_retries or not (idempotent or status in (429, 503)):
+                        return response
+                    response.close()
+                    delay = (min(delay, self.max_backoff) if delay is not None
+                             else backoff_delay(attempt, self.backoff, self.max_backoff))
+            finally:
+                # A trial that was throttled or raised something unexpected reopens the breaker
+                upstream.release(trial)
+            upstream.retry(delay)
+
+    def totals(self):
+        """Upstream stats summed over all hosts."""
+        totals = {}
+        for upstream in list(self.upstreams.values()):
+            for k, v in upstream.stats.items():
+                totals[k] = totals.get(k, 0) + v
+        return totals
+
+    def summary(self):
+        return "\n".join(u.summary() for u in self.upstreams.values())
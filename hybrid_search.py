@@ -0,0 +1,307 @@
+import os
+import re
+import json
+import math
+import time
+import argparse
+import numpy as np
+from openai import OpenAI
+from supabase import create_client
+from dotenv import load_dotenv
+from embeddings import BatchEmbedder
+from fragrantica_matcher import fold_accents
+from sync_state import write_npz_atomic
+from vector_index import META_FIELDS, parse_embedding, fetch_rows, load_dump
+
+SEARCH_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_index.npz")
+FORMAT_VERSION = 1
+
+# How much a query term found in each field counts (BM25F-style field weights)
+FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "scent_notes_combined": 1.5, "description": 1.0}
+TEXT_FIELDS = tuple(FIELD_WEIGHTS)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion: a result scores weight / (RRF_K + rank) in each ranking it appears in
+RRF_K = 60
+# Nearest neighbours taken from the vector side before fusing
+VECTOR_CANDIDATES = 100
+# Polish inflects the ends of words ("wanilią", "wanilia"); comparing prefixes is a cheap stemmer
+STEM_LENGTH = 7
+STOPWORDS = {"i", "w", "z", "na", "do", "dla", "o", "a", "ze", "od", "to", "jest", "sie", "nie", "oraz", "the", "of",
+             "and", "brak", "danych", "opisu"}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """Lowercase, accent-folded, stemmed tokens without stopwords."""
+    return [t[:STEM_LENGTH] for t in TOKEN_RE.findall(fold_accents(text or "").lower()) if t not in STOPWORDS]
+
+def term_weights(record):
+    """{term: weighted frequency} over the text fields of a record, and the weighted length."""
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(record.get(field)):
+            weights[token] = weights.get(token, 0.0) + weight
+    return weights, sum(weights.values())
+
+class HybridIndex:
+    """BM25 over name, brand, scent notes and description, fused with cosine
+    similarity of the product embeddings.
+
+    Products live in slots of parallel arrays (price, stock, brand, vector),
+    so the stock/price/brand filters are one vectorized mask; the inverted
+    index maps each term to {slot: weighted term frequency}. upsert() and
+    remove() change single products in place, so the sync can keep the index
+    current without rebuilding it. Lexical and vector rankings are combined
+    with reciprocal rank fusion, which needs no score calibration: an exact
+    brand/name hit ranks first lexically even when its vector is only close.
+    """
+
+    def __init__(self, dim=0, capacity=1024):
+        self.slot_of = {}
+        self.free = []
+        self.postings = {}
+        self.terms = []
+        self.meta = []
+        self.total_length = 0.0
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.lengths = np.zeros(capacity, dtype=np.float32)
+        self.prices = np.zeros(capacity, dtype=np.float32)
+        self.stock = np.zeros(capacity, dtype=np.int8)
+        self.brands = np.full(capacity, "", dtype=object)
+        self.has_vector = np.zeros(capacity, dtype=bool)
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def _grow(self):
+        capacity = len(self.ids)
+        self.ids = np.concatenate([self.ids, np.full(capacity, -1, dtype=np.int64)])
+        for name in ("lengths", "prices", "stock", "has_vector"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros(capacity, dtype=array.dtype)]))
+        self.brands = np.concatenate([self.brands, np.full(capacity, "", dtype=object)])
+        self.vectors = np.concatenate([self.vectors, np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)])
+
+    def _slot(self, wp_id):
+        slot = self.slot_of.get(wp_id)
+        if slot is not None:
+            self._unindex(slot)
+            return slot
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.meta)
+            if slot >= len(self.ids):
+                self._grow()
+            self.meta.append(None)
+            self.terms.append(None)
+        self.slot_of[wp_id] = slot
+        self.ids[slot] = wp_id
+        return slot
+
+    def _unindex(self, slot):
+        for term in self.terms[slot]:
+            postings = self.postings[term]
+            del postings[slot]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= float(self.lengths[slot])
+
+    def _set_vector(self, slot, vector):
+        if vector is None:
+            self.has_vector[slot] = False
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.vectors.shape[1] != len(vector):
+            if self.has_vector.any():
+                raise ValueError(f"Embedding has {len(vector)} dimensions, the index {self.vectors.shape[1]}")
+            self.vectors = np.zeros((len(self.ids), len(vector)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        self.vectors[slot] = vector / norm if norm else vector
+        self.has_vector[slot] = True
+
+    def upsert(self, records):
+        """Add or replace products. A record without an 'embedding' key keeps
+        the product's current vector (the sync leaves it out when only
+        price or stock changed)."""
+        for record in records:
+            slot = self._slot(record["wp_id"])
+            terms, length = term_weights(record)
+            self._index(slot, terms, length, {k: record.get(k) for k in META_FIELDS})
+            if "embedding" in record:
+                self._set_vector(slot, parse_embedding(record["embedding"]))
+
+    def _index(self, slot, terms, length, meta):
+        for term, weight in terms.items():
+            self.postings.setdefault(term, {})[slot] = weight
+        self.terms[slot] = list(terms)
+        self.lengths[slot] = length
+        self.total_length += length
+        self.meta[slot] = meta
+        self.prices[slot] = float(meta.get("price") or 0)
+        self.stock[slot] = int(meta.get("stock") or 0)
+        self.brands[slot] = (meta.get("brand") or "").lower()
+
+    def remove(self, wp_ids):
+        for wp_id in wp_ids:
+            slot = self.slot_of.pop(wp_id, None)
+            if slot is None:
+                continue
+            self._unindex(slot)
+            self.terms[slot] = []
+            self.meta[slot] = None
+            self.ids[slot] = -1
+            self.lengths[slot] = 0
+            self.has_vector[slot] = False
+            self.free.append(slot)
+
+    def mask(self, min_price=None, max_price=None, in_stock=None, brand=None):
+        """Boolean mask of the slots passing the filters."""
+        mask = self.ids >= 0
+        if min_price is not None:
+            mask &= self.prices >= min_price
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if in_stock is not None:
+            mask &= self.stock == (1 if in_stock else 0)
+        if brand:
+            mask &= self.brands == brand.lower()
+        return mask
+
+    def bm25(self, query):
+        """BM25 score of every slot for the query (0 where no term matches)."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        count = len(self)
+        if not count:
+            return scores
+        avg_length = self.total_length / count or 1.0
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            slots = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[slots] / avg_length)
+            scores[slots] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, query_vector=None, k=10, lexical_weight=1.0, vector_weight=1.0, **filters):
+        """Top-k [(score, meta)] for a text query, fused with the query
+        embedding's nearest products when query_vector is given.
+        Filters: min_price, max_price, in_stock, brand."""
+        mask = self.mask(**filters)
+        rankings = []
+        lexical = self.bm25(query)
+        lexical[~mask] = 0
+        hits = np.flatnonzero(lexical > 0)
+        if len(hits):
+            rankings.append((lexical_weight, hits[np.argsort(-lexical[hits], kind='stable')]))
+        if query_vector is not None and self.has_vector.any():
+            candidates = np.flatnonzero(mask & self.has_vector)
+            if len(candidates):
+                query_vector = np.asarray(query_vector, dtype=np.float32)
+                query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+                similarity = self.vectors[candidates] @ query_vector
+                n = min(VECTOR_CANDIDATES, len(candidates))
+                top = np.argpartition(-similarity, n - 1)[:n]
+                rankings.append((vector_weight, candidates[top[np.argsort(-similarity[top])]]))
+
+        fused = {}
+        for weight, ranked in rankings:
+            for rank, slot in enumerate(ranked[:max(VECTOR_CANDIDATES, k)].tolist(), start=1):
+                fused[slot] = fused.get(slot, 0.0) + weight / (RRF_K + rank)
+        best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+        return [(score, self.meta[slot]) for slot, score in best]
+
+    @classmethod
+    def from_rows(cls, rows):
+        index = cls()
+        index.upsert(rows)
+        return index
+
+    def save(self, path=SEARCH_INDEX_PATH):
+        """Write the index (terms per product, metadata and vectors) atomically."""
+        slots = sorted(self.slot_of.values())
+        docs = [{"meta": self.meta[s], "terms": {t: self.postings[t][s] for t in self.terms[s]},
+                 "length": float(self.lengths[s])} for s in slots]
+        header = {"version": FORMAT_VERSION, "saved": time.strftime('%Y-%m-%dT%H:%M:%S'), "docs": docs}
+        write_npz_atomic({"docs": np.frombuffer(json.dumps(header, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+                          "vectors": self.vectors[slots], "has_vector": self.has_vector[slots]}, path)
+
+    @classmethod
+    def load(cls, path=SEARCH_INDEX_PATH):
+        data = np.load(path, allow_pickle=False)
+        header = json.loads(data["docs"].tobytes().decode('utf-8'))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported search index format {header.get('version')} in {path}")
+        vectors, has_vector = data["vectors"], data["has_vector"]
+        index = cls(dim=vectors.shape[1], capacity=max(1024, len(header["docs"])))
+        for doc in header["docs"]:
+            slot = index._slot(doc["meta"]["wp_id"])
+            index._index(slot, doc["terms"], doc["length"], doc["meta"])
+        count = len(header["docs"])
+        index.vectors[:count] = vectors
+        index.has_vector[:count] = has_vector
+        return index
+
+def open_index(path=SEARCH_INDEX_PATH):
+    """The saved index for the sync to keep current, or None if it was never built."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return HybridIndex.load(path)
+    except Exception as e:
+        print(f"Not updating the search index {path}: {e}")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Hybrid BM25 + vector product search over perfume_knowledge_base.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build the local search index")
+    build.add_argument("--dump", help="read rows from a local JSON dump instead of Supabase")
+    build.add_argument("--snapshot", help="read rows from a catalog_snapshot.py snapshot instead of Supabase")
+    build.add_argument("--out", default=SEARCH_INDEX_PATH)
+    query = sub.add_parser("search", help="search the local index")
+    query.add_argument("text")
+    query.add_argument("-k", type=int, default=10)
+    query.add_argument("--index", default=SEARCH_INDEX_PATH)
+    query.add_argument("--min-price", type=float)
+    query.add_argument("--max-price", type=float)
+    query.add_argument("--in-stock", action="store_true", default=None)
+    query.add_argument("--brand")
+    query.add_argument("--lexical", action="store_true", help="BM25 only (no query embedding)")
+    args = parser.parse_args()
+
+    load_dotenv('/Users/wojciechnowak/.env')
+    columns = tuple(dict.fromkeys(META_FIELDS + TEXT_FIELDS + ("embedding",)))
+
+    if args.command == "build":
+        if args.dump:
+            rows = load_dump(args.dump)
+        elif args.snapshot:
+            from catalog_snapshot import CatalogSnapshot
+            rows = CatalogSnapshot.load(args.snapshot).rows(columns)
+        else:
+            supabase = create_client(os.environ.get("FIRMY_SUPABASE_URL"), os.environ.get("FIRMY_SUPABASE_KEY"))
+            rows = fetch_rows(supabase, columns=columns)
+        index = HybridIndex.from_rows(rows)
+        index.save(args.out)
+        print(f"Indexed {len(index)} products ({int(index.has_vector.sum())} with embeddings) into {args.out}")
+        return
+
+    index = HybridIndex.load(args.index)
+    query_vector = None
+    if not args.lexical:
+        query_vector = BatchEmbedder(OpenAI(api_key=os.environ.get("OPEN_AI_API"))).embed(args.text)
+    start = time.perf_counter()
+    results = index.search(args.text, query_vector, k=args.k, min_price=args.min_price, max_price=args.max_price,
+                           in_stock=args.in_stock, brand=args.brand)
+    elapsed = time.perf_counter() - start
+    for score, meta in results:
+        print(f"{score:.4f} | {meta['name']} ({meta['brand']}) | {meta['price']} PLN | stock: {meta['stock']}")
+    print(f"{len(results)} results in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
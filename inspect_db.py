@@ -1,20 +1,14 @@
-import os
-from supabase import create_client
-from dotenv import load_dotenv
-
-load_dotenv('/Users/wojciechnowak/.env')
-
-url = os.environ.get("FIRMY_SUPABASE_URL")
-key = os.environ.get("FIRMY_SUPABASE_KEY")
-
-supabase = create_client(url, key)
+import sys
+from catalog_snapshot import load_snapshot, refresh_from_env
 
+# Reads the local snapshot; --refresh pulls the changes from Supabase first
 try:
-    response = supabase.table('perfume_knowledge_base').select("*").limit(1).order('last_updated', desc=True).execute()
-    for row in response.data:
-        print(f"ID: {row['id']} | Name: {row['name']}")
-        print(f"Description:\n{row['description']}")
-        print(f"Scent Notes: {row['scent_notes_combined']}")
-        print("-" * 50)
+    snapshot = refresh_from_env() if "--refresh" in sys.argv else load_snapshot()
+    if snapshot is not None:
+        for row in snapshot.latest(1):
+            print(f"ID: {row['id']} | Name: {row['name']}")
+            print(f"Description:\n{row['description']}")
+            print(f"Scent Notes: {row['scent_notes_combined']}")
+            print("-" * 50)
 except Exception as e:
     print(f"Error: {e}")
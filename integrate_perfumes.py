@@ -1,282 +1,436 @@
 import os
 import json
-import re
+import time
+import argparse
 import requests
 from bs4 import BeautifulSoup
 from openai import OpenAI
 from supabase import create_client
 from dotenv import load_dotenv
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http_client import RetrySession, Upstream
+from sync_state import write_json_atomic, load_checkpoint, save_checkpoint, clear_checkpoint
+from embeddings import BatchEmbedder
+from embedding_cache import EmbeddingCache
+from supabase_writer import UpsertWriter
+from fragrantica_matcher import FragranticaMatcher
+from fragrantica_loader import load_fragrantica
+from product_parser import parse_wp_product, default_backend, BACKENDS
+from run_metrics import RunMetrics, collect_sync_stats
+from hybrid_search import SEARCH_INDEX_PATH, open_index
 
 # Load environment variables
 load_dotenv('/Users/wojciechnowak/.env')
 
 # API Clients
-openai_client = OpenAI(api_key=os.environ.get("OPEN_AI_API"))
+# Retries are handled by BatchEmbedder
+openai_client = OpenAI(api_key=os.environ.get("OPEN_AI_API"), max_retries=0, timeout=60)
 supabase_url = os.environ.get("FIRMY_SUPABASE_URL")
 supabase_key = os.environ.get("FIRMY_SUPABASE_KEY")
 supabase = create_client(supabase_url, supabase_key)
 
 # Paths
 FRAGRANTICA_DATA_PATH = "/Users/wojciechnowak/Documents/Clients/Perfun/Fragrantica - Adam/scraped_fragrantica_data.json"
+FRAGRANTICA_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fragrantica_cache.pickle")
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache.sqlite")
+SCRAPE_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_state.json")
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_checkpoint.json")
 
-def normalize_name(name):
-    """Normalize perfume name for matching."""
-    if not name:
-        return ""
-    name = name.lower()
-    # Remove common words that might differ
-    name = re.sub(r'\b(perfume|eau de parfum|edp|edt|eau de toilette|extrait|cologne)\b', '', name)
-    # Remove special characters
-    name = re.sub(r'[^a-z0-9 ]', '', name)
-    # Remove extra spaces
-    name = ' '.join(name.split())
-    return name
+# Scraper settings (replace the fixed 1s delay between pages)
+SITEMAP_URL = "https://perfun.pl/product-sitemap.xml"
+SCRAPE_WORKERS = 8
+SCRAPE_RATE_PER_HOST = 15  # requests per second
+OPENAI_RATE_LIMIT = 20
+UPLOAD_BATCH_SIZE = 50
+CHECKPOINT_INTERVAL = 5.0  # seconds between checkpoint writes during a run
+SUPABASE_MAX_CONCURRENCY = 2
+PARSER_BACKEND = default_backend()
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
 
-def get_all_product_urls():
-    """Fetch all product URLs from the sitemap."""
+embedder = BatchEmbedder(openai_client, cache=EmbeddingCache(EMBEDDING_CACHE_PATH),
+                         upstream=Upstream("api.openai.com", OPENAI_RATE_LIMIT))
+writer = UpsertWriter(supabase, workers=SUPABASE_MAX_CONCURRENCY)
+# Stage timers and counters of the current run
+metrics = RunMetrics("integrate_perfumes")
+
+def get_product_sitemap_entries(session=requests):
+    """Fetch (url, lastmod) for all products in the sitemap; lastmod may be None."""
     print("Fetching product URLs from sitemap...")
-    sitemap_url = "https://perfun.pl/product-sitemap.xml"
     headers = {'User-Agent': 'Mozilla/5.0'}
     try:
-        response = requests.get(sitemap_url, headers=headers, timeout=15)
+        response = session.get(SITEMAP_URL, headers=headers, timeout=15)
         soup = BeautifulSoup(response.content, 'xml')
-        urls = [loc.text for loc in soup.find_all('loc')]
+        entries = []
+        for entry in soup.find_all('url'):
+            loc = entry.find('loc')
+            lastmod = entry.find('lastmod')
+            if loc:
+                entries.append((loc.text.strip(), lastmod.text.strip() if lastmod else None))
         # Filter only product URLs
-        product_urls = [u for u in urls if '/produkt/' in u]
-        print(f"Found {len(product_urls)} actual product URLs in sitemap (out of {len(urls)} total entries).")
-        return product_urls
+        product_entries = [e for e in entries if '/produkt/' in e[0]]
+        print(f"Found {len(product_entries)} actual product URLs in sitemap (out of {len(entries)} total entries).")
+        return product_entries
     except Exception as e:
         print(f"Error fetching sitemap: {e}")
         return []
 
-def scrape_wp_product(url):
+def get_all_product_urls():
+    """Fetch all product URLs from the sitemap."""
+    return [url for url, _ in get_product_sitemap_entries()]
+
+def fetch_product_page(url, session=requests, validators=None):
+    """GET a product page. With stored ETag/Last-Modified validators the request is
+    conditional and a 304 response means the page is unchanged."""
+    headers = dict(BROWSER_HEADERS)
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    with metrics.timer("fetch"):
+        response = session.get(url, headers=headers, timeout=15)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+def scrape_wp_product(url, session=requests):
     """Scrape full product details from WordPress URL."""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    }
     try:
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        data = {}
-        data['product_url'] = url
-        
-        # WP ID
-        shortlink = soup.find('link', rel='shortlink')
-        data['wp_id'] = int(shortlink['href'].split('p=')[1]) if shortlink and 'p=' in shortlink['href'] else None
-
-        # Name
-        data['name'] = soup.find('h1', class_='product_title').get_text(strip=True) if soup.find('h1', class_='product_title') else "N/A"
-        
-        # Image
-        img_meta = soup.find('meta', property='og:image')
-        data['image_url'] = img_meta['content'] if img_meta else "N/A"
-
-        # Price
-        price_container = soup.select_one('p.price')
-        if price_container:
-            amounts = price_container.find_all('span', class_='woocommerce-Price-amount')
-            if amounts:
-                prices = [re.sub(r'[^\d,]', '', a.get_text()) for a in amounts]
-                data['price'] = float(prices[-1].replace(',', '.'))
-            else:
-                data['price'] = 0.0
-        else:
-            data['price'] = 0.0
-
-        # Description
-        opis_div = soup.find('div', id='cgkit-tab-description')
-        full_txt = ""
-        if opis_div:
-            for noise in opis_div.find_all(['script', 'style', 'button']):
-                noise.decompose()
-            full_txt = opis_div.get_text(separator=' ', strip=True)
-            data['description'] = full_txt
-        else:
-            data['description'] = "Brak opisu"
-            
-        # Notes
-        def find_scent_notes_fixed(keyword, text):
-            pattern = rf"{keyword}\s+[^.]*?\s+(?:uderza|rozwijają się|tworzy|mieszanką)\s+([^.]*)"
-            match = re.search(pattern, text, re.IGNORECASE)
-            if not match:
-                pattern = rf"{keyword}\s+(?:[^.]*?)\s+([^.]*)"
-                match = re.search(pattern, text, re.IGNORECASE)
-            return match.group(1).strip() if match else "N/A"
-        
-        data['nuty_glowy'] = find_scent_notes_fixed("Otwarcie", full_txt)
-        data['nuty_serca'] = find_scent_notes_fixed("sercu", full_txt)
-        data['nuty_bazy'] = find_scent_notes_fixed("Bazę", full_txt)
-        
-        # Attributes
-        rows = soup.find_all('tr')
-        for row in rows:
-            cells = row.find_all(['td', 'th'])
-            if len(cells) >= 2:
-                label = cells[0].get_text(strip=True).lower()
-                val = cells[1].get_text(strip=True)
-                if 'pojemność' in label: data['capacity'] = val
-                elif 'koncentracja' in label: data['concentration'] = val
-                elif 'płeć' in label: data['gender'] = val
-        
-        # Stock status
-        data['stock'] = 1 if soup.find('p', class_='in-stock') else 0
-        
-        return data
+        response = fetch_product_page(url, session)
+        with metrics.timer("parse"):
+            return parse_wp_product(response.content, url, backend=PARSER_BACKEND)
     except Exception as e:
         print(f"Error scraping {url}: {e}")
         return None
 
-def get_embedding(text):
-    """Generate embedding for text using OpenAI."""
-    if not text or text == "Brak opisu":
-        return None
+def scrape_if_changed(url, session, validators=None):
+    """Fetch and parse a page unless the server reports it unchanged.
+
+    Returns (status, scraped, validators) with status 'ok', 'unchanged' or 'error'.
+    """
     try:
-        response = openai_client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
+        response = fetch_product_page(url, session, validators)
+        if response.status_code == 304:
+            return "unchanged", None, validators
+        new_validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        with metrics.timer("parse"):
+            scraped = parse_wp_product(response.content, url, backend=PARSER_BACKEND)
+        return "ok", scraped, new_validators
     except Exception as e:
-        print(f"Error generating embedding: {e}")
+        print(f"Error scraping {url}: {e}")
+        return "error", None, None
+
+def load_scrape_state():
+    """Per-URL sitemap lastmod and HTTP validators from the last run."""
+    if not os.path.exists(SCRAPE_STATE_PATH):
+        return {}
+    with open(SCRAPE_STATE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def should_embed(text):
+    return bool(text) and text != "Brak opisu"
+
+def get_embedding(text):
+    """Generate embedding for text using OpenAI."""
+    if not should_embed(text):
         return None
+    return embedder.embed(text)
 
-def integrate():
-    print("Loading data...")
-    # Load Fragrantica data
-    with open(FRAGRANTICA_DATA_PATH, 'r', encoding='utf-8') as f:
-        fragrantica_data = json.load(f)
+def embed_records(records):
+    """Embed all records still missing an embedding with batched OpenAI requests."""
+    pending = [(i, r["description"]) for i, r in enumerate(records)
+               if r["embedding"] is None and should_embed(r["description"])]
+    vectors = embedder.embed_many(pending)
+    for i, vector in vectors.items():
+        records[i]["embedding"] = vector
+    return records
+
+def build_scraped_record(scraped, matcher):
+    """Combine a scraped page with Fragrantica data into a Supabase record (without embedding)."""
+    # Match with Fragrantica
+    with metrics.timer("match"):
+        frag_match, _ = matcher.match(scraped['name'])
     
-    # Create matching map
-    frag_map = {normalize_name(item['name']): item for item in fragrantica_data}
+    # Combine notes
+    scent_notes = []
+    if scraped.get('nuty_glowy') and scraped['nuty_glowy'] != "N/A":
+        scent_notes.append(f"Głowa: {scraped['nuty_glowy']}")
+    if scraped.get('nuty_serca') and scraped['nuty_serca'] != "N/A":
+        scent_notes.append(f"Serce: {scraped['nuty_serca']}")
+    if scraped.get('nuty_bazy') and scraped['nuty_bazy'] != "N/A":
+        scent_notes.append(f"Baza: {scraped['nuty_bazy']}")
+        
+    if frag_match and frag_match.get('notes'):
+        frag_notes_raw = frag_match['notes']
+        if isinstance(frag_notes_raw, list):
+            scent_notes.append(f"Fragrantica Notes: {', '.join(frag_notes_raw)}")
+        elif isinstance(frag_notes_raw, dict):
+            frag_notes = frag_notes_raw.get('notes', {})
+            if isinstance(frag_notes, list):
+                 scent_notes.append(f"Fragrantica Notes: {', '.join(frag_notes)}")
+            elif isinstance(frag_notes, dict):
+                if frag_notes.get('top'):
+                    scent_notes.append(f"Fragrantica Top: {', '.join(frag_notes['top'])}")
+                if frag_notes.get('middle'):
+                    scent_notes.append(f"Fragrantica Middle: {', '.join(frag_notes['middle'])}")
+                if frag_notes.get('base'):
+                    scent_notes.append(f"Fragrantica Base: {', '.join(frag_notes['base'])}")
     
-    # Fetch URLs from web
-    urls = get_all_product_urls()
+    accords_str = ""
+    if frag_match and frag_match.get('accords'):
+        accords = []
+        for acc in frag_match['accords']:
+            for k, v in acc.items():
+                # Round for readability
+                accords.append(f"{k} ({round(v, 1)}%)")
+        accords_str = "Akordy: " + ", ".join(accords)
+        
+    # Add stats from Fragrantica
+    stats_list = []
+    if frag_match:
+        if frag_match.get('launch_year'):
+            stats_list.append(f"Rok premiery: {frag_match['launch_year']}")
+        if frag_match.get('stats'):
+            s = frag_match['stats']
+            if s.get('longevity'): stats_list.append(f"Trwałość: {s['longevity']}/5")
+            if s.get('sillage'): stats_list.append(f"Projekcja: {s['sillage']}/5")
     
-    processed_count = 0
-    batch_size = 10
-    records_to_upload = []
+    stats_str = " | ".join(stats_list) if stats_list else ""
+        
+    # Add attributes to description
+    attrs = []
+    if scraped.get('capacity'): attrs.append(f"Pojemność: {scraped['capacity']}")
+    if scraped.get('concentration'): attrs.append(f"Koncentracja: {scraped['concentration']}")
+    if scraped.get('gender'): attrs.append(f"Płeć: {scraped['gender']}")
     
-    for url in urls:
-        print(f"Processing URL: {url}")
+    attr_str = " | ".join(attrs) if attrs else ""
+    
+    # Prepare full description for embedding and database
+    full_description = scraped.get('description', "Brak opisu")
+    if attr_str:
+        full_description += "\n\n" + attr_str
+    if stats_str:
+        full_description += "\n\n" + stats_str
+    if accords_str:
+        full_description += "\n\n" + accords_str
         
-        # Scrape full data from web
-        scraped = scrape_wp_product(url)
-        if not scraped or scraped['name'] == "N/A":
-            print(f"Skipping {url} due to scraping failure.")
+    return {
+        "wp_id": scraped['wp_id'],
+        "name": scraped['name'],
+        "brand": frag_match['brand'] if frag_match else scraped['name'].split()[0], # Fallback brand
+        "price": scraped['price'],
+        "stock": scraped['stock'],
+        "description": full_description,
+        "scent_notes_combined": " | ".join(scent_notes) if scent_notes else "Brak danych",
+        "image_url": scraped['image_url'],
+        "product_url": scraped['product_url'],
+        "embedding": None  # filled in per upload batch
+    }
+
+def embedding_failed(record):
+    """True if the record was due a vector but embedding its description failed."""
+    return "embedding" in record and record["embedding"] is None and should_embed(record["description"])
+
+def upload_records(records):
+    """Embed and upsert a batch of records. Returns the records that could not be written.
+
+    Records whose embedding failed are written without the embedding column,
+    so the stored vector is kept; flush() leaves them to be retried."""
+    with metrics.timer("embed"):
+        embed_records(records)
+    unembedded = [r for r in records if embedding_failed(r)]
+    if unembedded:
+        metrics.count("embeddings_failed", len(unembedded))
+        records = [{k: v for k, v in r.items() if k != "embedding"} if embedding_failed(r) else r for r in records]
+    with metrics.timer("upsert"):
+        rejected = writer.write(records)
+    if rejected:
+        metrics.count("rows_rejected", len(rejected))
+    return rejected
+
+def integrate(incremental=False, resume=False):
+    """Scrape the shop and upsert all products.
+
+    Pages are fetched in parallel over one pooled session with a per-host rate
+    limit, retries and a circuit breaker. In incremental mode pages whose
+    sitemap <lastmod> is unchanged are not requested at all, and the rest are
+    fetched conditionally (ETag / Last-Modified), skipping pages that answer 304.
+
+    The URLs finished so far and the scraped records not yet uploaded are
+    checkpointed during the run; with resume=True an interrupted run skips
+    the finished URLs and uploads the saved records first. Uploaded products
+    are updated in the local search index when it has been built.
+    Returns the run's metrics.
+    """
+    metrics.reset()
+    print("Loading data...")
+    with metrics.timer("load_fragrantica"):
+        # Load Fragrantica data (streamed, only the fields we use)
+        fragrantica_data = load_fragrantica(FRAGRANTICA_DATA_PATH, FRAGRANTICA_CACHE_PATH)
+
+        # Build the fuzzy matching index
+        matcher = FragranticaMatcher(fragrantica_data)
+    search_index = open_index(SEARCH_INDEX_PATH)
+
+    state = load_scrape_state()
+    pending_state = {}
+    records_to_upload = []
+    done = set()
+    checkpoint = load_checkpoint(CHECKPOINT_PATH)
+    if checkpoint and not resume:
+        print(f"Starting over; the unfinished run in {CHECKPOINT_PATH} is discarded (use --resume to continue it).")
+        checkpoint = None
+    elif resume and not checkpoint:
+        print("No checkpoint to resume from; starting a new run.")
+    if checkpoint:
+        incremental = checkpoint["incremental"]
+        done = set(checkpoint["done"])
+        records_to_upload = checkpoint["pending"]
+        pending_state = checkpoint["pending_state"]
+        print(f"Resuming the run started at {checkpoint['run_started']}: {len(done)} pages done, "
+              f"{len(records_to_upload)} records waiting for upload")
+    run_started = checkpoint["run_started"] if checkpoint else time.strftime('%Y-%m-%dT%H:%M:%S')
+    session = RetrySession(default_rate=SCRAPE_RATE_PER_HOST, pool_size=SCRAPE_WORKERS)
+    
+    # Fetch URLs from web
+    with metrics.timer("sitemap"):
+        entries = get_product_sitemap_entries(session)
+    to_scrape = []
+    unchanged_count = 0
+    carried = {r['product_url'] for r in records_to_upload}
+    for url, lastmod in entries:
+        if url in done or url in carried:
             continue
-            
-        print(f"Scraped product: {scraped['name']}")
-        
-        # Match with Fragrantica
-        norm_name = normalize_name(scraped['name'])
-        frag_match = frag_map.get(norm_name)
-        
-        # Combine notes
-        scent_notes = []
-        if scraped.get('nuty_glowy') and scraped['nuty_glowy'] != "N/A":
-            scent_notes.append(f"Głowa: {scraped['nuty_glowy']}")
-        if scraped.get('nuty_serca') and scraped['nuty_serca'] != "N/A":
-            scent_notes.append(f"Serce: {scraped['nuty_serca']}")
-        if scraped.get('nuty_bazy') and scraped['nuty_bazy'] != "N/A":
-            scent_notes.append(f"Baza: {scraped['nuty_bazy']}")
-            
-        if frag_match and frag_match.get('notes'):
-            frag_notes_raw = frag_match['notes']
-            if isinstance(frag_notes_raw, list):
-                scent_notes.append(f"Fragrantica Notes: {', '.join(frag_notes_raw)}")
-            elif isinstance(frag_notes_raw, dict):
-                frag_notes = frag_notes_raw.get('notes', {})
-                if isinstance(frag_notes, list):
-                     scent_notes.append(f"Fragrantica Notes: {', '.join(frag_notes)}")
-                elif isinstance(frag_notes, dict):
-                    if frag_notes.get('top'):
-                        scent_notes.append(f"Fragrantica Top: {', '.join(frag_notes['top'])}")
-                    if frag_notes.get('middle'):
-                        scent_notes.append(f"Fragrantica Middle: {', '.join(frag_notes['middle'])}")
-                    if frag_notes.get('base'):
-                        scent_notes.append(f"Fragrantica Base: {', '.join(frag_notes['base'])}")
-        
-        accords_str = ""
-        if frag_match and frag_match.get('accords'):
-            accords = []
-            for acc in frag_match['accords']:
-                for k, v in acc.items():
-                    # Round for readability
-                    accords.append(f"{k} ({round(v, 1)}%)")
-            accords_str = "Akordy: " + ", ".join(accords)
-            
-        # Add stats from Fragrantica
-        stats_list = []
-        if frag_match:
-            if frag_match.get('launch_year'):
-                stats_list.append(f"Rok premiery: {frag_match['launch_year']}")
-            if frag_match.get('stats'):
-                s = frag_match['stats']
-                if s.get('longevity'): stats_list.append(f"Trwałość: {s['longevity']}/5")
-                if s.get('sillage'): stats_list.append(f"Projekcja: {s['sillage']}/5")
-        
-        stats_str = " | ".join(stats_list) if stats_list else ""
-            
-        # Add attributes to description
-        attrs = []
-        if scraped.get('capacity'): attrs.append(f"Pojemność: {scraped['capacity']}")
-        if scraped.get('concentration'): attrs.append(f"Koncentracja: {scraped['concentration']}")
-        if scraped.get('gender'): attrs.append(f"Płeć: {scraped['gender']}")
-        
-        attr_str = " | ".join(attrs) if attrs else ""
-        
-        # Prepare full description for embedding and database
-        full_description = scraped.get('description', "Brak opisu")
-        if attr_str:
-            full_description += "\n\n" + attr_str
-        if stats_str:
-            full_description += "\n\n" + stats_str
-        if accords_str:
-            full_description += "\n\n" + accords_str
-            
-        # Get embedding
-        embedding = get_embedding(full_description)
-        
-        record = {
-            "wp_id": scraped['wp_id'],
-            "name": scraped['name'],
-            "brand": frag_match['brand'] if frag_match else scraped['name'].split()[0], # Fallback brand
-            "price": scraped['price'],
-            "stock": scraped['stock'],
-            "description": full_description,
-            "scent_notes_combined": " | ".join(scent_notes) if scent_notes else "Brak danych",
-            "image_url": scraped['image_url'],
-            "product_url": scraped['product_url'],
-            "embedding": embedding
-        }
-        
-        records_to_upload.append(record)
-        processed_count += 1
-        
-        if len(records_to_upload) >= batch_size:
-            print(f"Uploading batch of {len(records_to_upload)}...")
-            try:
-                # Use upsert to handle updates
-                supabase.table('perfume_knowledge_base').upsert(records_to_upload, on_conflict='wp_id').execute()
-                records_to_upload = []
-            except Exception as e:
-                print(f"Error uploading batch: {e}")
-                
-        # Small delay to be polite
-        time.sleep(1)
-
-    # Final batch
+        known = state.get(url)
+        if incremental and known and lastmod and known.get('lastmod') == lastmod:
+            unchanged_count += 1
+            continue
+        to_scrape.append((url, lastmod))
+    
+    processed_count = 0
+    incomplete = False
+    last_checkpoint = time.monotonic()
+
+    def write_checkpoint():
+        nonlocal last_checkpoint
+        with metrics.timer("checkpoint"):
+            save_checkpoint({"run_started": run_started, "incremental": incremental, "done": sorted(done),
+                             "pending": records_to_upload, "pending_state": pending_state}, CHECKPOINT_PATH)
+            write_json_atomic(state, SCRAPE_STATE_PATH)
+        last_checkpoint = time.monotonic()
+
+    def flush():
+        nonlocal records_to_upload, incomplete
+        rejected = {r['product_url'] for r in upload_records(records_to_upload)}
+        unembedded = {r['product_url'] for r in records_to_upload if embedding_failed(r)}
+        incomplete = incomplete or bool(rejected) or bool(unembedded)
+        if search_index is not None:
+            uploaded = [r for r in records_to_upload if r['product_url'] not in rejected]
+            # The index is keyed by wp_id; pages without a shortlink have none
+            unkeyed = [r['product_url'] for r in uploaded if r['wp_id'] is None]
+            if unkeyed:
+                print(f"Not indexing {len(unkeyed)} products without a wp_id: {', '.join(unkeyed[:3])}")
+                metrics.count("search_index_skipped", len(unkeyed))
+            with metrics.timer("search_index"):
+                search_index.upsert([r for r in uploaded if r['wp_id'] is not None])
+        for r in records_to_upload:
+            url = r['product_url']
+            # Not embedded: keep the page out of state so the next run scrapes and embeds it again
+            if url in pending_state and url not in rejected and url not in unembedded:
+                state[url] = pending_state.pop(url)
+                done.add(url)
+        records_to_upload = []
+        write_checkpoint()
+
     if records_to_upload:
-        print(f"Uploading final batch of {len(records_to_upload)}...")
-        try:
-            supabase.table('perfume_knowledge_base').upsert(records_to_upload, on_conflict='wp_id').execute()
-        except Exception as e:
-            print(f"Error uploading final batch: {e}")
+        print(f"Uploading {len(records_to_upload)} records saved by the interrupted run...")
+        flush()
+
+    pool = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS)
+    try:
+        futures = {
+            pool.submit(scrape_if_changed, url, session, state.get(url) if incremental else None): (url, lastmod)
+            for url, lastmod in to_scrape
+        }
+        for future in as_completed(futures):
+            url, lastmod = futures[future]
+            status, scraped, validators = future.result()
+            if status == "unchanged":
+                state[url] = dict(state[url], lastmod=lastmod)
+                done.add(url)
+                unchanged_count += 1
+                continue
+            if not scraped or scraped['name'] == "N/A":
+                print(f"Skipping {url} due to scraping failure.")
+                metrics.count("scrape_failures")
+                # A page that failed to download is retried by --resume; one that isn't a product is not
+                if status == "error":
+                    incomplete = True
+                else:
+                    done.add(url)
+                continue
+
+            print(f"Scraped product: {scraped['name']}")
+            with metrics.timer("build"):
+                records_to_upload.append(build_scraped_record(scraped, matcher))
+            pending_state[url] = dict(validators, lastmod=lastmod)
+            processed_count += 1
+
+            if len(records_to_upload) >= UPLOAD_BATCH_SIZE:
+                print(f"Uploading batch of {len(records_to_upload)}...")
+                flush()
+            elif time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                write_checkpoint()
+
+        # Final batch
+        if records_to_upload:
+            print(f"Uploading final batch of {len(records_to_upload)}...")
+            flush()
+    finally:
+        # Don't keep scraping pages nobody will process
+        pool.shutdown(wait=False, cancel_futures=True)
+        session.close()
+        write_checkpoint()
+        if search_index is not None:
+            with metrics.timer("search_index"):
+                search_index.save(SEARCH_INDEX_PATH)
+    if not incomplete:
+        clear_checkpoint(CHECKPOINT_PATH)
+
+    metrics.count("products_processed", processed_count)
+    metrics.count("pages_unchanged", unchanged_count)
+    collect_sync_stats(metrics, session, matcher, embedder, writer)
+    metrics.finish()
 
+    if unchanged_count:
+        print(f"Skipped {unchanged_count} unchanged product pages.")
+    print(session.summary())
+    print(matcher.summary())
+    print(embedder.summary())
+    print(writer.summary())
+    if writer.stats["dead_letters"]:
+        print(f"Rows that could not be written are in {writer.dead_letter_path} (replay: python supabase_writer.py)")
+    if os.path.exists(CHECKPOINT_PATH):
+        print(f"Run incomplete; continue it with --resume (checkpoint: {CHECKPOINT_PATH})")
+    print(metrics.summary())
     print(f"Finished processing {processed_count} products.")
+    return metrics
 
 if __name__ == "__main__":
-    integrate()
+    parser = argparse.ArgumentParser(description="Scrape perfun.pl products into Supabase.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip product pages that have not changed since the last run")
+    parser.add_argument("--parser", choices=BACKENDS, default=PARSER_BACKEND,
+                        help=f"HTML parser backend (default: {PARSER_BACKEND})")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its checkpoint")
+    parser.add_argument("--metrics-json", help="write the run metrics to this JSON file")
+    parser.add_argument("--metrics-textfile", help="write the run metrics in Prometheus textfile format (*.prom)")
+    args = parser.parse_args()
+    PARSER_BACKEND = args.parser
+    integrate(incremental=args.incremental, resume=args.resume).export(args.metrics_json, args.metrics_textfile)
@@ -1,18 +1,32 @@
 import os
-import json
-import re
+import time
+import asyncio
+import argparse
 import requests
 from openai import OpenAI
 from supabase import create_client
 from dotenv import load_dotenv
-import time
-from html import unescape
+from urllib.parse import urlparse
+from datetime import datetime, timezone
+from catalog_pipeline import HostLimiter, Stage, run_pipeline
+from http_client import RetrySession, Upstream
+from sync_state import content_hash, load_state, save_state, load_checkpoint, save_checkpoint, clear_checkpoint
+from embeddings import BatchEmbedder
+from embedding_cache import EmbeddingCache
+from supabase_writer import UpsertWriter
+from fragrantica_matcher import FragranticaMatcher
+from fragrantica_loader import load_fragrantica
+from record_builder import RecordBuilderPool, assemble_record, clean_html
+from product_chunks import CHUNKS_TABLE, CHUNKS_ON_CONFLICT, replace_chunks
+from hybrid_search import SEARCH_INDEX_PATH, open_index
+from run_metrics import RunMetrics, collect_sync_stats
 
 # Load environment variables
 load_dotenv('/Users/wojciechnowak/.env')
 
 # API Clients
-openai_client = OpenAI(api_key=os.environ.get("OPEN_AI_API"))
+# Retries are handled by BatchEmbedder
+openai_client = OpenAI(api_key=os.environ.get("OPEN_AI_API"), max_retries=0, timeout=60)
 supabase_url = os.environ.get("FIRMY_SUPABASE_URL")
 supabase_key = os.environ.get("FIRMY_SUPABASE_KEY")
 supabase = create_client(supabase_url, supabase_key)
@@ -22,204 +36,503 @@ WC_CK = os.environ.get("PERFUN_CONSUMER_KEY")
 WC_CS = os.environ.get("PERFUN_CONSUMER_SECRET")
 WC_URL = os.environ.get("PERFUN_SITE_URL")
 
+# Concurrency and rate limits per upstream (rates in requests per second;
+# they are halved automatically while an upstream answers 429)
+WC_MAX_CONCURRENCY = 8
+WC_RATE_LIMIT = 25
+OPENAI_MAX_CONCURRENCY = 4
+OPENAI_RATE_LIMIT = 20
+EMBED_BATCH_SIZE = 64
+SUPABASE_MAX_CONCURRENCY = 2
+UPSERT_BATCH_SIZE = 200  # rows handed to the writer at once; it sizes requests by bytes
+CHECKPOINT_INTERVAL = 5.0  # seconds between checkpoint writes during a run
+BUILD_WORKERS = 0  # processes building records; 0 builds them inline on the event loop
+BUILD_BATCH_SIZE = 50  # one WooCommerce page
+EMBED_CHUNKS = False  # also embed typed chunks into perfume_chunks (run perfume_chunks.sql first)
+VARIATIONS_PER_PAGE = 100
+VARIATION_FIELDS = "id,price,stock_status,attributes"
+
 # Paths
 FRAGRANTICA_DATA_PATH = "/Users/wojciechnowak/Documents/Clients/Perfun/Fragrantica - Adam/scraped_fragrantica_data.json"
+FRAGRANTICA_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fragrantica_cache.pickle")
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache.sqlite")
+SYNC_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync_state.json")
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "integrate_checkpoint.json")
 
-def normalize_name(name):
-    """Normalize perfume name for matching."""
-    if not name:
-        return ""
-    name = name.lower()
-    name = re.sub(r'\b(perfume|eau de parfum|edp|edt|eau de toilette|extrait|cologne)\b', '', name)
-    name = re.sub(r'[^a-z0-9 ]', '', name)
-    name = ' '.join(name.split())
-    return name
-
-def clean_html(raw_html):
-    """Remove HTML tags and unescape entities."""
-    if not raw_html:
-        return ""
-    cleanr = re.compile('<.*?>')
-    cleantext = re.sub(cleanr, ' ', raw_html)
-    return unescape(cleantext).strip()
+embedder = BatchEmbedder(openai_client, cache=EmbeddingCache(EMBEDDING_CACHE_PATH),
+                         upstream=Upstream("api.openai.com", OPENAI_RATE_LIMIT))
+writer = UpsertWriter(supabase, workers=SUPABASE_MAX_CONCURRENCY)
+chunk_writer = UpsertWriter(supabase, CHUNKS_TABLE, CHUNKS_ON_CONFLICT, workers=SUPABASE_MAX_CONCURRENCY)
+# Stage timers and counters of the current run
+metrics = RunMetrics("integrate_perfumes_api")
+
+def should_embed(text):
+    return bool(text) and len(text) >= 10
 
 def get_embedding(text):
     """Generate embedding for text using OpenAI."""
-    if not text or len(text) < 10:
-        return None
-    try:
-        response = openai_client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
+    if not should_embed(text):
         return None
+    return embedder.embed(text)
+
+def needs_embedding(record):
+    return record.get("embedding", False) is None or any(c["embedding"] is None for c in record.get("chunks", []))
+
+def embedding_failed(record):
+    """True if the record was due a vector but embedding its description failed."""
+    return "embedding" in record and record["embedding"] is None and should_embed(record["description"])
 
-def fetch_variations(product_id):
-    """Fetch variations for a variable product to get accurate price/stock."""
+def embed_records(records):
+    """Fill the missing 'embedding' fields of records and their chunks in as few OpenAI requests as possible."""
+    items = [(r["wp_id"], r["description"]) for r in records
+             if "embedding" in r and r["embedding"] is None and should_embed(r["description"])]
+    items += [((r["wp_id"], c["chunk_type"], c["chunk_index"]), c["content"])
+              for r in records for c in r.get("chunks", []) if c["embedding"] is None]
+    vectors = embedder.embed_many(items)
+    for r in records:
+        if "embedding" in r and r["embedding"] is None:
+            r["embedding"] = vectors.get(r["wp_id"])
+        for c in r.get("chunks", []):
+            if c["embedding"] is None:
+                c["embedding"] = vectors.get((r["wp_id"], c["chunk_type"], c["chunk_index"]))
+    return records
+
+def record_fingerprint(record):
+    """What change detection compares: the columns, plus the chunk texts (not vectors) when chunking."""
+    fields = {k: v for k, v in record.items() if k not in ("embedding", "chunks")}
+    if "chunks" in record:
+        fields["chunks"] = [c["content"] for c in record["chunks"]]
+    return content_hash(fields)
+
+def upload_records(records):
+    """Upsert records, then replace their chunks. Returns the wp_ids that failed either way."""
+    rejected = {r["wp_id"] for r in writer.write([{k: v for k, v in r.items() if k != "chunks"} for r in records])}
+    with_chunks = [r for r in records if "chunks" in r and r["wp_id"] not in rejected]
+    if with_chunks:
+        rejected |= replace_chunks(supabase, chunk_writer, with_chunks)
+    return rejected
+
+def fetch_variations_page(product_id, page=1, session=requests):
+    """Fetch one page of a variable product's variations. Returns (variations, total_pages or None)."""
     endpoint = f"{WC_URL}/wp-json/wc/v3/products/{product_id}/variations"
-    try:
-        response = requests.get(endpoint, auth=(WC_CK, WC_CS), params={"per_page": 100})
+    params = {"per_page": VARIATIONS_PER_PAGE, "page": page, "_fields": VARIATION_FIELDS}
+    with metrics.timer("fetch_variations"):
+        response = session.get(endpoint, auth=(WC_CK, WC_CS), params=params, timeout=30)
         response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"Error fetching variations for {product_id}: {e}")
-        return []
+        total_pages = response.headers.get("X-WP-TotalPages")
+        return response.json(), int(total_pages) if total_pages else None
 
-def integrate():
-    print("Loading data...")
-    # Load Fragrantica data
-    with open(FRAGRANTICA_DATA_PATH, 'r', encoding='utf-8') as f:
-        fragrantica_data = json.load(f)
-    
-    # Create matching map
-    frag_map = {normalize_name(item['name']): item for item in fragrantica_data}
-    
-    page = 1
-    processed_count = 0
-    batch_size = 10
-    records_to_upload = []
-    
-    print("Starting WooCommerce API integration...")
-    
-    while True:
-        print(f"Fetching page {page} from WooCommerce...")
-        endpoint = f"{WC_URL}/wp-json/wc/v3/products"
+class VariationLoader:
+    """Variations of every variable product, fetched once per sync run.
+
+    prefetch() starts the lookups for a whole page of products as soon as the
+    page arrives, so they overlap with each other and with the page fetches;
+    get() waits for one product's result. Products whose listing has no
+    variation ids are not requested at all.
+    """
+
+    def __init__(self, session, limiter):
+        self.session = session
+        self.limiter = limiter
+        self._tasks = {}
+        self.stats = {"products": 0, "requests": 0, "errors": 0}
+
+    def prefetch(self, products):
+        for p in products:
+            if p['type'] == 'variable' and p.get('variations', True) and p['id'] not in self._tasks:
+                self._tasks[p['id']] = asyncio.ensure_future(self._load(p['id']))
+
+    async def _page(self, product_id, page):
+        self.stats["requests"] += 1
+        return await self.limiter.run(WC_URL, fetch_variations_page, product_id, page, self.session)
+
+    async def _load(self, product_id):
+        self.stats["products"] += 1
         try:
-            response = requests.get(endpoint, auth=(WC_CK, WC_CS), params={"per_page": 50, "page": page})
-            response.raise_for_status()
-            products = response.json()
-            if not products:
-                break
+            variations, total_pages = await self._page(product_id, 1)
+            if total_pages and total_pages > 1:
+                pages = await asyncio.gather(*(self._page(product_id, page) for page in range(2, total_pages + 1)))
+                for more, _ in pages:
+                    variations += more
+            return variations
         except Exception as e:
-            print(f"Error fetching page {page}: {e}")
-            break
-            
-        for p in products:
-            p_id = p['id']
-            name = p['name']
-            print(f"Processing: {name} (ID: {p_id})")
-            
-            # 1. Price and Stock
-            price = float(p['price']) if p['price'] else 0.0
-            stock_status = 1 if p['stock_status'] == 'instock' else 0
-            
-            # Handle variations for more detail
-            variations_info = []
-            if p['type'] == 'variable':
-                vars = fetch_variations(p_id)
-                for v in vars:
-                    v_stock = "Na stanie" if v['stock_status'] == 'instock' else "Brak"
-                    v_attr = ", ".join([f"{a['name']}: {a['option']}" for a in v['attributes']])
-                    variations_info.append(f"{v_attr} - {v['price']} PLN ({v_stock})")
-                    # Update price to minimum if currently 0
-                    if price == 0 and v['price']:
-                        price = float(v['price'])
-                
-            # 2. Attributes
-            attrs = {}
-            for attr in p['attributes']:
-                attrs[attr['name']] = ", ".join(attr['options'])
-            
-            # 3. Clean Description
-            description = clean_html(p['description']) or clean_html(p['short_description']) or "Brak opisu"
-            
-            # 4. Match with Fragrantica
-            norm_name = normalize_name(name)
-            frag_match = frag_map.get(norm_name)
-            
-            # Combine Scent Notes
-            scent_notes = []
-            # We don't have separate notes in Woo API unless they are in attributes
-            # Some sites put notes in attributes. Let's check for 'Nuty'
-            for attr_name, attr_val in attrs.items():
-                if 'nuty' in attr_name.lower() or 'otwarcie' in attr_name.lower():
-                    scent_notes.append(f"{attr_name}: {attr_val}")
-            
-            # From Fragrantica
-            if frag_match and frag_match.get('notes'):
-                raw_notes = frag_match['notes']
-                if isinstance(raw_notes, list):
-                    scent_notes.append(f"Fragrantica: {', '.join(raw_notes)}")
-                elif isinstance(raw_notes, dict):
-                    fn = raw_notes.get('notes', {})
-                    if isinstance(fn, dict):
-                        if fn.get('top'): scent_notes.append(f"Góra: {', '.join(fn['top'])}")
-                        if fn.get('middle'): scent_notes.append(f"Serce: {', '.join(fn['middle'])}")
-                        if fn.get('base'): scent_notes.append(f"Baza: {', '.join(fn['base'])}")
-                    elif isinstance(fn, list):
-                        scent_notes.append(f"Fragrantica: {', '.join(fn)}")
-
-            # Accords
-            accords_str = ""
-            if frag_match and frag_match.get('accords'):
-                acc = [f"{list(a.keys())[0]} ({round(list(a.values())[0], 1)}%)" for a in frag_match['accords']]
-                accords_str = "Akordy: " + ", ".join(acc)
-
-            # 5. Build full description for embedding
-            meta_parts = []
-            if attrs.get('Koncentracja'): meta_parts.append(f"Koncentracja: {attrs['Koncentracja']}")
-            if attrs.get('Płeć'): meta_parts.append(f"Płeć: {attrs['Płeć']}")
-            if variations_info: meta_parts.append("Dostępne warianty: " + " | ".join(variations_info))
-            
-            stats_list = []
-            if frag_match:
-                if frag_match.get('launch_year'): stats_list.append(f"Rok premiery: {frag_match['launch_year']}")
-                if frag_match.get('stats'):
-                    s = frag_match['stats']
-                    if s.get('longevity'): stats_list.append(f"Trwałość: {s['longevity']}/5")
-                    if s.get('sillage'): stats_list.append(f"Projekcja: {s['sillage']}/5")
-
-            full_desc_for_db = description
-            if meta_parts: full_desc_for_db += "\n\n" + " | ".join(meta_parts)
-            if stats_list: full_desc_for_db += "\n\n" + " | ".join(stats_list)
-            if accords_str: full_desc_for_db += "\n\n" + accords_str
-            
-            # 6. Get Embedding
-            embedding = get_embedding(full_desc_for_db)
-            
-            record = {
-                "wp_id": p_id,
-                "name": name,
-                "brand": frag_match['brand'] if frag_match else name.split()[0],
-                "price": price,
-                "stock": stock_status,
-                "description": full_desc_for_db,
-                "scent_notes_combined": " | ".join(scent_notes) if scent_notes else "Brak danych",
-                "image_url": p['images'][0]['src'] if p['images'] else "N/A",
-                "product_url": p['permalink'],
-                "embedding": embedding
-            }
-            
-            records_to_upload.append(record)
-            processed_count += 1
-            
-            if len(records_to_upload) >= batch_size:
-                print(f"Uploading batch of {len(records_to_upload)} to Supabase...")
-                try:
-                    supabase.table('perfume_knowledge_base').upsert(records_to_upload, on_conflict='wp_id').execute()
-                    records_to_upload = []
-                except Exception as e:
-                    print(f"Error uploading batch: {e}")
-            
-            # Polite delay
-            time.sleep(0.5)
-            
-        page += 1
-        # Optional: total limit for safety during testing
-        # if processed_count > 20: break
-
-    # Final batch
-    if records_to_upload:
-        print(f"Uploading final batch of {len(records_to_upload)}...")
+            print(f"Error fetching variations for {product_id}: {e}")
+            self.stats["errors"] += 1
+            return []
+
+    async def get(self, p):
+        if p['type'] != 'variable':
+            return []
+        self.prefetch([p])
+        task = self._tasks.get(p['id'])
+        return await task if task else []
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+    def summary(self):
+        s = self.stats
+        return f"Variations: {s['products']} variable products in {s['requests']} requests, {s['errors']} failed"
+
+def fetch_products_page(page, session=requests, modified_after=None):
+    """Fetch one page of products. Returns (products, total_pages or None)."""
+    endpoint = f"{WC_URL}/wp-json/wc/v3/products"
+    # Ordered by id so a resumed run finds the same products on the same pages
+    params = {"per_page": 50, "page": page, "orderby": "id", "order": "asc"}
+    if modified_after:
+        params.update({"modified_after": modified_after, "dates_are_gmt": "true"})
+    with metrics.timer("fetch_products"):
+        response = session.get(endpoint, auth=(WC_CK, WC_CS), params=params, timeout=30)
+        response.raise_for_status()
+        total_pages = response.headers.get("X-WP-TotalPages")
+        return response.json(), int(total_pages) if total_pages else None
+
+def build_record(p, variations, matcher, chunks=False):
+    """Build the Supabase record for a WooCommerce product (without embedding)."""
+    print(f"Processing: {p['name']} (ID: {p['id']})")
+    with metrics.timer("match"):
+        frag_match, _ = matcher.match(p['name'])
+    return assemble_record(p, variations, frag_match, chunks)
+
+async def iter_products(session, limiter, modified_after=None, failed_pages=None, on_page=None, skip_pages=()):
+    """Yield products from all WooCommerce pages, fetching pages concurrently.
+
+    Pages that fail to load are reported and appended to failed_pages.
+    on_page, if given, is called with (page, products) before they are yielded.
+    When the page count is known, pages in skip_pages (other than page 1) are not fetched.
+    """
+    if failed_pages is None:
+        failed_pages = []
+    try:
+        products, total_pages = await limiter.run(WC_URL, fetch_products_page, 1, session, modified_after)
+    except Exception as e:
+        print(f"Error fetching page 1: {e}")
+        failed_pages.append(1)
+        return
+    print(f"Fetched page 1 from WooCommerce ({total_pages or '?'} pages)")
+    if on_page:
+        on_page(1, products)
+    for p in products:
+        yield p
+
+    if total_pages is None:
+        # No pagination header: walk pages one by one until an empty page
+        page = 2
+        while products:
+            try:
+                products, _ = await limiter.run(WC_URL, fetch_products_page, page, session, modified_after)
+            except Exception as e:
+                print(f"Error fetching page {page}: {e}")
+                failed_pages.append(page)
+                break
+            if on_page:
+                on_page(page, products)
+            for p in products:
+                yield p
+            page += 1
+        return
+
+    async def fetch(page):
         try:
-            supabase.table('perfume_knowledge_base').upsert(records_to_upload, on_conflict='wp_id').execute()
+            products, _ = await limiter.run(WC_URL, fetch_products_page, page, session, modified_after)
+            print(f"Fetched page {page} from WooCommerce")
+            if on_page:
+                on_page(page, products)
+            return products
         except Exception as e:
-            print(f"Error uploading final batch: {e}")
+            print(f"Error fetching page {page}: {e}")
+            failed_pages.append(page)
+            return []
+
+    tasks = [asyncio.create_task(fetch(page)) for page in range(2, total_pages + 1) if page not in skip_pages]
+    for task in asyncio.as_completed(tasks):
+        for p in await task:
+            yield p
+
+async def integrate_async(incremental=False, resume=False, build_workers=BUILD_WORKERS, chunks=EMBED_CHUNKS):
+    """Sync the WooCommerce catalog into Supabase.
+
+    In incremental mode only products modified since the last successful run
+    are fetched, and products whose built record is unchanged are skipped;
+    a changed record with an unchanged description is upserted without
+    re-embedding.
+
+    Progress is checkpointed after every upload batch: finished products and
+    pages, and records built (and possibly embedded) but not yet uploaded.
+    With resume=True an interrupted run continues from its checkpoint with
+    the same mode and watermark.
+
+    With build_workers > 0 records are built a page at a time in that many
+    worker processes. If the local search index (hybrid_search.py) has been
+    built, the products upserted by the run are updated in it. With chunks=True every product is also split into
+    typed chunks (description pieces, notes, accords/stats) that are embedded
+    and stored in perfume_chunks, several vectors per wp_id. Returns the
+    run's metrics.
+    """
+    metrics.reset()
+    print("Loading data...")
+    with metrics.timer("load_fragrantica"):
+        # Load Fragrantica data (streamed, only the fields we use)
+        fragrantica_data = load_fragrantica(FRAGRANTICA_DATA_PATH, FRAGRANTICA_CACHE_PATH)
+
+        # Build the fuzzy matching index
+        matcher = FragranticaMatcher(fragrantica_data)
+    search_index = open_index(SEARCH_INDEX_PATH)
+
+    session = RetrySession({urlparse(WC_URL).netloc: WC_RATE_LIMIT}, pool_size=WC_MAX_CONCURRENCY + 2)
+    limiter = HostLimiter({
+        urlparse(WC_URL).netloc: WC_MAX_CONCURRENCY,
+        "api.openai.com": OPENAI_MAX_CONCURRENCY,
+    })
+    processed_count = 0
+    skipped_count = 0
+    failed = False
+
+    state = load_state(SYNC_STATE_PATH)
+    hashes = state["hashes"]
+    pending_hashes = {}
+    checkpoint = load_checkpoint(CHECKPOINT_PATH)
+    if checkpoint and not resume:
+        print(f"Starting over; the unfinished run in {CHECKPOINT_PATH} is discarded (use --resume to continue it).")
+        checkpoint = None
+    elif resume and not checkpoint:
+        print("No checkpoint to resume from; starting a new run.")
+    if checkpoint:
+        run_started = checkpoint["run_started"]
+        incremental = checkpoint["incremental"]
+        modified_after = checkpoint["modified_after"]
+        done = set(checkpoint["done"])
+        pages_done = set(checkpoint["pages_done"])
+        carried = checkpoint["pending"]
+        print(f"Resuming the run started at {run_started} (UTC): {len(done)} products and "
+              f"{len(pages_done)} pages done, {len(carried)} records waiting for upload")
+    else:
+        run_started = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+        modified_after = state["watermark"] if incremental else None
+        done, pages_done, carried = set(), set(), []
+    if modified_after:
+        print(f"Incremental sync: products modified after {modified_after} (UTC)")
+
+    # Built records not uploaded yet, and the products each page is still waiting for
+    in_flight = {}
+    page_of = {}
+    page_waiting = {}
+
+    def finished(wp_id):
+        done.add(wp_id)
+        in_flight.pop(wp_id, None)
+        page = page_of.pop(wp_id, None)
+        if page is not None:
+            page_waiting[page].discard(wp_id)
+            if not page_waiting[page]:
+                pages_done.add(page)
+
+    def snapshot():
+        pending = list(in_flight.values())
+        if embedder.cache:
+            # Vectors already embedded are in the embedding cache; re-embedding them on resume is free
+            pending = [dict(r, embedding=None) if r.get("embedding") else r for r in pending]
+            pending = [dict(r, chunks=[dict(c, embedding=None) for c in r["chunks"]]) if "chunks" in r else r
+                       for r in pending]
+        return ({"run_started": run_started, "incremental": incremental, "modified_after": modified_after,
+                 "done": sorted(done), "pages_done": sorted(pages_done), "pending": pending},
+                dict(state, hashes=dict(hashes)))
+
+    def write_checkpoint(data):
+        checkpoint, sync_state = data
+        save_checkpoint(checkpoint, CHECKPOINT_PATH)
+        save_state(sync_state, SYNC_STATE_PATH)
 
+    last_checkpoint = time.monotonic()
+    checkpoint_lock = asyncio.Lock()
+
+    async def maybe_checkpoint():
+        """Write a checkpoint in a thread, at most every CHECKPOINT_INTERVAL seconds."""
+        nonlocal last_checkpoint
+        if checkpoint_lock.locked() or time.monotonic() - last_checkpoint < CHECKPOINT_INTERVAL:
+            return
+        async with checkpoint_lock:
+            with metrics.timer("checkpoint"):
+                await asyncio.to_thread(write_checkpoint, snapshot())
+            last_checkpoint = time.monotonic()
+
+    variations = VariationLoader(session, limiter)
+
+    def on_page(page, products):
+        remaining = [p for p in products if p['id'] not in done and p['id'] not in in_flight]
+        page_waiting[page] = {p['id'] for p in remaining}
+        page_of.update((p['id'], page) for p in remaining)
+        if not remaining:
+            pages_done.add(page)
+        variations.prefetch(remaining)
+
+    async def source():
+        async for p in iter_products(session, limiter, modified_after, failed_pages, on_page, pages_done):
+            if p['id'] not in done and p['id'] not in in_flight:
+                yield p
+
+    async def with_variations(p):
+        return p, await variations.get(p)
+
+    def track(record):
+        key = str(record["wp_id"])
+        desc_hash = content_hash(record["description"])
+        record_hash = record_fingerprint(record)
+        pending_hashes[key] = {"description": desc_hash, "record": record_hash}
+        return hashes.get(key), desc_hash, record_hash
+
+    def keep(record):
+        """The record to embed and upload, or None if it is unchanged since the last run."""
+        nonlocal processed_count, skipped_count
+        processed_count += 1
+        previous, desc_hash, record_hash = track(record)
+        if incremental and previous:
+            if previous["record"] == record_hash:
+                skipped_count += 1
+                finished(record["wp_id"])
+                return None
+            if previous["description"] == desc_hash:
+                # Only price/stock/metadata changed: keep the stored embedding
+                del record["embedding"]
+        in_flight[record["wp_id"]] = record
+        return record
+
+    async def build(item):
+        p, variations = item
+        record = keep(build_record(p, variations, matcher, chunks))
+        await maybe_checkpoint()
+        return record
+
+    async def build_batch(items):
+        records = [r for r in map(keep, await builder.build(items, matcher)) if r is not None]
+        await maybe_checkpoint()
+        return records
+
+    async def embed(records):
+        to_embed = [r for r in records if needs_embedding(r)]
+        if to_embed:
+            await limiter.run("api.openai.com", embed_records, to_embed)
+        await maybe_checkpoint()
+        return records
+
+    async def upload(records):
+        nonlocal failed
+        print(f"Uploading batch of {len(records)} to Supabase...")
+        # Upload the other columns, but don't overwrite the stored vector with null
+        unembedded = {r["wp_id"] for r in records if embedding_failed(r)}
+        if unembedded:
+            failed = True
+            metrics.count("embeddings_failed", len(unembedded))
+            records = [{k: v for k, v in r.items() if k != "embedding"} if r["wp_id"] in unembedded else r
+                       for r in records]
+        rejected = await asyncio.to_thread(upload_records, records)
+        if rejected:
+            failed = True
+            metrics.count("rows_rejected", len(rejected))
+        for r in records:
+            key = str(r["wp_id"])
+            if r["wp_id"] in rejected or r["wp_id"] in unembedded:
+                # Dead-lettered or not embedded; no hash is stored and its page
+                # stays unfinished, so a resumed or later run retries it
+                pending_hashes.pop(key, None)
+                in_flight.pop(r["wp_id"], None)
+            else:
+                hashes[key] = pending_hashes.pop(key)
+                finished(r["wp_id"])
+        if search_index is not None:
+            with metrics.timer("search_index"):
+                search_index.upsert([r for r in records if r["wp_id"] not in rejected])
+        await maybe_checkpoint()
+
+    builder = None
+    if build_workers:
+        builder = RecordBuilderPool(build_workers, FRAGRANTICA_DATA_PATH, FRAGRANTICA_CACHE_PATH, chunks)
+        build_stage = Stage("build", build_batch, batch_size=BUILD_BATCH_SIZE, linger=0.2, fan_out=True)
+    else:
+        build_stage = Stage("build", build)
+
+    print("Starting WooCommerce API integration...")
+    stages = [
+        Stage("variations", with_variations, workers=WC_MAX_CONCURRENCY),
+        build_stage,
+        Stage("embed", embed, workers=OPENAI_MAX_CONCURRENCY, batch_size=EMBED_BATCH_SIZE, linger=0.5, fan_out=True),
+        Stage("upsert", upload, workers=2, batch_size=UPSERT_BATCH_SIZE, linger=1.0),
+    ]
+    failed_pages = []
+    try:
+        if carried:
+            # Records of the interrupted run that were built but never uploaded
+            for record in carried:
+                track(record)
+                in_flight[record["wp_id"]] = record
+            for i in range(0, len(carried), UPSERT_BATCH_SIZE):
+                await upload(await embed(carried[i:i + UPSERT_BATCH_SIZE]))
+        await run_pipeline(source(), stages, metrics)
+        # Records lost to a stage exception only show up in the <stage>_errors counters
+        stage_errors = sum(n for name, n in metrics.counters.items() if name.endswith("_errors"))
+        complete = not failed and not failed_pages and not stage_errors and not in_flight
+        # Only move the watermark forward when every changed product made it in
+        if complete:
+            state["watermark"] = run_started
+    finally:
+        variations.close()
+        session.close()
+        if builder:
+            builder.close()
+        write_checkpoint(snapshot())
+        if search_index is not None:
+            with metrics.timer("search_index"):
+                search_index.save(SEARCH_INDEX_PATH)
+    if complete:
+        clear_checkpoint(CHECKPOINT_PATH)
+
+    metrics.count("products_processed", processed_count)
+    metrics.count("products_skipped", skipped_count)
+    metrics.count("failed_pages", len(failed_pages))
+    metrics.collect("variations", variations.stats)
+    collect_sync_stats(metrics, session, matcher, embedder, writer)
+    if chunks:
+        metrics.collect("chunk_writer", chunk_writer.stats)
+    metrics.finish()
+
+    if skipped_count:
+        print(f"Skipped {skipped_count} unchanged products.")
+    print(variations.summary())
+    print(session.summary())
+    print(matcher.summary())
+    print(embedder.summary())
+    print(writer.summary())
+    if chunks:
+        print("Chunks: " + chunk_writer.summary())
+    if writer.stats["dead_letters"]:
+        print(f"Rows that could not be written are in {writer.dead_letter_path} (replay: python supabase_writer.py)")
+    if chunk_writer.stats["dead_letters"]:
+        print(f"Chunks that could not be written are in {chunk_writer.dead_letter_path} "
+              f"(replay: python supabase_writer.py --table {CHUNKS_TABLE} --on-conflict {CHUNKS_ON_CONFLICT})")
+    if os.path.exists(CHECKPOINT_PATH):
+        print(f"Run incomplete; continue it with --resume (checkpoint: {CHECKPOINT_PATH})")
+    print(metrics.summary())
     print(f"Finished processing {processed_count} products.")
+    return metrics
+
+def integrate(incremental=False, resume=False, build_workers=BUILD_WORKERS, chunks=EMBED_CHUNKS):
+    return asyncio.run(integrate_async(incremental=incremental, resume=resume, build_workers=build_workers,
+                                       chunks=chunks))
 
 if __name__ == "__main__":
-    integrate()
+    parser = argparse.ArgumentParser(description="Sync WooCommerce products into Supabase.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only sync products modified since the last successful run")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its checkpoint")
+    parser.add_argument("--build-workers", type=int, default=BUILD_WORKERS,
+                        help="build records in this many processes (default: inline)")
+    parser.add_argument("--chunks", action="store_true", default=EMBED_CHUNKS,
+                        help="also embed typed chunks of each product into perfume_chunks "
+                             "(the first such run must be a full one to backfill them)")
+    parser.add_argument("--metrics-json", help="write the run metrics to this JSON file")
+    parser.add_argument("--metrics-textfile", help="write the run metrics in Prometheus textfile format (*.prom)")
+    args = parser.parse_args()
+    integrate(incremental=args.incremental, resume=args.resume, build_workers=args.build_workers,
+              chunks=args.chunks).export(args.metrics_json, args.metrics_textfile)
@@ -0,0 +1,25 @@
+-- Keep last_updated current on every insert and update (including the sync's
+-- upserts and set_bestsellers), so catalog_snapshot.py can download only the
+-- rows changed since its last refresh. Run once in the Supabase SQL editor.
+
+alter table perfume_knowledge_base
+    alter column last_updated set default now();
+
+create or replace function touch_last_updated()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.last_updated = now();
+    return new;
+end;
+$$;
+
+drop trigger if exists perfume_knowledge_base_touch on perfume_knowledge_base;
+create trigger perfume_knowledge_base_touch
+    before update on perfume_knowledge_base
+    for each row execute function touch_last_updated();
+
+-- The snapshot refresh filters and pages on (last_updated, wp_id)
+create index if not exists perfume_knowledge_base_last_updated
+    on perfume_knowledge_base (last_updated, wp_id);
@@ -0,0 +1,110 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Statuses that count as a sale
+ORDER_STATUSES = "processing,completed"
+ORDERS_PER_PAGE = 100
+# Only what the ranking needs; WordPress trims the rest of each order server-side
+ORDER_FIELDS = "id,date_created_gmt,line_items.product_id,line_items.quantity,line_items.name"
+ORDER_WORKERS = 6
+
+# Free samples and other items that are not real sales. Extend with
+# BESTSELLER_EXCLUDE_IDS / BESTSELLER_EXCLUDE_NAMES (comma-separated).
+EXCLUDED_PRODUCT_IDS = {15916}
+EXCLUDED_NAME_KEYWORDS = ("gratis",)
+
+def exclusions_from_env():
+    """Excluded product ids and name keywords: the defaults plus the environment's lists."""
+    ids = set(EXCLUDED_PRODUCT_IDS)
+    ids.update(int(i) for i in os.environ.get("BESTSELLER_EXCLUDE_IDS", "").split(",") if i.strip())
+    names = list(EXCLUDED_NAME_KEYWORDS)
+    names.extend(n.strip().lower() for n in os.environ.get("BESTSELLER_EXCLUDE_NAMES", "").split(",") if n.strip())
+    return ids, tuple(names)
+
+def parse_gmt(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+def fetch_orders_page(session, url, auth, page, params):
+    """One page of orders for the given filters. Returns (orders, total_pages or None)."""
+    params = dict(params, per_page=ORDERS_PER_PAGE, page=page)
+    response = session.get(f"{url}/wp-json/wc/v3/orders", auth=auth, params=params, timeout=60)
+    response.raise_for_status()
+    total_pages = response.headers.get("X-WP-TotalPages")
+    return response.json(), int(total_pages) if total_pages else None
+
+def iter_order_pages(session, url, auth, params, workers=ORDER_WORKERS):
+    """Yield pages of orders matching params; after the first page the rest are fetched concurrently.
+
+    Pages are yielded as they arrive, not in order. Raises if a page cannot be
+    fetched (a partial count would be silently wrong).
+    """
+    orders, total_pages = fetch_orders_page(session, url, auth, 1, params)
+    yield orders
+    if total_pages is None:
+        # No pagination header: walk pages until a short one
+        page = 2
+        while len(orders) == ORDERS_PER_PAGE:
+            orders, _ = fetch_orders_page(session, url, auth, page, params)
+            yield orders
+            page += 1
+    elif total_pages > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(fetch_orders_page, session, url, auth, page, params)
+                       for page in range(2, total_pages + 1)]
+            for future in as_completed(futures):
+                yield future.result()[0]
+
+def gmt(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%S')
+
+def count_page(orders, windows, now, exclude_ids=(), exclude_names=()):
+    """Per-window product quantities of one page of orders: {days: Counter}."""
+    counts = {days: Counter() for days in windows}
+    cutoffs = [(days, now - timedelta(days=days)) for days in windows]
+    for order in orders:
+        created = order.get('date_created_gmt')
+        created = parse_gmt(created) if created else now
+        for item in order.get('line_items', []):
+            p_id = item.get('product_id')
+            if not p_id or p_id in exclude_ids:
+                continue
+            name = (item.get('name') or "").lower()
+            if any(keyword in name for keyword in exclude_names):
+                continue
+            qty = item.get('quantity') or 1
+            for days, cutoff in cutoffs:
+                if created >= cutoff:
+                    counts[days][p_id] += qty
+    return counts
+
+def aggregate_sales(session, url, auth, windows=(30,), exclude_ids=None, exclude_names=None,
+                    statuses=ORDER_STATUSES, workers=ORDER_WORKERS, now=None):
+    """Sold quantity per product for each window (in days): {days: Counter}.
+
+    All orders of the longest window are paged through concurrently and each
+    page is reduced to product counts as soon as it arrives, so orders are
+    never all held in memory.
+    """
+    if exclude_ids is None or exclude_names is None:
+        default_ids, default_names = exclusions_from_env()
+        exclude_ids = default_ids if exclude_ids is None else exclude_ids
+        exclude_names = default_names if exclude_names is None else exclude_names
+    now = now or datetime.now(timezone.utc)
+    windows = sorted(set(windows))
+    totals = {days: Counter() for days in windows}
+    # Oldest first, so orders placed during the run can't shift the pages
+    params = {"after": gmt(now - timedelta(days=windows[-1])), "dates_are_gmt": "true",
+              "status": statuses, "orderby": "date", "order": "asc", "_fields": ORDER_FIELDS}
+    order_count = 0
+    for orders in iter_order_pages(session, url, auth, params, workers):
+        order_count += len(orders)
+        for days, counts in count_page(orders, windows, now, exclude_ids, exclude_names).items():
+            totals[days].update(counts)
+    print(f"Counted {order_count} orders from the last {windows[-1]} days")
+    return totals
+
+def top_products(counts, n=10):
+    """[(product_id, quantity)] of the n best sellers, ties broken by product id."""
+    return sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:n]
@@ -0,0 +1,52 @@
+-- Typed embedding chunks: several vectors per product (description pieces,
+-- scent notes, accords/stats), written by integrate_perfumes_api.py --chunks.
+-- Run once in the Supabase SQL editor.
+
+create table if not exists perfume_chunks (
+    wp_id bigint not null,
+    chunk_type text not null,
+    chunk_index integer not null,
+    content text not null,
+    embedding vector(1536),
+    last_updated timestamptz not null default now(),
+    primary key (wp_id, chunk_type, chunk_index)
+);
+
+create index if not exists perfume_chunks_embedding
+    on perfume_chunks using hnsw (embedding vector_cosine_ops);
+
+-- Products for a query embedding, scored from their chunks: the best chunk
+-- plus a tenth of the other matching chunks' similarity (the same formula as
+-- product_chunks.aggregate_scores). The nearest candidate_count chunks come
+-- from the HNSW index, so a query costs one index scan like the single-vector
+-- search did. The scan returns at most hnsw.ef_search rows (default 40), so it
+-- is raised to candidate_count for this transaction (pgvector allows up to 1000).
+create or replace function match_perfume_chunks(query_embedding vector(1536), match_count integer default 10,
+                                                candidate_count integer default 200)
+returns table (wp_id bigint, score double precision, best_chunk_type text, best_content text)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+    perform set_config('hnsw.ef_search', least(greatest(candidate_count, 40), 1000)::text, true);
+    return query
+    with candidates as (
+        select c.wp_id, c.chunk_type, c.content, 1 - (c.embedding <=> query_embedding) as similarity
+        from perfume_chunks c
+        where c.embedding is not null
+        order by c.embedding <=> query_embedding
+        limit candidate_count
+    ), ranked as (
+        select *, row_number() over (partition by candidates.wp_id order by similarity desc) as position
+        from candidates
+    )
+    select r.wp_id,
+           max(r.similarity) + 0.1 * coalesce(sum(greatest(r.similarity, 0)) filter (where r.position > 1), 0),
+           max(r.chunk_type) filter (where r.position = 1),
+           max(r.content) filter (where r.position = 1)
+    from ranked r
+    group by r.wp_id
+    order by 2 desc
+    limit match_count;
+end;
+$$;
@@ -2,6 +2,7 @@ import requests
 from bs4 import BeautifulSoup
 import re
 import json
+from scent_notes import extract_scent_notes, format_notes
 
 def scrape_full_test_v2(url):
     headers = {
@@ -45,19 +46,11 @@ def scrape_full_test_v2(url):
     else:
         data['cena'] = "N/A"
 
-    # 4. POPRAWIONE NUTY (Regex dostosowany do Twojego tekstu)
-    def find_scent_notes_fixed(keyword, text):
-        # Szukamy słowa "Otwarcie" itd. i bierzemy tekst do kropki
-        pattern = rf"{keyword}\s+[^.]*?\s+(?:uderza|rozwijają się|tworzy|mieszanką)\s+([^.]*)"
-        match = re.search(pattern, text, re.IGNORECASE)
-        if not match: # Drugi sposób jeśli pierwszy zawiedzie
-            pattern = rf"{keyword}\s+(?:[^.]*?)\s+([^.]*)"
-            match = re.search(pattern, text, re.IGNORECASE)
-        return match.group(1).strip() if match else "N/A"
-    
-    data['nuty_glowy'] = find_scent_notes_fixed("Otwarcie", full_txt)
-    data['nuty_serca'] = find_scent_notes_fixed("sercu", full_txt)
-    data['nuty_bazy'] = find_scent_notes_fixed("Bazę", full_txt)
+    # 4. Nuty zapachowe (Otwarcie / sercu / Bazę)
+    notes = extract_scent_notes(full_txt)
+    data['nuty_glowy'] = format_notes(notes['top'])
+    data['nuty_serca'] = format_notes(notes['heart'])
+    data['nuty_bazy'] = format_notes(notes['base'])
 
     # 5. Atrybuty
     rows = soup.find_all('tr')
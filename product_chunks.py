@@ -0,0 +1,93 @@
+import re
+import numpy as np
+from embeddings import estimate_tokens
+
+CHUNKS_TABLE = 'perfume_chunks'
+CHUNKS_ON_CONFLICT = 'wp_id,chunk_type,chunk_index'
+# Long enough for a paragraph, short enough that one topic dominates the vector
+CHUNK_MAX_TOKENS = 200
+# A product scores as its best chunk plus this share of its other chunks' (positive) scores
+SECONDARY_WEIGHT = 0.1
+
+SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+|\s*\n\s*')
+
+def split_text(text, max_tokens=CHUNK_MAX_TOKENS):
+    """Pieces of at most max_tokens (estimated), cut at sentence ends or line
+    breaks; a sentence that is too long on its own is cut between words."""
+    pieces, current = [], ""
+    for sentence in (s.strip() for s in SENTENCE_RE.split(text or "")):
+        if not sentence:
+            continue
+        while estimate_tokens(sentence) > max_tokens:
+            cut = sentence.rfind(" ", 0, max_tokens * 3)
+            cut = cut if cut > 0 else max_tokens * 3
+            head, sentence = sentence[:cut].strip(), sentence[cut:].strip()
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(head)
+        if current and estimate_tokens(current + " " + sentence) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+def product_chunks(name, description, notes, profile):
+    """Typed chunks of one product: the description in token-bounded pieces,
+    its scent notes, and its accords/stats profile. Every chunk starts with the
+    product name so it still says which perfume it is about on its own."""
+    chunks = []
+
+    def add(chunk_type, index, text):
+        chunks.append({"chunk_type": chunk_type, "chunk_index": index, "content": f"{name}: {text}", "embedding": None})
+
+    if description and description != "Brak opisu":
+        for i, piece in enumerate(split_text(description)):
+            add("description", i, piece)
+    if notes:
+        add("notes", 0, notes)
+    if profile:
+        add("accords", 0, profile)
+    return chunks
+
+def chunk_rows(records):
+    """perfume_chunks rows for the records' chunks."""
+    return [dict(chunk, wp_id=r["wp_id"]) for r in records for chunk in r.get("chunks", [])]
+
+def replace_chunks(supabase, writer, records):
+    """Store the chunks of records in place of the ones saved before (a
+    shorter description leaves fewer chunks). Returns the wp_ids whose chunks
+    could not be written; a product with a chunk that failed to embed keeps
+    its old chunks and is returned too."""
+    records = [r for r in records if "chunks" in r]
+    unembedded = {r["wp_id"] for r in records if any(c["embedding"] is None for c in r["chunks"])}
+    records = [r for r in records if r["wp_id"] not in unembedded]
+    ids = [r["wp_id"] for r in records]
+    if not ids:
+        return unembedded
+    try:
+        supabase.table(CHUNKS_TABLE).delete().in_('wp_id', ids).execute()
+    except Exception as e:
+        print(f"Error deleting old chunks of {len(ids)} products: {e}")
+        return unembedded | set(ids)
+    return unembedded | {row["wp_id"] for row in writer.write(chunk_rows(records))}
+
+def aggregate_scores(wp_ids, scores, k, secondary_weight=SECONDARY_WEIGHT):
+    """Top-k products from chunk scores: [(score, wp_id, position of its best chunk)]."""
+    if len(scores) == 0:
+        return []
+    products, inverse = np.unique(wp_ids, return_inverse=True)
+    best = np.full(len(products), -np.inf, dtype=np.float64)
+    np.maximum.at(best, inverse, scores)
+    positive = np.bincount(inverse, weights=np.maximum(scores, 0), minlength=len(products))
+    totals = best + secondary_weight * (positive - np.maximum(best, 0))
+    k = min(k, len(products))
+    top = np.argpartition(-totals, k - 1)[:k]
+    top = top[np.argsort(-totals[top])]
+    # The best chunk of each product, for showing why it matched
+    order = np.lexsort((-scores, inverse))
+    first = order[np.searchsorted(inverse[order], np.arange(len(products)))]
+    return [(float(totals[i]), int(products[i]), int(first[i])) for i in top]
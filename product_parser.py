@@ -0,0 +1,209 @@
+import re
+from bs4 import BeautifulSoup
+from scent_notes import extract_scent_notes, format_notes
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+BACKENDS = ("selectolax", "lxml", "html.parser")
+ATTRIBUTE_ROWS_CSS = "table.woocommerce-product-attributes tr, table.shop_attributes tr"
+
+def default_backend():
+    """Fastest parser available: selectolax, then lxml, then BeautifulSoup's html.parser."""
+    if LexborHTMLParser is not None:
+        return "selectolax"
+    if lxml is not None:
+        return "lxml"
+    return "html.parser"
+
+def parse_price(texts):
+    """Last amount of the price box (the current price, not the 30-day lowest)."""
+    prices = [re.sub(r'[^\d,]', '', t) for t in texts]
+    return float(prices[-1].replace(',', '.')) if prices else 0.0
+
+def parse_shortlink(href):
+    return int(href.split('p=')[1]) if href and 'p=' in href else None
+
+def apply_attribute_row(data, label, val):
+    label = label.lower()
+    if 'pojemność' in label: data['capacity'] = val
+    elif 'koncentracja' in label: data['concentration'] = val
+    elif 'płeć' in label: data['gender'] = val
+
+def add_scent_notes(data, full_txt):
+    notes = extract_scent_notes(full_txt)
+    data['scent_notes'] = notes
+    data['nuty_glowy'] = format_notes(notes['top'])
+    data['nuty_serca'] = format_notes(notes['heart'])
+    data['nuty_bazy'] = format_notes(notes['base'])
+
+def _parse_soup(soup, url, targeted):
+    data = {}
+    data['product_url'] = url
+
+    # WP ID
+    shortlink = soup.find('link', rel='shortlink')
+    data['wp_id'] = parse_shortlink(shortlink['href']) if shortlink else None
+
+    # Name
+    title = soup.find('h1', class_='product_title')
+    data['name'] = title.get_text(strip=True) if title else "N/A"
+
+    # Image
+    img_meta = soup.find('meta', property='og:image')
+    data['image_url'] = img_meta['content'] if img_meta else "N/A"
+
+    # Price
+    price_container = soup.select_one('p.price')
+    if price_container:
+        data['price'] = parse_price([a.get_text() for a in price_container.find_all('span', class_='woocommerce-Price-amount')])
+    else:
+        data['price'] = 0.0
+
+    # Description
+    opis_div = soup.find('div', id='cgkit-tab-description')
+    full_txt = ""
+    if opis_div:
+        for noise in opis_div.find_all(['script', 'style', 'button']):
+            noise.decompose()
+        full_txt = opis_div.get_text(separator=' ', strip=True)
+        data['description'] = full_txt
+    else:
+        data['description'] = "Brak opisu"
+
+    add_scent_notes(data, full_txt)
+
+    # Attributes: the product attribute table only, falling back to every table row
+    rows = []
+    if targeted:
+        for table in soup.find_all('table', class_=['woocommerce-product-attributes', 'shop_attributes']):
+            rows.extend(table.find_all('tr'))
+    for row in rows or soup.find_all('tr'):
+        cells = row.find_all(['td', 'th'])
+        if len(cells) >= 2:
+            apply_attribute_row(data, cells[0].get_text(strip=True), cells[1].get_text(strip=True))
+
+    # Stock status
+    data['stock'] = 1 if soup.find('p', class_='in-stock') else 0
+
+    return data
+
+def _has_class(cls):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {cls} ")'
+
+def _text(el, separator=''):
+    """Like BeautifulSoup's get_text(separator, strip=True)."""
+    return separator.join(t.strip() for t in el.itertext() if t.strip())
+
+def _parse_lxml(html, url):
+    doc = lxml.html.fromstring(html)
+
+    def first(xpath):
+        found = doc.xpath(xpath)
+        return found[0] if found else None
+
+    data = {}
+    data['product_url'] = url
+
+    data['wp_id'] = parse_shortlink(first('//link[contains(concat(" ", normalize-space(@rel), " "), " shortlink ")]/@href'))
+
+    title = first(f'//h1[{_has_class("product_title")}]')
+    data['name'] = _text(title) if title is not None else "N/A"
+
+    img = first('//meta[@property="og:image"]/@content')
+    data['image_url'] = img if img is not None else "N/A"
+
+    price_container = first(f'//p[{_has_class("price")}]')
+    if price_container is not None:
+        data['price'] = parse_price([_text(a) for a in price_container.xpath(f'.//span[{_has_class("woocommerce-Price-amount")}]')])
+    else:
+        data['price'] = 0.0
+
+    opis_div = first('//div[@id="cgkit-tab-description"]')
+    full_txt = ""
+    if opis_div is not None:
+        for noise in opis_div.xpath('.//script | .//style | .//button'):
+            noise.drop_tree()
+        full_txt = _text(opis_div, ' ')
+        data['description'] = full_txt
+    else:
+        data['description'] = "Brak opisu"
+
+    add_scent_notes(data, full_txt)
+
+    rows = doc.xpath(f'//table[{_has_class("woocommerce-product-attributes")} or {_has_class("shop_attributes")}]//tr')
+    for row in rows or doc.xpath('//tr'):
+        cells = row.xpath('./td | ./th')
+        if len(cells) >= 2:
+            apply_attribute_row(data, _text(cells[0]), _text(cells[1]))
+
+    data['stock'] = 1 if first(f'//p[{_has_class("in-stock")}]') is not None else 0
+    return data
+
+def _parse_selectolax(html, url):
+    tree = LexborHTMLParser(html)
+    data = {}
+    data['product_url'] = url
+
+    shortlink = tree.css_first('link[rel~="shortlink"]')
+    data['wp_id'] = parse_shortlink(shortlink.attributes.get('href')) if shortlink else None
+
+    title = tree.css_first('h1.product_title')
+    data['name'] = title.text(strip=True) if title else "N/A"
+
+    img_meta = tree.css_first('meta[property="og:image"]')
+    data['image_url'] = img_meta.attributes.get('content') if img_meta else "N/A"
+
+    price_container = tree.css_first('p.price')
+    if price_container:
+        data['price'] = parse_price([a.text() for a in price_container.css('span.woocommerce-Price-amount')])
+    else:
+        data['price'] = 0.0
+
+    opis_div = tree.css_first('div#cgkit-tab-description')
+    full_txt = ""
+    if opis_div:
+        for noise in opis_div.css('script, style, button'):
+            noise.decompose()
+        full_txt = opis_div.text(separator=' ', strip=True)
+        data['description'] = full_txt
+    else:
+        data['description'] = "Brak opisu"
+
+    add_scent_notes(data, full_txt)
+
+    for row in tree.css(ATTRIBUTE_ROWS_CSS) or tree.css('tr'):
+        cells = row.css('td, th')
+        if len(cells) >= 2:
+            apply_attribute_row(data, cells[0].text(strip=True), cells[1].text(strip=True))
+
+    data['stock'] = 1 if tree.css_first('p.in-stock') else 0
+    return data
+
+def parse_wp_product(html, url, backend=None, targeted=True):
+    """Extract product details from a product page.
+
+    backend: "selectolax", "lxml" or "html.parser" (default: fastest available).
+    The selectolax and lxml backends query only the product summary, description
+    tab and attribute table. With targeted=False the html.parser backend keeps
+    the original whole-document scan of every table row.
+    """
+    backend = backend or default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    if backend == "selectolax":
+        if LexborHTMLParser is None:
+            raise ValueError("selectolax is not installed")
+        return _parse_selectolax(html, url)
+    if backend == "lxml":
+        if lxml is None:
+            raise ValueError("lxml is not installed")
+        return _parse_lxml(html, url)
+    return _parse_soup(BeautifulSoup(html, 'html.parser'), url, targeted)
@@ -0,0 +1,163 @@
+import re
+import math
+import asyncio
+from html import unescape
+from concurrent.futures import ProcessPoolExecutor
+from fragrantica_matcher import FragranticaMatcher
+from fragrantica_loader import load_fragrantica
+from product_chunks import product_chunks
+
+TAG_RE = re.compile('<.*?>')
+
+def clean_html(raw_html):
+    """Remove HTML tags and unescape entities."""
+    if not raw_html:
+        return ""
+    cleantext = TAG_RE.sub(' ', raw_html)
+    return unescape(cleantext).strip()
+
+def assemble_record(p, variations, frag_match, chunks=False):
+    """The Supabase record (without embedding) for a WooCommerce product, its
+    variations and its Fragrantica match (or None). With chunks=True the
+    record also carries its typed embedding chunks under "chunks" (not a
+    column; the sync writes them to their own table).
+
+    Pure CPU work with no I/O or shared state, so it can run in worker processes.
+    """
+    p_id = p['id']
+    name = p['name']
+
+    # 1. Price and Stock
+    price = float(p['price']) if p['price'] else 0.0
+    stock_status = 1 if p['stock_status'] == 'instock' else 0
+
+    # Handle variations for more detail
+    variations_info = []
+    for v in variations:
+        v_stock = "Na stanie" if v['stock_status'] == 'instock' else "Brak"
+        v_attr = ", ".join([f"{a['name']}: {a['option']}" for a in v['attributes']])
+        variations_info.append(f"{v_attr} - {v['price']} PLN ({v_stock})")
+        # Update price to minimum if currently 0
+        if price == 0 and v['price']:
+            price = float(v['price'])
+
+    # 2. Attributes
+    attrs = {}
+    for attr in p['attributes']:
+        attrs[attr['name']] = ", ".join(attr['options'])
+
+    # 3. Clean Description
+    description = clean_html(p['description']) or clean_html(p['short_description']) or "Brak opisu"
+
+    # Combine Scent Notes
+    scent_notes = []
+    # We don't have separate notes in Woo API unless they are in attributes
+    # Some sites put notes in attributes. Let's check for 'Nuty'
+    for attr_name, attr_val in attrs.items():
+        if 'nuty' in attr_name.lower() or 'otwarcie' in attr_name.lower():
+            scent_notes.append(f"{attr_name}: {attr_val}")
+
+    # From Fragrantica
+    if frag_match and frag_match.get('notes'):
+        raw_notes = frag_match['notes']
+        if isinstance(raw_notes, list):
+            scent_notes.append(f"Fragrantica: {', '.join(raw_notes)}")
+        elif isinstance(raw_notes, dict):
+            fn = raw_notes.get('notes', {})
+            if isinstance(fn, dict):
+                if fn.get('top'): scent_notes.append(f"Góra: {', '.join(fn['top'])}")
+                if fn.get('middle'): scent_notes.append(f"Serce: {', '.join(fn['middle'])}")
+                if fn.get('base'): scent_notes.append(f"Baza: {', '.join(fn['base'])}")
+            elif isinstance(fn, list):
+                scent_notes.append(f"Fragrantica: {', '.join(fn)}")
+
+    # Accords
+    accords_str = ""
+    if frag_match and frag_match.get('accords'):
+        acc = [f"{list(a.keys())[0]} ({round(list(a.values())[0], 1)}%)" for a in frag_match['accords']]
+        accords_str = "Akordy: " + ", ".join(acc)
+
+    # 4. Build full description for embedding
+    meta_parts = []
+    if attrs.get('Koncentracja'): meta_parts.append(f"Koncentracja: {attrs['Koncentracja']}")
+    if attrs.get('Płeć'): meta_parts.append(f"Płeć: {attrs['Płeć']}")
+    if variations_info: meta_parts.append("Dostępne warianty: " + " | ".join(variations_info))
+
+    stats_list = []
+    if frag_match:
+        if frag_match.get('launch_year'): stats_list.append(f"Rok premiery: {frag_match['launch_year']}")
+        if frag_match.get('stats'):
+            s = frag_match['stats']
+            if s.get('longevity'): stats_list.append(f"Trwałość: {s['longevity']}/5")
+            if s.get('sillage'): stats_list.append(f"Projekcja: {s['sillage']}/5")
+
+    full_desc_for_db = description
+    if meta_parts: full_desc_for_db += "\n\n" + " | ".join(meta_parts)
+    if stats_list: full_desc_for_db += "\n\n" + " | ".join(stats_list)
+    if accords_str: full_desc_for_db += "\n\n" + accords_str
+
+    record = {
+        "wp_id": p_id,
+        "name": name,
+        "brand": frag_match['brand'] if frag_match else name.split()[0],
+        "price": price,
+        "stock": stock_status,
+        "description": full_desc_for_db,
+        "scent_notes_combined": " | ".join(scent_notes) if scent_notes else "Brak danych",
+        "image_url": p['images'][0]['src'] if p['images'] else "N/A",
+        "product_url": p['permalink'],
+        "embedding": None
+    }
+    if chunks:
+        # Variants are left out: prices and stock are filters, not meaning
+        profile = [part for part in meta_parts if not part.startswith("Dostępne warianty")] + stats_list
+        if accords_str: profile.append(accords_str)
+        record["chunks"] = product_chunks(name, description, " | ".join(scent_notes), " | ".join(profile))
+    return record
+
+# Matcher of a worker process, built once by the pool initializer
+_matcher = None
+_chunks = False
+
+def _init_worker(data_path, cache_path, chunks=False):
+    global _matcher, _chunks
+    _matcher = FragranticaMatcher(load_fragrantica(data_path, cache_path))
+    _chunks = chunks
+
+def _build_chunk(items):
+    """Records for [(product, variations)], plus the matcher stats they added."""
+    before = dict(_matcher.stats)
+    records = [assemble_record(p, variations, _matcher.match(p['name'])[0], _chunks) for p, variations in items]
+    return records, {k: _matcher.stats[k] - before[k] for k in before}
+
+class RecordBuilderPool:
+    """Builds records in worker processes, so HTML cleaning, matching and
+    description assembly use every core instead of stalling the event loop.
+
+    Each worker loads the Fragrantica dump once (from the pickle cache when
+    it is current) and keeps its own matcher.
+    """
+
+    def __init__(self, workers, data_path, cache_path=None, chunks=False):
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data_path, cache_path, chunks))
+
+    async def build(self, items, matcher=None):
+        """Records for [(product, variations)], in order, split across the workers.
+
+        The workers' match counts are added to matcher.stats so its summary covers the run.
+        """
+        loop = asyncio.get_running_loop()
+        size = math.ceil(len(items) / self.workers) if items else 1
+        results = await asyncio.gather(*(loop.run_in_executor(self._pool, _build_chunk, items[i:i + size])
+                                         for i in range(0, len(items), size)))
+        records = []
+        for chunk, stats in results:
+            records.extend(chunk)
+            if matcher is not None:
+                for k, v in stats.items():
+                    matcher.stats[k] += v
+        return records
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
@@ -0,0 +1,160 @@
+import os
+import re
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from sync_state import write_json_atomic
+
+PROMETHEUS_PREFIX = "perfun_sync"
+
+class RunMetrics:
+    """Stage timers, counters and gauges of one sync run.
+
+    Timers add up the wall-clock time spent inside a stage across all threads
+    and tasks, so with concurrent workers a stage can be busy for longer than
+    the run took; the summary shows both. Components that keep their own
+    `stats` dicts (session, embedder, writer, matcher) are copied in with
+    collect() at the end of the run. Safe to use from worker threads.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.finished = None
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            t = self.timers.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            t["calls"] += 1
+            t["seconds"] += seconds
+            t["max_seconds"] = max(t["max_seconds"], seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def collect(self, prefix, stats):
+        """Copy the numeric entries of a component's stats dict as `<prefix>_<key>` gauges."""
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                self.gauge(f"{prefix}_{key}", value)
+
+    def finish(self):
+        self.finished = time.time()
+        return self
+
+    def wall_seconds(self):
+        return (self.finished or time.time()) - self.started
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "job": self.job,
+                "started": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(self.started)),
+                "wall_seconds": round(self.wall_seconds(), 3),
+                "stages": {k: dict(v) for k, v in self.timers.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def summary(self):
+        wall = self.wall_seconds()
+        lines = [f"Run took {wall:.1f}s. Time inside each stage (summed over workers):"]
+        for stage, t in sorted(self.timers.items(), key=lambda kv: -kv[1]["seconds"]):
+            mean = t["seconds"] / t["calls"] if t["calls"] else 0.0
+            lines.append(f"  {stage:<16} {t['seconds']:>9.2f}s {t['seconds'] / wall if wall else 0:>6.0%} of wall, "
+                         f"{t['calls']} calls, mean {mean * 1000:.1f} ms, max {t['max_seconds'] * 1000:.1f} ms")
+        if self.counters:
+            lines.append("  " + ", ".join(f"{k}={v}" for k, v in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        write_json_atomic(self.as_dict(), path)
+
+    def prometheus(self):
+        """Prometheus text exposition format (for node_exporter's textfile collector)."""
+        data = self.as_dict()
+        job = f'job="{self.job}"'
+        lines = []
+
+        def metric(name, kind, samples):
+            name = f"{PROMETHEUS_PREFIX}_{metric_name(name)}"
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples)
+
+        metric("last_run_timestamp_seconds", "gauge", [(job, round(self.finished or time.time(), 3))])
+        metric("run_seconds", "gauge", [(job, data["wall_seconds"])])
+        stages = sorted(data["stages"].items())
+        if stages:
+            metric("stage_seconds_total", "counter",
+                   [(f'{job},stage="{s}"', round(t["seconds"], 6)) for s, t in stages])
+            metric("stage_calls_total", "counter", [(f'{job},stage="{s}"', t["calls"]) for s, t in stages])
+            metric("stage_max_seconds", "gauge",
+                   [(f'{job},stage="{s}"', round(t["max_seconds"], 6)) for s, t in stages])
+        for name, value in sorted(data["counters"].items()):
+            metric(f"{name}_total", "counter", [(job, value)])
+        for name, value in sorted(data["gauges"].items()):
+            metric(name, "gauge", [(job, value)])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the textfile atomically; the collector must never read half a file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".prom")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus())
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def export(self, json_path=None, textfile_path=None):
+        """Write the requested exports, reporting (not raising) failures: the run itself is done."""
+        for path, write in ((json_path, self.write_json), (textfile_path, self.write_prometheus)):
+            if not path:
+                continue
+            try:
+                write(path)
+            except Exception as e:
+                print(f"Could not write metrics to {path}: {e}")
+
+def collect_sync_stats(metrics, session=None, matcher=None, embedder=None, writer=None):
+    """Copy the end-of-run stats of the sync components into metrics."""
+    if session is not None:
+        metrics.collect("http", session.totals())
+    if matcher is not None:
+        metrics.collect("matcher", matcher.stats)
+        metrics.gauge("match_rate", round(matcher.match_rate(), 4))
+    if embedder is not None:
+        metrics.collect("embeddings", embedder.stats)
+        if embedder.upstream is not None:
+            metrics.collect("openai_http", embedder.upstream.stats)
+        if embedder.cache:
+            metrics.gauge("embedding_cache_hits", embedder.cache.hits)
+            metrics.gauge("embedding_cache_misses", embedder.cache.misses)
+    if writer is not None:
+        metrics.collect("writer", writer.stats)
+
+def metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from order_stats import ORDER_STATUSES, ORDER_WORKERS, exclusions_from_env, gmt, iter_order_pages
+
+LEDGER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_ledger.sqlite")
+# How far back the first sync reaches
+HISTORY_DAYS = 365
+# Re-read orders modified this long before the last sync (clock skew between us and the shop)
+SYNC_OVERLAP = timedelta(minutes=10)
+LEDGER_FIELDS = "id,status,date_created_gmt,line_items.product_id,line_items.quantity,line_items.name"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    status TEXT NOT NULL,
+    name TEXT,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (order_id, product_id)
+);
+CREATE INDEX IF NOT EXISTS order_items_day ON order_items (day, product_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIEW IF NOT EXISTS daily_sales AS
+    SELECT day, product_id, SUM(quantity) AS quantity FROM order_items
+    WHERE status IN ({", ".join(f"'{s}'" for s in ORDER_STATUSES.split(","))})
+    GROUP BY day, product_id;
+"""
+
+class SalesLedger:
+    """Local SQLite ledger of sold quantities per order, product and day (UTC).
+
+    sync() only asks WooCommerce for orders modified since the previous sync
+    (the first sync backfills HISTORY_DAYS), and an order that comes back
+    replaces its earlier rows, so status changes such as cancellations are
+    reflected. Rankings and per-day trends are then plain SQL over the
+    `daily_sales` view.
+    """
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def apply(self, orders):
+        """Store (or replace) the line items of orders. Returns the number of orders applied."""
+        rows = []
+        for order in orders:
+            quantities = Counter()
+            names = {}
+            for item in order.get('line_items', []):
+                if item.get('product_id'):
+                    quantities[item['product_id']] += item.get('quantity') or 1
+                    names[item['product_id']] = item.get('name')
+            day = (order.get('date_created_gmt') or "")[:10]
+            rows.extend((order['id'], p_id, day, order.get('status', ""), names[p_id], qty)
+                        for p_id, qty in quantities.items())
+        with self._conn:
+            self._conn.executemany("DELETE FROM order_items WHERE order_id = ?", [(o['id'],) for o in orders])
+            self._conn.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(orders)
+
+    def sync(self, session, url, auth, history_days=HISTORY_DAYS, workers=ORDER_WORKERS, now=None):
+        """Fetch orders created or changed since the last sync. Returns the number of orders applied."""
+        now = now or datetime.now(timezone.utc)
+        watermark = self._meta("watermark")
+        # Ordered by id: orders modified during the run can't shift the pages
+        params = {"status": "any", "dates_are_gmt": "true", "orderby": "id", "order": "asc",
+                  "_fields": LEDGER_FIELDS}
+        if watermark:
+            params["modified_after"] = watermark
+        else:
+            params["after"] = gmt(now - timedelta(days=history_days))
+        applied = 0
+        for orders in iter_order_pages(session, url, auth, params, workers):
+            applied += self.apply(orders)
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('watermark', ?)", (gmt(now - SYNC_OVERLAP),))
+        print(f"Sales ledger: {applied} orders {'changed since ' + watermark if watermark else 'backfilled'}")
+        return applied
+
+    def sales(self, days, exclude_ids=None, exclude_names=None, now=None):
+        """Sold quantity per product over the last `days` days (today included): Counter."""
+        if exclude_ids is None or exclude_names is None:
+            default_ids, default_names = exclusions_from_env()
+            exclude_ids = default_ids if exclude_ids is None else exclude_ids
+            exclude_names = default_names if exclude_names is None else exclude_names
+        now = now or datetime.now(timezone.utc)
+        since = (now - timedelta(days=days)).strftime('%Y-%m-%d')
+        sql = "SELECT product_id, SUM(quantity) FROM order_items WHERE day >= ? AND status IN ({})".format(
+            ", ".join("?" * len(ORDER_STATUSES.split(","))))
+        params = [since, *ORDER_STATUSES.split(",")]
+        if exclude_ids:
+            sql += " AND product_id NOT IN ({})".format(", ".join("?" * len(exclude_ids)))
+            params.extend(exclude_ids)
+        for keyword in exclude_names:
+            sql += " AND lower(coalesce(name, '')) NOT LIKE ?"
+            params.append(f"%{keyword}%")
+        sql += " GROUP BY product_id"
+        return Counter(dict(self._conn.execute(sql, params).fetchall()))
+
+    def trend(self, product_id, days=90, now=None):
+        """[(day, quantity)] of one product over the last `days` days."""
+        now = now or datetime.now(timezone.utc)
+        since = (now - timedelta(days=days)).strftime('%Y-%m-%d')
+        return self._conn.execute(
+            "SELECT day, quantity FROM daily_sales WHERE product_id = ? AND day >= ? ORDER BY day",
+            (product_id, since)).fetchall()
+
+    def close(self):
+        self._conn.close()
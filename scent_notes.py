@@ -0,0 +1,89 @@
+import re
+
+# Where a pyramid level is introduced in a description. Group name = level; the
+# bare serce/baza forms are also ordinary words, so they get a separate group
+# ("w sercu" followed by a lead-in is specific enough on its own).
+KEYWORD_RE = re.compile(
+    r"(?P<top>\bnuty\s+głowy\b|\botwarci(?:e|u)\b)"
+    r"|(?P<heart>\bnuty\s+serca\b|\bsercu\b)|(?P<heart_word>\bserce\b)"
+    r"|(?P<base>\bnuty\s+bazy\b)|(?P<base_word>\bbazę\b|\bbaza\b)",
+    re.IGNORECASE,
+)
+# "W sercu kompozycji ...", "Bazę tego zapachu ..."
+QUALIFIER_RE = re.compile(
+    r"^\s+(?:tego\s+|tej\s+)?(?:kompozycji|zapachu|perfum|perfumy|piramidy(?:\s+zapachowej)?|"
+    r"wody(?:\s+perfumowanej|\s+toaletowej)?)\b",
+    re.IGNORECASE,
+)
+
+# Words that hand over to the list of notes, at most a few words after the keyword:
+# "Otwarcie uderza ...", "W sercu rozwijają się ...", "Bazę tworzy mieszanką ...",
+# "Otwarcie perfum Khamrah uderza ...", "Serce natomiast tworzą ..."
+LEAD_IN_RE = re.compile(
+    r"^\s+(?:[^\s.,:;!?]+\s+){0,3}?"
+    r"(?:uderzają|uderza|otwierają|otwiera|rozwijają\s+się|rozwija\s+się|pojawiają\s+się|pojawia\s+się|"
+    r"znajdują\s+się|znajduje\s+się|znajdziemy|kryją\s+się|kryje\s+się|skrywa|tworzą|tworzy|stanowią|stanowi|"
+    r"składają\s+się\s+z|składa\s+się\s+z|wyczuwalne\s+są|wyczuwamy)"
+    r"(?:\s+(?:mieszanką|mieszanka|nuty|nutami|akordy))?"
+    r"\s+(?P<notes>[^.;!?]+)",
+    re.IGNORECASE,
+)
+LABEL_RE = re.compile(r"^\s*[:\-–]\s*(?P<notes>[^.;!?]+)")
+# Only after a qualifier: "Otwarcie zapachu to ..." (a bare "Serce to ..." is usually prose)
+IS_RE = re.compile(r"^\s+to\s+(?P<notes>[^.;!?]+)", re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r"[.;!?]")
+# A relative clause after the list describes the notes, it is not one of them
+CLAUSE_RE = re.compile(r"\s*[,–-]\s*(?:które|który|która|co|nadając|nadające|dzięki)\b.*$", re.IGNORECASE)
+SPLIT_RE = re.compile(r"\s*,\s*|\s+(?:i|oraz|a\s+także)\s+", re.IGNORECASE)
+
+LEVELS = ("top", "heart", "base")
+
+def split_notes(phrase):
+    """'bergamotką, cytryną i różą' -> ['bergamotką', 'cytryną', 'różą']"""
+    phrase = CLAUSE_RE.sub("", phrase.strip())
+    return [n.strip(" -–") for n in SPLIT_RE.split(phrase) if n.strip(" -–")]
+
+def extract_scent_notes(text):
+    """Top/heart/base notes from a Polish product description, in one pass.
+
+    Returns {'top': [...], 'heart': [...], 'base': [...]} (empty lists when a
+    level is not described). The keyword must be followed, within a few words
+    of the same sentence, by a lead-in word ("uderza", "rozwijają się",
+    "tworzy", ...), or directly by a label colon ("Nuty serca: ..."). After a
+    qualifier ("Otwarcie zapachu", "W sercu kompozycji") "to" works as a
+    label too. A bare "serce"/"baza" without a qualifier only counts when
+    another level of the pyramid is described too.
+    """
+    notes = {level: [] for level in LEVELS}
+    if not text:
+        return notes
+    unqualified = {}
+    for match in KEYWORD_RE.finditer(text):
+        level = match.lastgroup
+        bare = level.endswith("_word")
+        level = level.replace("_word", "")
+        if notes[level]:
+            continue
+        end = SENTENCE_END_RE.search(text, match.end())
+        rest = text[match.end():end.start() if end else len(text)]
+        qualifier = QUALIFIER_RE.match(rest)
+        if qualifier:
+            rest = rest[qualifier.end():]
+        found = LABEL_RE.match(rest) or (qualifier and IS_RE.match(rest)) or LEAD_IN_RE.match(rest)
+        if not found:
+            continue
+        if bare and not qualifier:
+            unqualified.setdefault(level, split_notes(found.group("notes")))
+        else:
+            notes[level] = split_notes(found.group("notes"))
+        if all(notes.values()):
+            break
+    if any(notes.values()) or len(unqualified) > 1:
+        for level, found in unqualified.items():
+            if not notes[level]:
+                notes[level] = found
+    return notes
+
+def format_notes(notes):
+    """List of notes as the 'nuty_*' string the scrapers store ("N/A" when empty)."""
+    return ", ".join(notes) if notes else "N/A"
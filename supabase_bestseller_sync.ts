@@ -9,66 +9,109 @@ const SUPABASE_SERVICE_KEY = Deno.env.get('FIRMY_SUPABASE_KEY')
 
 const supabase = createClient(SUPABASE_URL!, SUPABASE_SERVICE_KEY!)
 
+const ORDERS_PER_PAGE = 100
+const ORDER_CONCURRENCY = 6
+// Only what the ranking needs; WordPress trims the rest of each order server-side
+const ORDER_FIELDS = 'id,line_items.product_id,line_items.quantity,line_items.name'
+
+// Free samples and other items that are not real sales (extend via BESTSELLER_EXCLUDE_IDS / _NAMES)
+const EXCLUDED_IDS = new Set([15916, ...(Deno.env.get('BESTSELLER_EXCLUDE_IDS') ?? '').split(',').filter(Boolean).map(Number)])
+const EXCLUDED_NAMES = ['gratis', ...(Deno.env.get('BESTSELLER_EXCLUDE_NAMES') ?? '').split(',').filter(Boolean).map((n) => n.trim().toLowerCase())]
+
+async function fetchOrdersPage(afterDate: string, page: number): Promise<{ orders: any[], totalPages: number }> {
+    const params = new URLSearchParams({
+        after: afterDate,
+        dates_are_gmt: 'true',
+        status: 'processing,completed',
+        per_page: String(ORDERS_PER_PAGE),
+        page: String(page),
+        orderby: 'date',
+        order: 'asc',
+        _fields: ORDER_FIELDS,
+    })
+    const response = await fetch(`${WC_URL}/wp-json/wc/v3/orders?${params}`, {
+        headers: { 'Authorization': `Basic ${btoa(`${WC_CK}:${WC_CS}`)}` }
+    })
+    if (!response.ok) throw new Error(`WooCommerce API error (page ${page}): ${response.statusText}`)
+    return { orders: await response.json(), totalPages: Number(response.headers.get('X-WP-TotalPages') ?? 1) }
+}
+
+// Sold quantity per product over all orders in the window; pages are counted as they arrive
+async function aggregateSales(days: number): Promise<Map<number, number>> {
+    const after = new Date()
+    after.setDate(after.getDate() - days)
+    const afterDate = after.toISOString().slice(0, 19)
+
+    const counts = new Map<number, number>()
+    const add = (orders: any[]) => {
+        for (const order of orders) {
+            for (const item of order.line_items ?? []) {
+                const id = item.product_id
+                const name = (item.name ?? '').toLowerCase()
+                if (!id || EXCLUDED_IDS.has(id) || EXCLUDED_NAMES.some((n) => name.includes(n))) continue
+                counts.set(id, (counts.get(id) ?? 0) + (item.quantity || 1))
+            }
+        }
+    }
+
+    const first = await fetchOrdersPage(afterDate, 1)
+    add(first.orders)
+    let nextPage = 2
+    const worker = async () => {
+        while (nextPage <= first.totalPages) {
+            const page = nextPage++
+            add((await fetchOrdersPage(afterDate, page)).orders)
+        }
+    }
+    await Promise.all(Array.from({ length: ORDER_CONCURRENCY }, worker))
+    console.log(`Counted orders from ${first.totalPages} pages (last ${days} days)`)
+    return counts
+}
+
 serve(async (req) => {
     try {
         console.log("Starting Bestseller Sync...")
+        const query = new URL(req.url).searchParams
+        const days = Number(query.get('days') ?? 30)
+        const topN = Number(query.get('top') ?? 10)
+
+        // 1. Count sales over every order in the window
+        const productCounts = await aggregateSales(days)
 
-        // 1. Fetch last 100 orders from WooCommerce
-        const thirtyDaysAgo = new Date();
-        thirtyDaysAgo.setDate(thirtyDaysAgo.getDate() - 30);
-        const afterDate = thirtyDaysAgo.toISOString();
-
-        const auth = btoa(`${WC_CK}:${WC_CS}`);
-        const ordersUrl = `${WC_URL}/wp-json/wc/v3/orders?after=${afterDate}&per_page=100&status=processing,completed`;
-
-        const response = await fetch(ordersUrl, {
-            headers: { 'Authorization': `Basic ${auth}` }
-        });
-
-        if (!response.ok) throw new Error(`WooCommerce API error: ${response.statusText}`);
-        const orders = await response.json();
-
-        // 2. Aggregate sales
-        const productCounts: Record<number, number> = {};
-        orders.forEach((order: any) => {
-            order.line_items.forEach((item: any) => {
-                const id = item.product_id;
-                if (id !== 15916) { // Skip gratis
-                    productCounts[id] = (productCounts[id] || 0) + (item.quantity || 1);
-                }
-            });
-        });
-
-        // 3. Get Top 10 IDs
-        const topIds = Object.entries(productCounts)
-            .sort(([, a], [, b]) => b - a)
-            .slice(0, 10)
-            .map(([id]) => parseInt(id));
+        // 2. Get the top IDs
+        const topIds = [...productCounts.entries()]
+            .sort(([idA, a], [idB, b]) => b - a || idA - idB)
+            .slice(0, topN)
+            .map(([id]) => id);
 
         console.log("Top Products identified:", topIds);
 
-        // 4. Update Supabase
-        // We update them one by one to add the tag if missing
-        for (const pId of topIds) {
-            const { data: records } = await supabase
-                .from('perfume_knowledge_base')
-                .select('id, description, name')
-                .eq('wp_id', pId);
-
-            if (records && records.length > 0) {
-                const record = records[0];
-                if (!record.description.includes('[BESTSELLER]')) {
-                    const newDesc = record.description + "\n\n[BESTSELLER]";
-                    await supabase
-                        .from('perfume_knowledge_base')
-                        .update({ description: newDesc })
-                        .eq('id', record.id);
-                    console.log(`Tagged ${record.name} as Bestseller.`);
-                }
-            }
+        // 3. Update Supabase: read the current ranking together with the new top products,
+        // then send only the difference to set_bestsellers() (bestseller_rank.sql)
+        const { data: current, error: readError } = await supabase
+            .from('perfume_knowledge_base')
+            .select('wp_id, name, bestseller_rank, bestseller_score')
+            .or(`bestseller_rank.not.is.null,wp_id.in.(${topIds.join(',') || '0'})`);
+        if (readError) throw new Error(`Supabase read error: ${readError.message}`)
+
+        const currentById = new Map((current ?? []).map((row: any) => [row.wp_id, row]))
+        const ranks = topIds
+            .map((id, i) => ({ wp_id: id, rank: i + 1, score: productCounts.get(id)! }))
+            .filter((r) => {
+                const row: any = currentById.get(r.wp_id)
+                return row && (row.bestseller_rank !== r.rank || row.bestseller_score !== r.score)
+            })
+        const clearIds = (current ?? [])
+            .filter((row: any) => row.bestseller_rank !== null && !topIds.includes(row.wp_id))
+            .map((row: any) => row.wp_id)
+
+        if (ranks.length > 0 || clearIds.length > 0) {
+            const { error: rpcError } = await supabase.rpc('set_bestsellers', { ranks, clear_ids: clearIds })
+            if (rpcError) throw new Error(`Supabase update error: ${rpcError.message}`)
         }
+        console.log(`Ranked ${ranks.length} products, cleared ${clearIds.length}.`);
 
-        return new Response(JSON.stringify({ success: true, updated_ids: topIds }), {
+        return new Response(JSON.stringify({ success: true, updated_ids: topIds, cleared_ids: clearIds }), {
             headers: { "Content-Type": "application/json" },
             status: 200,
         })
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from supabase import create_client
+from dotenv import load_dotenv
+from http_client import backoff_delay
+
+# A row with a 1536-float embedding is ~30 KB of JSON; keep requests well under
+# the API gateway limit and the statement timeout
+MAX_BATCH_BYTES = 1_000_000
+MIN_BATCH_BYTES = 50_000
+MAX_BATCH_ROWS = 500
+DEAD_LETTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dead_letter.jsonl")
+
+# SQLSTATE classes caused by the rows themselves (bad values, constraints,
+# unknown columns) and PostgREST request errors: retrying the same rows won't help
+DATA_ERROR_CLASSES = ("22", "23", "42", "PG")
+# Errors that mean the request was too big for the server to finish in time
+TOO_LARGE_CODES = {"57014", "413"}
+
+def error_code(e):
+    return str(getattr(e, "code", None) or getattr(e, "status_code", None) or "")
+
+def row_size(record):
+    return len(json.dumps(record, default=str))
+
+class UpsertWriter:
+    """Upserts records into a Supabase table in byte-sized batches from a few threads.
+
+    Records are grouped by their set of columns (PostgREST wants the same
+    columns in every row of a bulk upsert) and packed into batches of at most
+    max_bytes of JSON. A failing batch is retried with backoff when the error
+    looks transient, then split in half until the offending rows are isolated.
+    Rows that still fail are appended to a JSON-lines dead-letter file that
+    replay() can send again later. When a request times out, later batches
+    are kept to half its size.
+    """
+
+    def __init__(self, supabase, table='perfume_knowledge_base', on_conflict='wp_id', workers=2,
+                 max_bytes=MAX_BATCH_BYTES, max_rows=MAX_BATCH_ROWS, max_retries=3, backoff=0.5,
+                 dead_letter_path=DEAD_LETTER_PATH):
+        self.supabase = supabase
+        self.table = table
+        self.on_conflict = on_conflict
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.dead_letter_path = dead_letter_path
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self.stats = {"rows": 0, "requests": 0, "bytes": 0, "retries": 0, "splits": 0,
+                      "dead_letters": 0, "seconds": 0.0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self.stats[k] += v
+
+    def batches(self, records):
+        """Split records into batches with one column set and at most max_bytes / max_rows each."""
+        groups = {}
+        for r in records:
+            groups.setdefault(tuple(sorted(r)), []).append(r)
+        for group in groups.values():
+            batch, batch_bytes = [], 0
+            for r in group:
+                size = row_size(r)
+                if batch and (len(batch) >= self.max_rows or batch_bytes + size > self.max_bytes):
+                    yield batch
+                    batch, batch_bytes = [], 0
+                batch.append(r)
+                batch_bytes += size
+            if batch:
+                yield batch
+
+    def _upsert(self, batch):
+        start = time.monotonic()
+        try:
+            self.supabase.table(self.table).upsert(batch, on_conflict=self.on_conflict).execute()
+        finally:
+            self._count(requests=1, seconds=time.monotonic() - start)
+        self._count(rows=len(batch), bytes=sum(row_size(r) for r in batch))
+
+    def _write_batch(self, batch):
+        """Write one batch; returns the rows that could not be written."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._upsert(batch)
+                return []
+            except Exception as e:
+                error = e
+                code = error_code(e)
+                if code in TOO_LARGE_CODES:
+                    # Later batches get at most half the size of this one
+                    size = sum(row_size(r) for r in batch)
+                    with self._lock:
+                        self.max_bytes = max(MIN_BATCH_BYTES, min(self.max_bytes, size // 2))
+                    break
+                if code.startswith(DATA_ERROR_CLASSES) or attempt == self.max_retries:
+                    break
+                self._count(retries=1)
+                time.sleep(backoff_delay(attempt, self.backoff))
+
+        if len(batch) > 1:
+            self._count(splits=1)
+            middle = len(batch) // 2
+            return self._write_batch(batch[:middle]) + self._write_batch(batch[middle:])
+        self._dead_letter(batch[0], error)
+        return batch
+
+    def _dead_letter(self, record, error):
+        print(f"Error upserting {self.on_conflict}={record.get(self.on_conflict)}: {error}")
+        self._count(dead_letters=1)
+        if not self.dead_letter_path:
+            return
+        entry = {"table": self.table, "on_conflict": self.on_conflict, "error": str(error),
+                 "failed_at": datetime.now(timezone.utc).isoformat(), "record": record}
+        with self._lock, open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def write(self, records):
+        """Upsert records. Returns the records that failed (and were dead-lettered)."""
+        futures = [self._pool.submit(self._write_batch, batch) for batch in self.batches(records)]
+        failed = []
+        for future in futures:
+            failed.extend(future.result())
+        return failed
+
+    def replay(self):
+        """Send the rows of the dead-letter file again; rows that still fail are kept in it."""
+        path = self.dead_letter_path
+        if not path or not os.path.exists(path):
+            return 0, 0
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        os.replace(path, path + ".replaying")
+        records = [e["record"] for e in entries if e.get("table", self.table) == self.table]
+        others = [e for e in entries if e.get("table", self.table) != self.table]
+        failed = self.write(records)
+        if others:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in others)
+        os.remove(path + ".replaying")
+        return len(records) - len(failed), len(failed)
+
+    def throughput(self):
+        seconds = self.stats["seconds"]
+        return self.stats["rows"] / seconds if seconds else 0.0
+
+    def summary(self):
+        s = self.stats
+        return (f"Supabase upserts: {s['rows']} rows in {s['requests']} requests "
+                f"({s['bytes'] / 1e6:.1f} MB), {s['retries']} retries, {s['splits']} splits, "
+                f"{s['dead_letters']} dead-lettered, {self.throughput():.1f} rows/s")
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay rows from a Supabase dead-letter file.")
+    parser.add_argument("path", nargs="?", default=DEAD_LETTER_PATH)
+    parser.add_argument("--table", default='perfume_knowledge_base')
+    parser.add_argument("--on-conflict", default='wp_id')
+    args = parser.parse_args()
+
+    load_dotenv('/Users/wojciechnowak/.env')
+    supabase = create_client(os.environ.get("FIRMY_SUPABASE_URL"), os.environ.get("FIRMY_SUPABASE_KEY"))
+    writer = UpsertWriter(supabase, args.table, args.on_conflict, dead_letter_path=args.path)
+    written, failed = writer.replay()
+    writer.close()
+    print(f"Replayed {written} rows, {failed} still failing (kept in {args.path}).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+def content_hash(value):
+    """Stable SHA-256 of a string or JSON-serializable value."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+def write_json_atomic(data, path):
+    """Write JSON to path via a temp file + rename so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def write_npz_atomic(arrays, path):
+    """np.savez via a temp file + rename, like write_json_atomic()."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".npz")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def load_state(path):
+    """Load the sync state: last watermark and per-wp_id content hashes."""
+    if not os.path.exists(path):
+        return {"watermark": None, "hashes": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    state.setdefault("watermark", None)
+    state.setdefault("hashes", {})
+    return state
+
+def save_state(state, path):
+    write_json_atomic(state, path)
+
+def load_checkpoint(path):
+    """Progress saved by an interrupted run, or None if there is none (or it is unreadable)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
+
+def save_checkpoint(checkpoint, path):
+    write_json_atomic(checkpoint, path)
+
+def clear_checkpoint(path):
+    """Drop the checkpoint once a run has completed."""
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,7 +1,7 @@
 import requests
 from bs4 import BeautifulSoup
-import re
 import json
+from scent_notes import extract_scent_notes, format_notes
 
 def scrape_wp_product(url):
     headers = {
@@ -34,18 +34,10 @@ def scrape_wp_product(url):
             data['description'] = "Brak opisu"
             
         # Notes
-        def find_scent_notes_fixed(keyword, text):
-            # Keyword can be "Otwarcie", "sercu", "Bazę"
-            pattern = rf"{keyword}\s+[^.]*?\s+(?:uderza|rozwijają się|tworzy|mieszanką)\s+([^.]*)"
-            match = re.search(pattern, text, re.IGNORECASE)
-            if not match:
-                pattern = rf"{keyword}\s+(?:[^.]*?)\s+([^.]*)"
-                match = re.search(pattern, text, re.IGNORECASE)
-            return match.group(1).strip() if match else "N/A"
-        
-        data['nuty_glowy'] = find_scent_notes_fixed("Otwarcie", full_txt)
-        data['nuty_serca'] = find_scent_notes_fixed("sercu", full_txt)
-        data['nuty_bazy'] = find_scent_notes_fixed("Bazę", full_txt)
+        notes = extract_scent_notes(full_txt)
+        data['nuty_glowy'] = format_notes(notes['top'])
+        data['nuty_serca'] = format_notes(notes['heart'])
+        data['nuty_bazy'] = format_notes(notes['base'])
         
         # Attributes
         rows = soup.find_all('tr')
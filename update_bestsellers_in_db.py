@@ -1,13 +1,52 @@
 import os
-import requests
-from datetime import datetime, timedelta
-from collections import Counter
+import argparse
+from urllib.parse import urlparse
 from supabase import create_client
 from dotenv import load_dotenv
+from http_client import RetrySession
+from order_stats import ORDER_WORKERS, aggregate_sales, top_products
+from sales_ledger import LEDGER_PATH, SalesLedger
 
 load_dotenv('/Users/wojciechnowak/.env')
 
-def update_bestsellers_in_db():
+WC_RATE_LIMIT = 25  # requests per second
+
+def apply_bestseller_ranks(supabase, ranking):
+    """Store the ranking in bestseller_rank / bestseller_score with one read and one write.
+
+    The current ranks are read together with the new top products; only the
+    difference is sent to the set_bestsellers() SQL function (bestseller_rank.sql),
+    which clears products that dropped out and ranks the new ones in one statement.
+    """
+    new = {p_id: {"wp_id": p_id, "rank": rank, "score": qty} for rank, (p_id, qty) in enumerate(ranking, 1)}
+    ids = ",".join(str(p_id) for p_id in new) or "0"
+    res = supabase.table('perfume_knowledge_base').select('wp_id, name, bestseller_rank, bestseller_score') \
+        .or_(f"bestseller_rank.not.is.null,wp_id.in.({ids})").execute()
+    current = {row['wp_id']: row for row in res.data}
+
+    for p_id in new:
+        if p_id not in current:
+            print(f"Product ID {p_id} not found in Supabase.")
+    clear_ids = [p_id for p_id, row in current.items() if row['bestseller_rank'] is not None and p_id not in new]
+    changed = [r for p_id, r in new.items() if p_id in current and
+               (current[p_id]['bestseller_rank'], current[p_id]['bestseller_score']) != (r['rank'], r['score'])]
+    for p_id in clear_ids:
+        print(f"{current[p_id]['name']} is no longer a bestseller.")
+    for r in changed:
+        print(f"Ranking {current[r['wp_id']]['name']} #{r['rank']} ({r['score']} sold)")
+    if not clear_ids and not changed:
+        print("Bestseller ranking unchanged.")
+        return 0
+    return supabase.rpc('set_bestsellers', {"ranks": changed, "clear_ids": clear_ids}).execute().data
+
+def update_bestsellers_in_db(days=30, top_n=10, windows=(7, 30, 90), use_ledger=True,
+                             ledger_path=LEDGER_PATH):
+    """Rank the top_n products by quantity sold in the last `days` days (also reports the other windows).
+
+    By default sales come from the local ledger, which only downloads orders
+    changed since the previous run; use_ledger=False recounts the window from
+    the WooCommerce API.
+    """
     # Credentials
     CK = os.environ.get('PERFUN_CONSUMER_KEY')
     CS = os.environ.get('PERFUN_CONSUMER_SECRET')
@@ -17,52 +56,33 @@ def update_bestsellers_in_db():
     
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
     
-    print("Fetching last 100 orders to find bestsellers...")
-    thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
-    endpoint = f"{URL}/wp-json/wc/v3/orders"
-    params = {"after": thirty_days_ago, "per_page": 100, "status": "processing,completed"}
-    
+    windows = sorted(set(windows) | {days})
+    print(f"Counting sales from the last {max(windows)} days to find bestsellers...")
     try:
-        response = requests.get(endpoint, auth=(CK, CS), params=params)
-        orders = response.json()
-        
-        product_counts = Counter()
-        for order in orders:
-            for item in order.get('line_items', []):
-                p_id = item.get('product_id')
-                qty = item.get('quantity')
-                # Skip the "Gratis" sample (ID: 15916)
-                if p_id != 15916:
-                    product_counts[p_id] += qty
-        
-        # Get Top 10 real products
-        top_ids = [p_id for p_id, _ in product_counts.most_common(10)]
-        print(f"Top Product IDs: {top_ids}")
-        
-        # Now update Supabase
-        # 1. Clear bestseller tag from ALL products first (optional but safer)
-        # However, it's better to just update the specific ones if we don't have many.
-        # Let's just find the products in Supabase.
-        
-        for p_id in top_ids:
-            # Find the product
-            res = supabase.table('perfume_knowledge_base').select('id, name, description').eq('wp_id', p_id).execute()
-            if res.data:
-                record = res.data[0]
-                desc = record['description']
-                if "[BESTSELLER]" not in desc:
-                    new_desc = desc + "\n\n[BESTSELLER]"
-                    print(f"Tagging {record['name']} as Bestseller...")
-                    supabase.table('perfume_knowledge_base').update({"description": new_desc}).eq('id', record['id']).execute()
-                else:
-                    print(f"{record['name']} is already tagged.")
-            else:
-                print(f"Product ID {p_id} not found in Supabase.")
-                
+        session = RetrySession({urlparse(URL).netloc: WC_RATE_LIMIT}, pool_size=ORDER_WORKERS, timeout=60)
+        if use_ledger:
+            ledger = SalesLedger(ledger_path)
+            ledger.sync(session, URL, (CK, CS))
+            sales = {window: ledger.sales(window) for window in windows}
+            ledger.close()
+        else:
+            sales = aggregate_sales(session, URL, (CK, CS), windows=windows)
+        for window in sorted(sales):
+            print(f"Top {top_n} ({window} days): {top_products(sales[window], top_n)}")
+
+        ranking = top_products(sales[days], top_n)
+        print(f"Top Product IDs: {[p_id for p_id, _ in ranking]}")
+        apply_bestseller_ranks(supabase, ranking)
         print("Bestsellers updated successfully in Supabase.")
-        
+
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    update_bestsellers_in_db()
+    parser = argparse.ArgumentParser(description="Rank the best-selling products in Supabase.")
+    parser.add_argument("--days", type=int, default=30, help="ranking window in days (default: 30)")
+    parser.add_argument("--top", type=int, default=10, help="number of products to rank (default: 10)")
+    parser.add_argument("--no-ledger", action="store_true",
+                        help="recount the window from the WooCommerce API instead of the local sales ledger")
+    args = parser.parse_args()
+    update_bestsellers_in_db(days=args.days, top_n=args.top, use_ledger=not args.no_ledger)
@@ -0,0 +1,264 @@
+import os
+import json
+import argparse
+import numpy as np
+from openai import OpenAI
+from supabase import create_client
+from dotenv import load_dotenv
+from embeddings import BatchEmbedder
+from product_chunks import CHUNKS_TABLE, aggregate_scores
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vector_index")
+CHUNK_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chunk_index")
+META_FIELDS = ("wp_id", "name", "brand", "price", "stock", "product_url")
+
+def parse_embedding(value):
+    """pgvector columns come back from PostgREST as '[0.1,0.2,...]' strings."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+def fetch_rows(supabase, page_size=500, columns=META_FIELDS + ("embedding",)):
+    """Page through perfume_knowledge_base and return all rows."""
+    rows = []
+    start = 0
+    while True:
+        res = supabase.table('perfume_knowledge_base').select(
+            ",".join(columns)
+        ).order('wp_id').range(start, start + page_size - 1).execute()
+        rows.extend(res.data)
+        if len(res.data) < page_size:
+            return rows
+        start += page_size
+
+def fetch_chunk_rows(supabase, page_size=1000):
+    """Page through perfume_chunks and return all rows."""
+    rows = []
+    start = 0
+    while True:
+        res = supabase.table(CHUNKS_TABLE).select("wp_id,chunk_type,chunk_index,embedding").order('wp_id').order(
+            'chunk_type').order('chunk_index').range(start, start + page_size - 1).execute()
+        rows.extend(res.data)
+        if len(res.data) < page_size:
+            return rows
+        start += page_size
+
+def load_dump(path):
+    """Read rows from a local JSON dump (a list of perfume_knowledge_base rows)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class VectorIndex:
+    """Normalized float32 embedding matrix with top-k cosine search.
+
+    Price, stock and brand are kept as parallel arrays so filters are applied
+    as vectorized masks before scoring.
+    """
+
+    def __init__(self, vectors, meta):
+        self.vectors = vectors
+        self.meta = meta
+        self.prices = np.array([float(m.get("price") or 0) for m in meta], dtype=np.float32)
+        self.stock = np.array([int(m.get("stock") or 0) for m in meta], dtype=np.int8)
+        self.brands = np.array([(m.get("brand") or "").lower() for m in meta])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build an index from rows with an 'embedding'; rows without one are skipped."""
+        meta, vectors = [], []
+        for row in rows:
+            embedding = parse_embedding(row.get("embedding"))
+            if not embedding:
+                continue
+            vectors.append(embedding)
+            meta.append({k: row.get(k) for k in META_FIELDS})
+        if not vectors:
+            return cls(np.zeros((0, 0), dtype=np.float32), meta)
+        return cls(normalize(np.asarray(vectors, dtype=np.float32)), meta)
+
+    def __len__(self):
+        return len(self.meta)
+
+    def mask(self, min_price=None, max_price=None, in_stock=None, brand=None):
+        """Boolean mask of rows passing the filters."""
+        mask = np.ones(len(self.meta), dtype=bool)
+        if min_price is not None:
+            mask &= self.prices >= min_price
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if in_stock is not None:
+            mask &= self.stock == (1 if in_stock else 0)
+        if brand:
+            mask &= self.brands == brand.lower()
+        return mask
+
+    def search_many(self, query_vectors, k=10, **filters):
+        """Top-k (score, meta) lists for a batch of query vectors."""
+        if len(self) == 0:
+            return [[] for _ in query_vectors]
+        queries = normalize(np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.vectors.shape[1]))
+        mask = self.mask(**filters)
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return [[] for _ in queries]
+        # Avoid copying the (possibly memory-mapped) matrix when nothing is filtered out
+        matrix = self.vectors if len(candidates) == len(mask) else self.vectors[candidates]
+        scores = queries @ matrix.T
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, row_top in zip(scores, top):
+            order = row_top[np.argsort(-row_scores[row_top])]
+            results.append([(float(row_scores[i]), self.meta[candidates[i]]) for i in order])
+        return results
+
+    def search(self, query_vector, k=10, **filters):
+        """Top-k (score, meta) for one query vector. Filters: min_price, max_price, in_stock, brand."""
+        return self.search_many([query_vector], k, **filters)[0]
+
+    def save(self, directory=INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory=INDEX_DIR, mmap=True):
+        """Load a saved index; with mmap the vectors stay on disk until touched."""
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode='r' if mmap else None)
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(vectors, meta)
+
+class ChunkIndex:
+    """Chunk vectors (several per product) searched as products.
+
+    One matrix product scores every chunk; aggregate_scores() then ranks each
+    product by its best chunk plus a little for its other matching chunks.
+    Filters work on the product metadata, like VectorIndex.
+    """
+
+    def __init__(self, vectors, wp_ids, chunk_types, products):
+        self.vectors = vectors
+        self.wp_ids = np.asarray(wp_ids, dtype=np.int64)
+        self.chunk_types = chunk_types
+        self.products = products
+        self._filters = VectorIndex(np.zeros((len(products), 0), dtype=np.float32), products)
+        self._product_ids = np.array([m["wp_id"] for m in products], dtype=np.int64)
+        self._by_id = {m["wp_id"]: m for m in products}
+
+    @classmethod
+    def from_rows(cls, chunk_rows, product_rows):
+        """Build from perfume_chunks rows (with 'embedding') and product rows for the metadata."""
+        products = [{k: row.get(k) for k in META_FIELDS} for row in product_rows]
+        known = {m["wp_id"] for m in products}
+        vectors, wp_ids, chunk_types = [], [], []
+        for row in chunk_rows:
+            embedding = parse_embedding(row.get("embedding"))
+            if not embedding or row["wp_id"] not in known:
+                continue
+            vectors.append(embedding)
+            wp_ids.append(row["wp_id"])
+            chunk_types.append(row["chunk_type"])
+        matrix = normalize(np.asarray(vectors, dtype=np.float32)) if vectors else np.zeros((0, 0), dtype=np.float32)
+        return cls(matrix, wp_ids, chunk_types, products)
+
+    def __len__(self):
+        return len(self.wp_ids)
+
+    def search(self, query_vector, k=10, **filters):
+        """Top-k (score, meta, best chunk type) products. Filters: min_price, max_price, in_stock, brand."""
+        if len(self) == 0:
+            return []
+        query = normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        candidates = np.arange(len(self))
+        if any(v is not None for v in filters.values()):
+            allowed = self._product_ids[self._filters.mask(**filters)]
+            candidates = np.flatnonzero(np.isin(self.wp_ids, allowed))
+            if len(candidates) == 0:
+                return []
+        matrix = self.vectors if len(candidates) == len(self) else self.vectors[candidates]
+        scores = matrix @ query
+        return [(score, self._by_id[wp_id], self.chunk_types[candidates[best]])
+                for score, wp_id, best in aggregate_scores(self.wp_ids[candidates], scores, k)]
+
+    def save(self, directory=CHUNK_INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({"wp_ids": self.wp_ids.tolist(), "chunk_types": self.chunk_types,
+                       "products": self.products}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory=CHUNK_INDEX_DIR, mmap=True):
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode='r' if mmap else None)
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(vectors, meta["wp_ids"], meta["chunk_types"], meta["products"])
+
+def normalize(matrix):
+    """L2-normalize rows so a dot product is the cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def main():
+    parser = argparse.ArgumentParser(description="Local vector index over perfume_knowledge_base.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="export embeddings into a local index")
+    build.add_argument("--dump", help="read rows from a local JSON dump instead of Supabase")
+    build.add_argument("--snapshot", help="read rows from a catalog_snapshot.py snapshot instead of Supabase")
+    build.add_argument("--out", default=INDEX_DIR)
+    build_chunks = sub.add_parser("build-chunks", help="export the perfume_chunks vectors into a local chunk index")
+    build_chunks.add_argument("--out", default=CHUNK_INDEX_DIR)
+    query = sub.add_parser("search", help="semantic search in the local index")
+    query.add_argument("text")
+    query.add_argument("-k", type=int, default=10)
+    query.add_argument("--index", default=INDEX_DIR)
+    query.add_argument("--min-price", type=float)
+    query.add_argument("--max-price", type=float)
+    query.add_argument("--in-stock", action="store_true", default=None)
+    query.add_argument("--brand")
+    query.add_argument("--chunks", action="store_true", help="search the chunk index (products ranked by their chunks)")
+    args = parser.parse_args()
+
+    load_dotenv('/Users/wojciechnowak/.env')
+
+    if args.command == "build":
+        if args.dump:
+            rows = load_dump(args.dump)
+        elif args.snapshot:
+            from catalog_snapshot import CatalogSnapshot
+            rows = CatalogSnapshot.load(args.snapshot).rows(META_FIELDS + ("embedding",))
+        else:
+            supabase = create_client(os.environ.get("FIRMY_SUPABASE_URL"), os.environ.get("FIRMY_SUPABASE_KEY"))
+            rows = fetch_rows(supabase)
+        index = VectorIndex.from_rows(rows)
+        index.save(args.out)
+        print(f"Indexed {len(index)} of {len(rows)} products into {args.out}")
+        return
+    if args.command == "build-chunks":
+        supabase = create_client(os.environ.get("FIRMY_SUPABASE_URL"), os.environ.get("FIRMY_SUPABASE_KEY"))
+        chunks = fetch_chunk_rows(supabase)
+        index = ChunkIndex.from_rows(chunks, fetch_rows(supabase, columns=META_FIELDS))
+        index.save(args.out)
+        print(f"Indexed {len(index)} of {len(chunks)} chunks into {args.out}")
+        return
+
+    embedder = BatchEmbedder(OpenAI(api_key=os.environ.get("OPEN_AI_API")))
+    filters = dict(min_price=args.min_price, max_price=args.max_price, in_stock=args.in_stock, brand=args.brand)
+    if args.chunks:
+        index = ChunkIndex.load(CHUNK_INDEX_DIR if args.index == INDEX_DIR else args.index)
+        for score, meta, chunk_type in index.search(embedder.embed(args.text), k=args.k, **filters):
+            print(f"{score:.3f} | {meta['name']} ({meta['brand']}) | {meta['price']} PLN | stock: {meta['stock']}"
+                  f" | via {chunk_type}")
+        return
+    index = VectorIndex.load(args.index)
+    results = index.search(embedder.embed(args.text), k=args.k, **filters)
+    for score, meta in results:
+        print(f"{score:.3f} | {meta['name']} ({meta['brand']}) | {meta['price']} PLN | stock: {meta['stock']}")
+
+if __name__ == "__main__":
+    main()